@@ -0,0 +1,109 @@
+import numpy as np
+from sklearn.metrics import silhouette_score
+
+# With more distinct values than this, the values are grouped in this many
+# equal width bins first (each bin is one weighted point at the mean of its values)
+DEFAULT_MAX_BINS = 1000
+
+# The silhouette score of a k is computed on a sample of at most this many values
+DEFAULT_SAMPLE_SIZE = 5000
+
+
+def kmeans_1d(values, n_clusters, max_bins=DEFAULT_MAX_BINS):
+    """
+    Optimal k-means of one dimensional values by dynamic programming on the sorted values.
+
+    Returns the cluster of each value, numbered from the lowest to the highest values.
+    The clustering is exact (the least sum of squares) when there are at most max_bins
+    distinct values, like years. Gives fewer clusters when there are fewer distinct values.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.intp)
+    points, weights, point_of_value = _weighted_points(values, max_bins)
+    segment_starts = _optimal_segments(points, weights, min(n_clusters, len(points)))
+    cluster_of_point = np.repeat(np.arange(len(segment_starts)), np.diff(np.append(segment_starts, len(points))))
+    return cluster_of_point[point_of_value]
+
+
+def best_n_clusters(values, cluster_range=range(2, 10), sample_size=DEFAULT_SAMPLE_SIZE, random_state=42,
+                    max_bins=DEFAULT_MAX_BINS):
+    """
+    The number of clusters with the best silhouette score, and the labels of all values for it.
+
+    Each k is fitted on all values with kmeans_1d. The silhouette score (quadratic in the
+    number of values) is computed on the same random sample of at most sample_size values
+    for every k. Returns (2, None) when the values do not have two clusters.
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    if len(values) > sample_size:
+        sample = np.random.default_rng(random_state).choice(len(values), size=sample_size, replace=False)
+    else:
+        sample = np.arange(len(values))
+    sample_values = values[sample].reshape(-1, 1)
+
+    best_k, best_score, best_labels = 2, -1, None
+    for k in cluster_range:
+        labels = kmeans_1d(values, k, max_bins)
+        n_labels = len(np.unique(labels[sample]))
+        if labels.max() + 1 < k or n_labels < 2 or n_labels >= len(sample):
+            break  # Stop when the values do not have k clusters
+        score = silhouette_score(sample_values, labels[sample])
+        if score > best_score:
+            best_k, best_score, best_labels = k, score, labels
+    return best_k, best_labels
+
+
+def _weighted_points(values, max_bins):
+    """The distinct values (or bin means) with their counts, and the point of each value."""
+    points, point_of_value, weights = np.unique(values, return_inverse=True, return_counts=True)
+    if len(points) <= max_bins:
+        return points, weights.astype(float), point_of_value
+
+    edges = np.linspace(points[0], points[-1], max_bins + 1)
+    bin_of_point = np.clip(np.searchsorted(edges, points, side="right") - 1, 0, max_bins - 1)
+    used_bins, bin_of_point = np.unique(bin_of_point, return_inverse=True)
+    bin_weights = np.bincount(bin_of_point, weights=weights)
+    bin_means = np.bincount(bin_of_point, weights=weights * points) / bin_weights
+    return bin_means, bin_weights, bin_of_point[point_of_value]
+
+
+def _optimal_segments(points, weights, n_clusters):
+    """
+    The first point of each cluster in the clustering of the sorted points with the
+    least sum of squares (the dynamic program of Wang and Song, Ckmeans.1d.dp).
+    """
+    n = len(points)
+    # Scaled to [0, 1] so the sums of squares keep their precision (timestamps are large)
+    span = points[-1] - points[0]
+    x = (points - points[0]) / span if span > 0 else np.zeros(n)
+
+    # Sum of squares of every segment i..j from the prefix sums
+    total_w = np.concatenate(([0.0], np.cumsum(weights)))
+    total_x = np.concatenate(([0.0], np.cumsum(weights * x)))
+    total_xx = np.concatenate(([0.0], np.cumsum(weights * x * x)))
+    starts = np.arange(n)[:, None]
+    ends = np.arange(n)[None, :] + 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = total_w[ends] - total_w[starts]
+        s = total_x[ends] - total_x[starts]
+        cost = np.maximum(total_xx[ends] - total_xx[starts] - s * s / w, 0)
+    cost[starts >= ends] = np.inf
+
+    # best[j]: least cost of the points up to j in the clusters so far; first[k][j]: start of its last cluster
+    best = cost[0]
+    first = [np.zeros(n, dtype=np.intp)]
+    for _ in range(1, n_clusters):
+        previous = np.concatenate(([np.inf], best[:-1]))
+        total = previous[:, None] + cost
+        first.append(np.argmin(total, axis=0))
+        best = total[first[-1], np.arange(n)]
+
+    # Go back from the last point to find where each cluster starts
+    segment_starts = []
+    end = n - 1
+    for k in range(n_clusters - 1, -1, -1):
+        start = first[k][end]
+        segment_starts.append(start)
+        end = start - 1
+    return np.array(segment_starts[::-1], dtype=np.intp)
@@ -0,0 +1,92 @@
+import re
+
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store
+
+# Read every observation with its WKT point in one query.
+# Some of our data uses the older "http://www.opengis.net/geosparql#" namespace,
+# so both geometry namespaces are matched here.
+COORDINATE_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+PREFIX geo_old: <http://www.opengis.net/geosparql#>
+
+SELECT ?observation ?wkt
+WHERE {
+  VALUES (?hasGeometry ?asWKT) {
+    (geo:hasGeometry geo:asWKT)
+    (geo_old:hasGeometry geo_old:asWKT)
+  }
+  ?observation a tern:Observation ;
+               sosa:hasFeatureOfInterest ?sample .
+  ?sample a tern:Sample ;
+          sosa:isResultOf ?procedure .
+  ?procedure ?hasGeometry ?geometry .
+  ?geometry ?asWKT ?wkt .
+}
+"""
+
+# Matches "POINT(151.2 -33.9)" and also "<crs> POINT (151.2 -33.9)"
+NUMBER = r"[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?"
+POINT_PATTERN = re.compile(rf"POINT\s*\(\s*({NUMBER})\s+({NUMBER})\s*\)")
+
+
+class CoordinateFrame:
+    """
+    Coordinates of all observations as columns.
+    - observations: observation URIs (without < >)
+    - lons, lats: float64 arrays in the same order
+    - rows_read: rows of the coordinate query, also those without a valid POINT
+    """
+
+    def __init__(self, observations, lons, lats, rows_read=None):
+        self.observations = observations
+        self.lons = lons
+        self.lats = lats
+        self.rows_read = len(observations) if rows_read is None else rows_read
+
+    def __len__(self):
+        return len(self.observations)
+
+    def coordinates(self):
+        # (n, 2) array of [lon, lat], used by the sklearn based rules
+        return np.column_stack((self.lons, self.lats))
+
+
+def load_coordinate_frame(store: Store) -> CoordinateFrame:
+    """
+    Run the coordinate query and parse the WKT points.
+    Observations without a valid POINT are left out.
+    RulePipeline.run builds the frame one time and gives it to every coordinate rule.
+    """
+    observations = []
+    lon_strs = []
+    lat_strs = []
+    rows_read = 0
+    for row in store.query(COORDINATE_QUERY):
+        rows_read += 1
+        match = POINT_PATTERN.search(row["wkt"].value)
+        if match:
+            observations.append(row["observation"].value)
+            lon_strs.append(match.group(1))
+            lat_strs.append(match.group(2))
+
+    return CoordinateFrame(
+        np.array(observations, dtype=object),
+        np.array(lon_strs, dtype=str).astype(np.float64),
+        np.array(lat_strs, dtype=str).astype(np.float64),
+        rows_read,
+    )
+
+
+def str_before(s: pd.Series, sep: str) -> pd.Series:
+    """SPARQL STRBEFORE(): the text before sep, or "" if sep is not found."""
+    parts = s.str.partition(sep)
+    return parts[0].where(parts[1] != "", "")
+
+
+def str_after(s: pd.Series, sep: str) -> pd.Series:
+    """SPARQL STRAFTER(): the text after sep, or "" if sep is not found."""
+    return s.str.partition(sep)[2]
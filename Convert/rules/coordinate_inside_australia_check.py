@@ -1,73 +1,33 @@
 from pyoxigraph import Store
 
-def run_coordinate_inside_australia_check(store: Store):
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.result_writer import write_results
+from Convert.rules.state_raster import DEFAULT_RASTER_PATH, OUTSIDE, load_state_raster
+
+def run_coordinate_inside_australia_check(store: Store, raster_path=DEFAULT_RASTER_PATH, frame=None):
     """
     Check if coordinates are inside Australia.
     Marks each observation with "inside_australia" or "outside_australia".
+    Uses the state raster (see state_raster.py) when it has been built,
+    otherwise Australia's bounding box.
+    frame is the coordinate frame of the store, when the pipeline has built it already.
+    Returns the number of rows read.
     """
 
-    # Step 1: Extract longitude and latitude values from WKT
-    coord_query = """
-    PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-
-    SELECT ?observation ?lonVal ?latVal
-    WHERE {
-      ?observation a tern:Observation ;
-                   sosa:hasFeatureOfInterest ?sample .
-      ?sample a tern:Sample ;
-              sosa:isResultOf ?procedure .
-      ?procedure geo:hasGeometry ?geometry .
-      ?geometry geo:asWKT ?wkt .
-
-      BIND(STR(?wkt) AS ?wktStr)
-      BIND(STRBEFORE(STRAFTER(?wktStr, "POINT("), ")") AS ?coordStr)
-      BIND(STRBEFORE(?coordStr, " ") AS ?lonStr)
-      BIND(STRAFTER(?coordStr, " ") AS ?latStr)
-      BIND(xsd:float(?lonStr) AS ?lonVal)
-      BIND(xsd:float(?latStr) AS ?latVal)
-    }
-    """
-    results = list(store.query(coord_query))
-
-    # Step 2: Store coordinates in a dictionary
-    obs_map = {}
-    for row in results:
-        obs_uri = str(row["observation"]).strip("<>")
-        lon = float(row["lonVal"].value)
-        lat = float(row["latVal"].value)
-        obs_map[obs_uri] = (lon, lat)
-
-    # Step 3: Define Australia's bounding box
-    def is_in_australia(lon, lat):
-        return 112.0 <= lon <= 154.0 and -44.0 <= lat <= -10.0
-
-    # Step 4: Prepare SPARQL INSERT query for tagging results
-    insert_prefix = """
-    PREFIX dqaf: <http://example.com/def/dqaf/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX schema: <http://schema.org/>
-
-    INSERT {
-      GRAPH dqaf:fullResults {
-    """
-    insert_values = ""
-    for obs_uri, (lon, lat) in obs_map.items():
-        tag = "inside_australia" if is_in_australia(lon, lat) else "outside_australia"
-        insert_values += f"""
-        <{obs_uri}> dqaf:hasResult [
-          sosa:observedProperty <http://example.com/assess/coordinate_in_australia/> ;
-          schema:value "{tag}"
-        ] .
-        """
-
-    insert_suffix = """
-      }
-    } WHERE { }
-    """
-    full_query = insert_prefix + insert_values + insert_suffix
-
-    # Step 5: Save the results into the RDF store
-    store.update(full_query)
+    # Step 1: Get longitude and latitude columns (shared with the other coordinate rules)
+    frame = load_coordinate_frame(store) if frame is None else frame
+
+    # Step 2: Check all points against the state raster, or Australia's bounding box
+    raster = load_state_raster(raster_path) if raster_path else None
+    if raster is not None:
+        inside = raster.lookup(frame.lons, frame.lats) != OUTSIDE
+    else:
+        inside = (
+            (frame.lons >= 112.0) & (frame.lons <= 154.0) &
+            (frame.lats >= -44.0) & (frame.lats <= -10.0)
+        )
+
+    # Step 3: Save the results into the RDF store
+    write_results(store, frame.observations, inside, ("outside_australia", "inside_australia"),
+                  "http://example.com/assess/coordinate_in_australia/")
+    return frame.rows_read
@@ -1,88 +1,59 @@
 from pyoxigraph import Store
-import numpy as np
 
-def run_coordinate_outlier_iqr(store: Store):
-    """
-    Check which coordinates are outliers using IQR (Interquartile Range) method.
-    Mark observations as 'outlier_coordinate' or 'normal_coordinate'.
-    """
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.grouped_stats import (DEFAULT_MIN_GROUP_SIZE, taxon_codes, taxon_names, taxon_sketches,
+                                         sketches_by_code, iqr_outliers)
+from Convert.rules.quantile_sketch import QuantileSketch
+from Convert.rules.result_writer import write_results
 
-    # Step 1: Get longitude and latitude from WKT geometry
-    coord_query = """
-    PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-
-    SELECT ?observation ?lonVal ?latVal
-    WHERE {
-      ?observation a tern:Observation ;
-                   sosa:hasFeatureOfInterest ?sample .
-      ?sample a tern:Sample ;
-              sosa:isResultOf ?procedure .
-      ?procedure geo:hasGeometry ?geometry .
-      ?geometry geo:asWKT ?wkt .
-
-      BIND(STR(?wkt) AS ?wktStr)
-      BIND(STRBEFORE(STRAFTER(?wktStr, "POINT("), ")") AS ?coordStr)
-      BIND(STRBEFORE(?coordStr, " ") AS ?lonStr)
-      BIND(STRAFTER(?coordStr, " ") AS ?latStr)
-      BIND(xsd:float(?lonStr) AS ?lonVal)
-      BIND(xsd:float(?latStr) AS ?latVal)
-    }
+def coordinate_sketches(store: Store, frame=None, group_by=None):
     """
-    results = list(store.query(coord_query))
-
-    # Step 2: Save coordinates in a list and link them to observations
-    coords = []
-    obs_map = {}
-    for row in results:
-        lon = float(row["lonVal"].value)
-        lat = float(row["latVal"].value)
-        obs_uri = str(row["observation"]).strip("<>")
-        coords.append((lon, lat))
-        obs_map[obs_uri] = (lon, lat)
-
-    # Step 3: Calculate IQR ranges for lon and lat separately
-    lons = np.array([pt[0] for pt in coords])
-    lats = np.array([pt[1] for pt in coords])
-
-    lon_q1, lon_q3 = np.percentile(lons, [25, 75])
-    lat_q1, lat_q3 = np.percentile(lats, [25, 75])
-    lon_iqr = lon_q3 - lon_q1
-    lat_iqr = lat_q3 - lat_q1
-
-    def is_outlier(val, q1, q3, iqr):
-        return val < q1 - 1.5 * iqr or val > q3 + 1.5 * iqr
-
-    # Step 4: Create SPARQL query to add results to the RDF store
-    insert_prefix = """
-    PREFIX dqaf: <http://example.com/def/dqaf/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX schema: <http://schema.org/>
-
-    INSERT {
-      GRAPH dqaf:fullResults {
+    (lon, lat) quantile sketches of the coordinates in the store.
+    Merge the sketches of every chunk (see quantile_sketch.merge_sketches) to label
+    each chunk with the quartiles of all chunks.
+    With group_by they are taxon_sketches, merged with grouped_stats.merge_taxon_sketches.
     """
-    insert_values = ""
-    for obs_uri, (lon, lat) in obs_map.items():
-        tag = "outlier_coordinate" if (
-            is_outlier(lon, lon_q1, lon_q3, lon_iqr) or
-            is_outlier(lat, lat_q1, lat_q3, lat_iqr)
-        ) else "normal_coordinate"
+    frame = load_coordinate_frame(store) if frame is None else frame
+    if group_by:
+        names = taxon_names(store, frame.observations, group_by)
+        return taxon_sketches(frame.lons, names), taxon_sketches(frame.lats, names)
+    return QuantileSketch().add(frame.lons), QuantileSketch().add(frame.lats)
 
-        insert_values += f"""
-        <{obs_uri}> dqaf:hasResult [
-          sosa:observedProperty <http://example.com/assess/coordinate_outlier_iqr/> ;
-          schema:value "{tag}"
-        ] .
-        """
 
-    insert_suffix = """
-      }
-    } WHERE { }
+def run_coordinate_outlier_iqr(store: Store, group_by=None, min_group_size=DEFAULT_MIN_GROUP_SIZE, sketches=None,
+                               frame=None):
+    """
+    Check which coordinates are outliers using IQR (Interquartile Range) method.
+    Mark observations as 'outlier_coordinate' or 'normal_coordinate'.
+    The quartiles are those of the (lon, lat) sketches when given, else of this store.
+    With group_by ("scientific_name" or "genus") each taxon has its own quartiles
+    (see grouped_stats.py); the sketches are then those of coordinate_sketches with the same group_by.
+    frame is the coordinate frame of the store, when the pipeline has built it already.
+    Returns the number of rows read.
     """
-    full_insert_query = insert_prefix + insert_values + insert_suffix
 
-    # Step 5: Save the classification results to RDF store
-    store.update(full_insert_query)
+    # Step 1: Get longitude and latitude columns (shared with the other coordinate rules)
+    frame = load_coordinate_frame(store) if frame is None else frame
+    if len(frame) == 0:
+        print("⚠️ No coordinates found.")
+        return frame.rows_read
+    lons, lats = frame.lons, frame.lats
+
+    # Step 2: Calculate IQR ranges for lon and lat separately (per taxon with group_by)
+    lon_groups = lat_groups = None
+    if sketches and group_by:
+        names = taxon_names(store, frame.observations, group_by)
+        codes, lon_sketch, lon_groups = sketches_by_code(sketches[0], names)
+        _, lat_sketch, lat_groups = sketches_by_code(sketches[1], names)
+    else:
+        codes = taxon_codes(store, frame.observations, group_by) if group_by else None
+        lon_sketch, lat_sketch = sketches if sketches else (None, None)
+
+    # Step 3: Mark all points at once
+    outliers = (iqr_outliers(lons, codes, min_group_size, lon_sketch, lon_groups)
+                | iqr_outliers(lats, codes, min_group_size, lat_sketch, lat_groups))
+
+    # Step 4: Save the classification results to RDF store
+    write_results(store, frame.observations, outliers, ("normal_coordinate", "outlier_coordinate"),
+                  "http://example.com/assess/coordinate_outlier_iqr/")
+    return frame.rows_read
@@ -1,81 +1,52 @@
-import joblib
-import re
 import numpy as np
 import folium
-from pyoxigraph import Store, RdfFormat, NamedNode, Literal, Quad
+from pyoxigraph import Store, RdfFormat
 import sys
 import os
 
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.model_registry import load_model, score_in_batches, DEFAULT_BATCH_SIZE
+from Convert.rules.result_writer import write_results
 from Convert.test_data_generation.data_generation_coordinate_outlier_isolation_forest_test import \
     create_coordinate_outlier_isolation_forest_test_data
 
-# RDF base namespaces
-DQAF_BASE = "http://example.com/def/dqaf/"
-SOSA_BASE = "http://www.w3.org/ns/sosa/"
-GEO_BASE = "http://www.opengis.net/geosparql#"
-SCHEMA_BASE = "http://schema.org/"
-ASSESS = NamedNode("http://example.com/assess/coordinate_outlier_isolation_forest/")
-FULL_RESULTS = NamedNode(DQAF_BASE + "fullResults")
-
-# Make full URI
-def uri(namespace: str, suffix: str) -> NamedNode:
-    return NamedNode(namespace + suffix)
+LABELS = ("normal_coordinate", "outlier_coordinate")
+ASSESS = "http://example.com/assess/coordinate_outlier_isolation_forest/"
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "isolation_forest_model.pkl")
 
 # Load model and detect outliers from RDF coordinates
-def run_coordinate_outlier_isolation_forest(store: Store, model_path=None):
-    if model_path is None:
-        model_path = os.path.join(os.path.dirname(__file__), "isolation_forest_model.pkl")
-
-    print(f"Loading model from: {model_path}")
-    model = joblib.load(model_path)
-
-    # SPARQL to get coordinates
-    query = """
-    PREFIX geo: <http://www.opengis.net/geosparql#>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-
-    SELECT ?observation ?wkt
-    WHERE {
-      ?observation sosa:hasFeatureOfInterest ?sample .
-      ?sample sosa:isResultOf ?procedure .
-      ?procedure geo:hasGeometry ?geometry .
-      ?geometry geo:asWKT ?wkt .
-    }
+def run_coordinate_outlier_isolation_forest(store: Store, model_path=None, batch_size=DEFAULT_BATCH_SIZE,
+                                            frame=None):
     """
-    results = store.query(query)
-
-    coords = []
-    obs_ids = []
-
-    for row in results:
-        obs_ids.append(row["observation"])
-        match = re.search(r"POINT\s*\(\s*([\d\.-]+)\s+([\d\.-]+)\s*\)", row["wkt"].value)
-        if match:
-            lon, lat = float(match.group(1)), float(match.group(2))
-            coords.append([lon, lat])
+    Label the coordinates with the isolation forest model and write the results into dqaf:fullResults.
+    frame is the coordinate frame of the store, when the pipeline has built it already.
+    Returns the number of rows read.
+    """
+    # Get coordinates (shared with the other coordinate rules)
+    frame = load_coordinate_frame(store) if frame is None else frame
 
-    if not coords:
+    if len(frame) == 0:
         print("No coordinates found.")
-        return []
+        return frame.rows_read
 
-    coords_np = np.array(coords)
-    preds = model.predict(coords_np)             # 1 = normal, -1 = outlier
-    scores = model.decision_function(coords_np)  # smaller = more likely outlier
+    # Save results to the dqaf:fullResults graph
+    outliers, _ = isolation_forest_scores(frame, model_path, batch_size)
+    write_results(store, frame.observations, outliers, LABELS, ASSESS)
+    return frame.rows_read
 
-    results_with_locations = []
-    for i, (obs, pred, coord, score) in enumerate(zip(obs_ids, preds, coords, scores)):
-        result_uri = NamedNode(f"http://example.com/result/{i}")
-        value_str = "outlier_coordinate" if pred == -1 else "normal_coordinate"
-        value = Literal(value_str)
-        lat, lon = coord[1], coord[0]
 
-        store.add(Quad(obs, uri(DQAF_BASE, "hasResult"), result_uri, FULL_RESULTS))
-        store.add(Quad(result_uri, uri(SOSA_BASE, "observedProperty"), ASSESS, FULL_RESULTS))
-        store.add(Quad(result_uri, uri(SCHEMA_BASE, "value"), value, FULL_RESULTS))
+def isolation_forest_scores(frame, model_path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """(outlier flags, scores) of the coordinates of the frame; smaller score = more likely outlier."""
+    # The model is loaded one time per process (see model_registry.py)
+    registered = load_model(MODEL_PATH if model_path is None else model_path)
 
-        results_with_locations.append((lat, lon, value_str, score))
+    # Put the columns in the order the model was trained with
+    columns = {"lon": frame.lons, "lat": frame.lats}
+    features = np.column_stack([columns[name] for name in registered.feature_order or ("lon", "lat")])
 
-    return results_with_locations
+    # 1 = normal, -1 = outlier
+    preds, scores = score_in_batches(registered.model, features, batch_size)
+    return preds == -1, scores
 
 # Run when this file is executed directly
 if __name__ == "__main__":
@@ -85,7 +56,12 @@ if __name__ == "__main__":
     store = Store()
     store.load(turtle_data.encode("utf-8"), RdfFormat.TURTLE)
 
-    results_with_locations = run_coordinate_outlier_isolation_forest(store)
+    frame = load_coordinate_frame(store)
+    outliers, scores = isolation_forest_scores(frame)
+    results_with_locations = [
+        (float(lat), float(lon), LABELS[is_out], score)
+        for lon, lat, is_out, score in zip(frame.lons, frame.lats, outliers.tolist(), scores)
+    ]
 
     print("Outlier detection results:")
     for _, _, label, score in results_with_locations:
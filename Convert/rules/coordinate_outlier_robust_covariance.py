@@ -1,83 +1,76 @@
+import os
+
 from pyoxigraph import Store
 import numpy as np
 from sklearn.covariance import MinCovDet
 
-def run_coordinate_outlier_robust_covariance(store: Store, threshold: float = 5.0):
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.model_registry import load_model, save_model, DEFAULT_BATCH_SIZE
+from Convert.rules.result_writer import write_results
+
+# MinCovDet is fitted on a random sample of at most this many coordinates
+DEFAULT_FIT_SIZE = 20_000
+
+FEATURE_ORDER = ("lon", "lat")
+
+LABELS = ("normal_coordinate", "outlier_coordinate")
+ASSESS = "http://example.com/assess/coordinate_outlier_robust_covariance/"
+
+
+def run_coordinate_outlier_robust_covariance(store: Store, threshold: float = 5.0, max_fit_size=DEFAULT_FIT_SIZE,
+                                             random_state=0, model_path=None, batch_size=DEFAULT_BATCH_SIZE,
+                                             frame=None):
     """
     Detect outlier coordinates using Robust Covariance method (Mahalanobis distance).
-    Add results into RDF store using SPARQL INSERT statement.
-    """
+    Add results into the dqaf:fullResults graph.
 
-    # Step 1: Get longitude and latitude from WKT geometry
-    coord_query = """
-    PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX geo: <http://www.opengis.net/geosparql#>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-
-    SELECT ?observation ?lonVal ?latVal
-    WHERE {
-      ?observation a tern:Observation ;
-                   sosa:hasFeatureOfInterest ?sample .
-      ?sample a tern:Sample ;
-              sosa:isResultOf ?procedure .
-      ?procedure geo:hasGeometry ?geometry .
-      ?geometry geo:asWKT ?wkt .
-
-      BIND(STR(?wkt) AS ?wktStr)
-      BIND(STRBEFORE(STRAFTER(?wktStr, "POINT("), ")") AS ?coordStr)
-      BIND(STRBEFORE(?coordStr, " ") AS ?lonStr)
-      BIND(STRAFTER(?coordStr, " ") AS ?latStr)
-      BIND(xsd:float(?lonStr) AS ?lonVal)
-      BIND(xsd:float(?latStr) AS ?latVal)
-    }
+    The robust location and covariance are fitted on a sample of at most max_fit_size
+    coordinates (the same sample for the same random_state). With model_path the fitted
+    estimator is saved there, and when the file is there it is used again without fitting,
+    so all chunks of a submission are scored with the same estimator.
+    frame is the coordinate frame of the store, when the pipeline has built it already.
+    Returns the number of rows read.
     """
-    results = list(store.query(coord_query))
+
+    # Step 1: Get longitude and latitude columns (shared with the other coordinate rules)
+    frame = load_coordinate_frame(store) if frame is None else frame
 
     # Step 2: Check if we got any coordinates
-    if not results:
+    if len(frame) == 0:
         print("⚠️ No coordinates found.")
-        return
+        return frame.rows_read
 
-    coords = []
-    obs_map = {}  # Keep track of which coordinates belong to which observation
-    for row in results:
-        lon = float(row["lonVal"].value)
-        lat = float(row["latVal"].value)
-        obs_uri = str(row["observation"]).strip("<>")
-        coords.append([lon, lat])
-        obs_map[obs_uri] = (lon, lat)
-
-    coords = np.array(coords)
+    coords = frame.coordinates()
 
     # Step 3: Use Robust Covariance to calculate Mahalanobis distances
-    robust_cov = MinCovDet().fit(coords)
-    distances = robust_cov.mahalanobis(coords)
+    robust_cov = robust_covariance_model(coords, max_fit_size, random_state, model_path)
+    distances = mahalanobis_in_batches(robust_cov, coords, batch_size)
 
-    # Step 4: Create SPARQL INSERT query to add outlier results to RDF
-    insert_prefix = """
-    PREFIX dqaf: <http://example.com/def/dqaf/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX schema: <http://schema.org/>
+    # Step 4: Save results to RDF store
+    write_results(store, frame.observations, distances > threshold, LABELS, ASSESS)
+    return frame.rows_read
+
+
+def robust_covariance_model(coords, max_fit_size=DEFAULT_FIT_SIZE, random_state=0, model_path=None):
+    """The saved MinCovDet at model_path, or a MinCovDet fitted on a sample of coords (saved to model_path)."""
+    if model_path is not None and os.path.exists(model_path):
+        return load_model(model_path).model
+
+    sample = coords
+    if len(coords) > max_fit_size:
+        rows = np.random.default_rng(random_state).choice(len(coords), size=max_fit_size, replace=False)
+        sample = coords[np.sort(rows)]
+    robust_cov = MinCovDet(random_state=random_state).fit(sample)
+
+    if model_path is not None:
+        save_model(robust_cov, model_path, training_size=len(sample), feature_order=FEATURE_ORDER)
+    return robust_cov
 
-    INSERT {
-      GRAPH dqaf:fullResults {
-    """
-    insert_values = ""
-    for obs_uri, dist in zip(obs_map.keys(), distances):
-        tag = "outlier_coordinate" if dist > threshold else "normal_coordinate"
-        insert_values += f"""
-        <{obs_uri}> dqaf:hasResult [
-          sosa:observedProperty <http://example.com/assess/coordinate_outlier_robust_covariance/> ;
-          schema:value "{tag}"
-        ] .
-        """
-
-    insert_suffix = """
-      }
-    } WHERE { }
-    """
-    full_insert_query = insert_prefix + insert_values + insert_suffix
 
-    # Step 5: Save results to RDF store
-    store.update(full_insert_query)
+def mahalanobis_in_batches(robust_cov, coords, batch_size: int = DEFAULT_BATCH_SIZE):
+    """Squared Mahalanobis distances like MinCovDet.mahalanobis, batch_size rows at a time."""
+    distances = np.empty(len(coords), dtype=np.float64)
+    for start in range(0, len(coords), batch_size):
+        centered = coords[start:start + batch_size] - robust_cov.location_
+        distances[start:start + len(centered)] = np.einsum("ij,jk,ik->i", centered, robust_cov.precision_, centered)
+    return distances
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store
+
+from Convert.rules.coordinate_frame import str_before, str_after
+from Convert.rules.result_writer import write_results
+
+# A decimal part is unusual when a group of 1 to MAX_GROUP digits repeats
+# MIN_REPEATS or more times in a row (like 111, 121212 or 123123123).
+# It is the rule of assess_coordinate_unusual.sparql, REGEX "([0-9]{1,3})\1{2,}",
+# which the store can not run because its REGEX has no backreferences.
+MAX_GROUP = 3
+MIN_REPEATS = 3
+
+# Decimal parts are checked in batches of this many rows
+DEFAULT_BATCH_SIZE = 1_000_000
+
+# Same rows as assess_coordinate_unusual.sparql: one per (observation, geometry, WKT)
+UNUSUAL_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX geo:  <http://www.opengis.net/ont/geosparql#>
+
+SELECT ?observation (STR(?wkt) AS ?wktStr)
+WHERE {
+  ?observation a tern:Observation ;
+               sosa:hasFeatureOfInterest ?sample .
+  ?sample a tern:Sample ;
+          sosa:isResultOf ?procedure .
+  ?procedure geo:hasGeometry ?geometry .
+  ?geometry geo:asWKT ?wkt .
+}
+"""
+
+
+def unusual_decimals(decimals, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    True for the decimal parts with a repeating group of digits (see MAX_GROUP, MIN_REPEATS).
+
+    The strings are compared as a matrix of characters: a group of size k repeats
+    MIN_REPEATS times where (MIN_REPEATS - 1) * k characters in a row are digits
+    equal to the character k places further on.
+    """
+    decimals = np.asarray(decimals, dtype=str)
+    unusual = np.zeros(len(decimals), dtype=bool)
+    for start in range(0, len(decimals), batch_size):
+        batch = decimals[start:start + batch_size]
+        width = batch.dtype.itemsize // 4
+        if width == 0:
+            continue
+        # One row of unicode code points per string, padded with 0
+        chars = np.ascontiguousarray(batch).view(np.uint32).reshape(len(batch), width)
+        digits = (chars >= ord("0")) & (chars <= ord("9"))
+        for size in range(1, MAX_GROUP + 1):
+            span = (MIN_REPEATS - 1) * size
+            if width < span + size:
+                break
+            same = (chars[:, :-size] == chars[:, size:]) & digits[:, :-size]
+            # Rows with `span` equal characters in a row
+            counts = np.zeros((len(batch), same.shape[1] + 1), dtype=np.int32)
+            np.cumsum(same, axis=1, out=counts[:, 1:])
+            unusual[start:start + len(batch)] |= (counts[:, span:] - counts[:, :-span] == span).any(axis=1)
+    return unusual
+
+
+def coordinate_unusual_codes(wkts: pd.Series):
+    """
+    Label "unusual" when the lon or lat decimals have a repeating group of digits.
+    The decimals are taken with the same steps as assess_coordinate_unusual.sparql.
+    Rows with no WKT get no value.
+    """
+    labels = ("usual", "unusual", None)
+    if wkts.empty:
+        return np.zeros(0, dtype=np.intp), labels
+
+    found = wkts.notna().to_numpy()
+    coords = str_before(str_after(wkts.fillna(""), "POINT("), ")")
+    lon_dec = str_after(str_before(coords, " "), ".")
+    lat_dec = str_after(str_after(coords, " "), ".")
+    unusual = unusual_decimals(lon_dec.to_numpy(dtype=str)) | unusual_decimals(lat_dec.to_numpy(dtype=str))
+
+    codes = np.where(found, unusual.astype(np.intp), 2)
+    return codes, labels
+
+
+def run_coordinate_unusual(store: Store):
+    """
+    Flags coordinates whose decimals repeat a group of digits.
+    Adds result to dqaf:fullResults graph. Returns the number of rows read.
+    """
+
+    # Step 1: Get the WKT of every observation geometry (STR() of a blank node is unbound)
+    observations = []
+    wkts = []
+    for row in store.query(UNUSUAL_QUERY):
+        observations.append(row["observation"].value)
+        wkts.append(None if row["wktStr"] is None else row["wktStr"].value)
+
+    # Step 2: Check all the decimals at once and save the labels
+    codes, labels = coordinate_unusual_codes(pd.Series(wkts, dtype=object))
+    write_results(store, observations, codes, labels, "http://example.com/assess/coordinate_unusual/")
+    return len(observations)
@@ -2,68 +2,75 @@ from pyoxigraph import Store
 import numpy as np
 from datetime import datetime
 
-def run_date_outlier_iqr(store: Store):
-    """
-    This function checks if the observation date is very different (outlier).
-    It uses IQR method and writes results into dqaf:fullResults graph.
-    """
+from Convert.rules.grouped_stats import (DEFAULT_MIN_GROUP_SIZE, taxon_codes, taxon_names, taxon_sketches,
+                                         sketches_by_code, iqr_outliers)
+from Convert.rules.quantile_sketch import QuantileSketch
+from Convert.rules.result_writer import write_results
 
-    # Step 1: Get all observation dates
-    date_query = """
-    PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX schema: <http://schema.org/>
-    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+DATE_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX schema: <http://schema.org/>
+PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+
+SELECT ?observation ?dateVal
+WHERE {
+  ?observation a tern:Observation ;
+               sosa:resultTime ?dateVal .
+}
+"""
 
-    SELECT ?observation ?dateVal
-    WHERE {
-      ?observation a tern:Observation ;
-                   sosa:resultTime ?dateVal .
-    }
-    """
-    results = list(store.query(date_query))
 
-    # Step 2: Convert date string to timestamp (number)
+def load_dates(store: Store):
+    """The observations and their resultTime as timestamps (numbers), in the same order."""
+    observations = []
     date_vals = []
-    obs_map = {}
-    for row in results:
+    for row in store.query(DATE_QUERY):
         date_str = row["dateVal"].value  # example: "2022-03-01T00:00:00"
         date_obj = datetime.fromisoformat(date_str)
-        timestamp = date_obj.timestamp()
-        obs_uri = str(row["observation"]).strip("<>")
-        date_vals.append(timestamp)
-        obs_map[obs_uri] = timestamp
+        observations.append(row["observation"].value)
+        date_vals.append(date_obj.timestamp())
+    return observations, np.array(date_vals)
 
-    # Step 3: Use IQR method to find outliers
-    arr = np.array(date_vals)
-    q1, q3 = np.percentile(arr, [25, 75])
-    iqr = q3 - q1
 
-    def is_outlier(val):
-        return val < q1 - 1.5 * iqr or val > q3 + 1.5 * iqr
+def date_sketch(store: Store, group_by=None):
+    """
+    Quantile sketch of the dates in the store. Merge the sketches of every chunk
+    (see quantile_sketch.merge_sketches) to label each chunk with the quartiles of all chunks.
+    With group_by they are taxon_sketches, merged with grouped_stats.merge_taxon_sketches.
+    """
+    observations, date_vals = load_dates(store)
+    if group_by:
+        return taxon_sketches(date_vals, taxon_names(store, observations, group_by))
+    return QuantileSketch().add(date_vals)
 
-    # Step 4: Write the results using SPARQL INSERT
-    insert_prefix = """
-    PREFIX dqaf: <http://example.com/def/dqaf/>
-    PREFIX sosa: <http://www.w3.org/ns/sosa/>
-    PREFIX schema: <http://schema.org/>
 
-    INSERT {
-      GRAPH dqaf:fullResults {
+def run_date_outlier_iqr(store: Store, group_by=None, min_group_size=DEFAULT_MIN_GROUP_SIZE, sketch=None):
     """
-    insert_values = ""
-    for obs_uri, ts in obs_map.items():
-        tag = "outlier_date" if is_outlier(ts) else "normal_date"
-        insert_values += f"""
-        <{obs_uri}> dqaf:hasResult [
-          sosa:observedProperty <http://example.com/assess/date_outlier_iqr/> ;
-          schema:value "{tag}"
-        ] .
-        """
-
-    insert_suffix = """
-      }
-    } WHERE { }
+    This function checks if the observation date is very different (outlier).
+    It uses IQR method and writes results into dqaf:fullResults graph.
+    The quartiles are those of the sketch when given, else of the dates in this store.
+    With group_by ("scientific_name" or "genus") each taxon has its own quartiles,
+    and the sketch is that of date_sketch with the same group_by.
+    Returns the number of rows read.
     """
-    full_insert = insert_prefix + insert_values + insert_suffix
-    store.update(full_insert)
+
+    # Step 1: Get all observation dates, as timestamps (numbers)
+    observations, date_vals = load_dates(store)
+
+    # No dates, nothing to check
+    if not observations:
+        return 0
+
+    # Step 2: Use IQR method to find outliers (per taxon with group_by)
+    group_sketches = None
+    if sketch is not None and group_by:
+        codes, sketch, group_sketches = sketches_by_code(sketch, taxon_names(store, observations, group_by))
+    else:
+        codes = taxon_codes(store, observations, group_by) if group_by else None
+    outliers = iqr_outliers(date_vals, codes, min_group_size, sketch, group_sketches)
+
+    # Step 3: Write the results into dqaf:fullResults
+    write_results(store, observations, outliers, ("normal_date", "outlier_date"),
+                  "http://example.com/assess/date_outlier_iqr/")
+    return len(observations)
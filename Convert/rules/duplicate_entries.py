@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store, BlankNode
+
+from Convert.rules.result_writer import write_results
+
+ASSESS = "http://example.com/assess/duplicate/"
+LABELS = ("unique_entry", "duplicate_entry")
+
+# Rows are read and hashed in chunks of this size
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Same pattern as assess_duplicate_entries.sparql, without the GROUP BY subquery
+DUPLICATE_KEY_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX dwc:  <http://rs.tdwg.org/dwc/terms/>
+PREFIX time: <http://www.w3.org/2006/time#>
+PREFIX geo:  <http://www.opengis.net/ont/geosparql#>
+
+SELECT ?observation ?name ?date ?wkt
+WHERE {
+  ?observation a tern:Observation ;
+               sosa:hasFeatureOfInterest ?feature .
+
+  OPTIONAL { ?feature dwc:scientificName ?name . }
+  OPTIONAL {
+    ?observation time:hasTime ?t .
+    ?t time:inXSDgYear ?date .
+  }
+  OPTIONAL {
+    ?feature sosa:isResultOf ?proc .
+    ?proc geo:hasGeometry ?geom .
+    ?geom geo:asWKT ?wkt .
+  }
+}
+"""
+
+
+def run_duplicate_entries(store: Store, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    This function finds duplicate records: same scientific name + year + location (WKT).
+    It gives the same results as assess_duplicate_entries.sparql, but the key of
+    each row is hashed to a 64-bit number and the groups are found with np.unique,
+    so it runs in O(n log n) and only keeps one number per row in memory.
+    Returns the number of rows read.
+    """
+
+    # Step 1: Stream the rows and hash the "name||year||wkt" key of each row
+    observations, key_hashes = read_duplicate_keys(store, chunk_size)
+
+    if len(observations) == 0:
+        print("⚠️ No observations found.")
+        return 0
+
+    # Step 2: Count the rows of every key (the SPARQL rule counts rows, not observations)
+    _, inverse, counts = np.unique(key_hashes, return_inverse=True, return_counts=True)
+    duplicates = counts[inverse] > 1
+
+    # Step 3: Write the results into dqaf:fullResults
+    write_results(store, observations, duplicates, LABELS, ASSESS)
+    return len(observations)
+
+
+def read_duplicate_keys(store: Store, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Run DUPLICATE_KEY_QUERY and return (observation URIs, uint64 key hashes).
+    The key is the same text the SPARQL rule builds, so two rows have the same
+    hash when the SPARQL rule would give them the same key.
+    """
+    observations = []
+    hashes = []
+    keys = []
+    for observation, name, date, wkt in store.query(DUPLICATE_KEY_QUERY):
+        observations.append(observation.value)
+        keys.append(f"{_text(name)}||{_text(date)}||{_text(wkt)}")
+        if len(keys) >= chunk_size:
+            hashes.append(hash_keys(keys))
+            keys = []
+    if keys:
+        hashes.append(hash_keys(keys))
+
+    key_hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    return observations, key_hashes
+
+
+def hash_keys(keys) -> np.ndarray:
+    """
+    Hash key strings to 64-bit numbers (SipHash, the same for every run).
+    With 10 million rows the chance of any two different keys sharing a hash is
+    about 1 in 400,000.
+    """
+    return pd.util.hash_array(np.array(keys, dtype=object), categorize=False)
+
+
+def _text(term) -> str:
+    """COALESCE(STR(?x), ""): "" for a missing term or a blank node."""
+    if term is None or isinstance(term, BlankNode):
+        return ""
+    return term.value
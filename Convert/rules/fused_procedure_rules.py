@@ -0,0 +1,227 @@
+import re
+
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store, Literal, BlankNode
+
+from Convert.rules.coordinate_frame import str_before, str_after
+from Convert.rules.coordinate_unusual import coordinate_unusual_codes
+from Convert.rules.result_writer import write_results
+
+ASSESS_BASE = "http://example.com/assess/"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# The .sparql rules that this rule replaces (by assessment name)
+FUSED_ASSESSMENTS = (
+    "coordinate_completeness",
+    "coordinate_precision",
+    "coordinate_unusual",
+    "geo_spatial_accuracy_precision",
+    "datum_completeness",
+    "datum_type",
+)
+
+# One traversal of observation -> sample -> procedure.
+# The UNION gives one row per geometry, datum or accuracy of the procedure,
+# so the values of different parts are not multiplied with each other.
+PROCEDURE_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX geo:  <http://www.opengis.net/ont/geosparql#>
+
+SELECT ?observation ?sample ?procedure ?part ?wkt ?value
+WHERE {
+  ?observation a tern:Observation ;
+               sosa:hasFeatureOfInterest ?sample .
+  ?sample a tern:Sample ;
+          sosa:isResultOf ?procedure .
+
+  OPTIONAL {
+    {
+      ?procedure geo:hasGeometry ?geometry .
+      OPTIONAL { ?geometry geo:asWKT ?wkt . }
+      BIND("geometry" AS ?part)
+    }
+    UNION
+    {
+      ?procedure geo:hasGeometryDatum ?value .
+      BIND("datum" AS ?part)
+    }
+    UNION
+    {
+      ?procedure geo:hasMetricSpatialAccuracy ?value .
+      BIND("accuracy" AS ?part)
+    }
+  }
+}
+"""
+
+# Same patterns as the .sparql files
+PRECISION_POINT = r"POINT\(\s*(.*)\s*\)"
+
+# Datatypes that xsd:float() reads from the lexical form
+NUMERIC_TYPES = {XSD + name for name in (
+    "string", "float", "double", "decimal", "integer", "int", "long", "short", "byte",
+    "nonNegativeInteger", "positiveInteger", "nonPositiveInteger", "negativeInteger",
+    "unsignedLong", "unsignedInt", "unsignedShort", "unsignedByte",
+)}
+
+
+def run_fused_procedure_rules(store: Store) -> int:
+    """
+    Run the six procedure rules (see FUSED_ASSESSMENTS) with one SELECT.
+    The results are the same as running the separate .sparql files.
+    Returns the number of rows read.
+    """
+
+    # Step 1: One query for the geometry, datum and accuracy of every procedure
+    geometry_rows, datum_rows, accuracy_rows, rows_read = collect_procedure_rows(store)
+
+    # Step 2: Coordinate rules, one row per (observation, geometry, WKT)
+    observations = [obs for obs, _, _ in geometry_rows]
+    has_wkt = np.array([bound for _, bound, _ in geometry_rows], dtype=bool)
+    wkts = pd.Series([text for _, _, text in geometry_rows], dtype=object)
+
+    _write(store, observations, has_wkt, ("empty", "non_empty"), "coordinate_completeness")
+    _write(store, observations, *coordinate_precision_codes(wkts), "coordinate_precision")
+
+    # The unusual rule only has rows where a WKT is found
+    unusual_observations = [obs for obs, bound in zip(observations, has_wkt.tolist()) if bound]
+    _write(store, unusual_observations, *coordinate_unusual_codes(wkts[has_wkt]), "coordinate_unusual")
+
+    # Step 3: Datum rules, one row per (observation, datum)
+    observations = [obs for obs, _ in datum_rows]
+    datums = pd.Series([text for _, text in datum_rows], dtype=object)
+
+    _write(store, observations, datums.notna().to_numpy(), ("empty", "not_empty"), "datum_completeness")
+    _write(store, observations, *datum_type_codes(datums), "datum_type")
+
+    # Step 4: Accuracy rule, one row per (observation, accuracy)
+    observations = [obs for obs, _ in accuracy_rows]
+    values = np.array([_xsd_float(term) for _, term in accuracy_rows], dtype=np.float32)
+    missing = np.array([term is None for _, term in accuracy_rows], dtype=bool)
+
+    _write(store, observations, *accuracy_codes(values, missing), "geo_spatial_accuracy_precision")
+    return rows_read
+
+
+def collect_procedure_rows(store: Store):
+    """
+    Run PROCEDURE_QUERY and split the rows by rule.
+    A procedure with no geometry (or datum, or accuracy) gives one row with None,
+    the same as an OPTIONAL that does not match.
+    Returns three lists and the number of rows of the query:
+      geometry rows (observation, WKT found, WKT text),
+      datum rows (observation, datum text) and
+      accuracy rows (observation, accuracy term).
+    """
+    paths = {}
+    rows_read = 0
+    for observation, sample, procedure, part, wkt, value in store.query(PROCEDURE_QUERY):
+        rows_read += 1
+        parts = paths.get((observation, sample, procedure))
+        if parts is None:
+            parts = paths[(observation, sample, procedure)] = ([], [], [])
+        if part is None:
+            continue
+        if part.value == "geometry":
+            parts[0].append((wkt is not None, _str(wkt)))
+        elif part.value == "datum":
+            parts[1].append(_str(value))
+        else:
+            parts[2].append(value)
+
+    geometry_rows, datum_rows, accuracy_rows = [], [], []
+    for (observation, _, _), (geometries, datums, accuracies) in paths.items():
+        obs = observation.value
+        geometry_rows.extend((obs, bound, text) for bound, text in geometries or [(False, None)])
+        datum_rows.extend((obs, text) for text in datums or [None])
+        accuracy_rows.extend((obs, term) for term in accuracies or [None])
+    return geometry_rows, datum_rows, accuracy_rows, rows_read
+
+
+def coordinate_precision_codes(wkts: pd.Series):
+    """
+    Label High (both > 4 decimals), Low (both < 2) or Medium.
+    Same steps as assess_coordinate_precision.sparql. Rows with no WKT get no value.
+    """
+    labels = ("High", "Medium", "Low", None)
+    if wkts.empty:
+        return np.zeros(0, dtype=np.intp), labels
+
+    found = wkts.notna().to_numpy()
+    coords = wkts.fillna("").str.replace(PRECISION_POINT, r"\1", regex=True)
+    lon_str = str_before(coords, " ")
+    lat_str = str_after(coords, " ")
+    lon_precision = str_after(lon_str, ".").str.len().to_numpy()
+    lat_precision = str_after(lat_str, ".").str.len().to_numpy()
+
+    codes = np.select(
+        [~found, (lon_precision > 4) & (lat_precision > 4), (lon_precision < 2) & (lat_precision < 2)],
+        [3, 0, 2],
+        default=1,
+    )
+    return codes, labels
+
+
+def datum_type_codes(datums: pd.Series):
+    """
+    Label the datum as AGD84, GDA94, GDA2020, WGS84 or None.
+    Same order of checks as assess_datum_validation.sparql.
+    """
+    labels = ("AGD84", "GDA94", "GDA2020", "WGS84", "None")
+    if datums.empty:
+        return np.zeros(0, dtype=np.intp), labels
+
+    datum = datums.fillna("").str.lower()
+    found = datums.notna().to_numpy()
+
+    def has(text):
+        return datum.str.contains(text, regex=False).to_numpy()
+
+    codes = np.select(
+        [~found, has("agd84"), has("gda94"), has("gda2020"), has("epsg:4326") | has("wgs84")],
+        [4, 0, 1, 2, 3],
+        default=4,
+    )
+    return codes, labels
+
+
+def accuracy_codes(values: np.ndarray, missing: np.ndarray):
+    """
+    Label low_precision when the accuracy is missing or more than 10,000 metres.
+    Values that xsd:float() can not read (NaN here) get no value, like in SPARQL.
+    """
+    labels = ("high_precision", "low_precision", None)
+    codes = np.select([missing, np.isnan(values), values > np.float32(10000)], [1, 2, 1], default=0)
+    return codes, labels
+
+
+def _write(store, observations, codes, labels, name):
+    return write_results(store, observations, codes, labels, f"{ASSESS_BASE}{name}/")
+
+
+def _str(term):
+    """SPARQL STR(): None for a missing term or a blank node."""
+    if term is None or isinstance(term, BlankNode):
+        return None
+    return term.value
+
+
+def _xsd_float(term) -> float:
+    """
+    SPARQL xsd:float() of an accuracy term. Returns NaN when the cast fails.
+    Lexical forms follow the store: no spaces or "_", and inf/nan are allowed.
+    """
+    if not isinstance(term, Literal):
+        return np.nan
+    datatype = term.datatype.value
+    text = term.value
+    if datatype == XSD + "boolean":
+        return 1.0 if text in ("true", "1") else 0.0
+    if datatype not in NUMERIC_TYPES or not text.isascii() or "_" in text or re.search(r"\s", text):
+        return np.nan
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store
+
+from Convert.rules.quantile_sketch import QuantileSketch, merge_sketches
+
+# Groups with fewer values than this use the statistics of all values
+DEFAULT_MIN_GROUP_SIZE = 10
+
+# What the outlier rules can be grouped by
+GROUP_BY = ("scientific_name", "genus")
+
+TAXON_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+
+SELECT ?observation ?name
+WHERE {
+  ?observation a tern:Observation ;
+               sosa:hasFeatureOfInterest ?feature .
+  ?feature <http://rs.tdwg.org/dwc/terms/scientificName> ?name .
+}
+"""
+
+
+def taxon_names(store: Store, observations, group_by="scientific_name") -> pd.Series:
+    """
+    The dwc:scientificName of each observation, or its genus (the first word of the name).
+    NaN when the observation has no name. An observation with more than one name has the first one.
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"Unknown group_by: {group_by}, use one of {GROUP_BY}")
+
+    rows = [(row["observation"].value, row["name"].value) for row in store.query(TAXON_QUERY)]
+    names = pd.Series([name for _, name in rows], index=[obs for obs, _ in rows], dtype=object)
+    names = names[~names.index.duplicated()]
+    if group_by == "genus":
+        names = names.str.split(n=1).str[0]
+    return names.reindex(pd.Index(observations, dtype=object))
+
+
+def taxon_codes(store: Store, observations, group_by="scientific_name") -> np.ndarray:
+    """
+    The group number of each observation: the same number for the same name (see taxon_names).
+    -1 when the observation has no name.
+    """
+    codes, _ = pd.factorize(taxon_names(store, observations, group_by))
+    return codes
+
+
+def taxon_sketches(values, names) -> dict:
+    """
+    Quantile sketch of the values of each taxon name, and of all values under the key None.
+    The sketches of every chunk are merged by name with merge_taxon_sketches, so each
+    chunk can be labelled with the quartiles of the whole taxon (see sketches_by_code).
+    """
+    values = np.asarray(values, dtype=float)
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    sketches = {None: QuantileSketch().add(values)}
+
+    # One sort, then one slice of values per taxon
+    keep = codes >= 0
+    order = np.argsort(codes[keep], kind="stable")
+    counts = np.bincount(codes[keep], minlength=len(uniques))
+    for name, part in zip(uniques, np.split(values[keep][order], np.cumsum(counts)[:-1])):
+        sketches[name] = QuantileSketch().add(part)
+    return sketches
+
+
+def merge_taxon_sketches(sketches_of_chunks) -> dict:
+    """One taxon_sketches dictionary with the values of all chunks, merged by taxon name."""
+    parts = {}
+    for sketches in sketches_of_chunks:
+        for name, sketch in sketches.items():
+            parts.setdefault(name, []).append(sketch)
+    return {name: merge_sketches(sketches) for name, sketches in parts.items()}
+
+
+def sketches_by_code(sketches: dict, names):
+    """
+    The group codes of the names, the sketch of all values and the sketch of each code,
+    from merged taxon_sketches. With these iqr_outliers uses the quartiles of the whole taxon.
+    """
+    if not isinstance(sketches, dict):
+        raise ValueError("With group_by the sketches must be per taxon, see taxon_sketches")
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    return codes, sketches[None], [sketches[name] for name in uniques]
+
+
+def grouped_percentiles(values, codes, percentiles):
+    """
+    Percentiles of the values of each group, with the linear interpolation of np.percentile.
+    One sort of (group, value) and index arithmetic per segment, no loop over groups.
+    Returns (array of n_groups x len(percentiles), count of each group). Codes of -1 are left out.
+    """
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes)
+    n_groups = codes.max() + 1 if len(codes) else 0
+    keep = codes >= 0
+    values, codes = values[keep], codes[keep]
+
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+
+    result = np.full((n_groups, len(percentiles)), np.nan)
+    has_values = counts > 0
+    for column, percentile in enumerate(percentiles):
+        position = (counts[has_values] - 1) * (percentile / 100)
+        below = np.floor(position).astype(np.intp)
+        above = np.minimum(below + 1, counts[has_values] - 1)
+        low = sorted_values[starts[has_values] + below]
+        high = sorted_values[starts[has_values] + above]
+        result[has_values, column] = low + (high - low) * (position - below)
+    return result, counts
+
+
+def grouped_mean_std(values, codes):
+    """
+    Mean and standard deviation (like np.std, ddof=0) of the values of each group,
+    from sums per group. Returns (means, stds, count of each group). Codes of -1 are left out.
+    """
+    values = np.asarray(values, dtype=float)
+    codes = np.asarray(codes)
+    n_groups = codes.max() + 1 if len(codes) else 0
+    keep = codes >= 0
+    values, codes = values[keep], codes[keep]
+
+    counts = np.bincount(codes, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.bincount(codes, weights=values, minlength=n_groups) / counts
+        # Sum of squares around the group mean, so large values keep their precision
+        squares = np.bincount(codes, weights=(values - means[codes]) ** 2, minlength=n_groups)
+        stds = np.sqrt(squares / counts)
+    return means, stds, counts
+
+
+def iqr_outliers(values, codes=None, min_group_size=DEFAULT_MIN_GROUP_SIZE, sketch=None, group_sketches=None):
+    """
+    Values below Q1 - 1.5 IQR or above Q3 + 1.5 IQR.
+    The quartiles of all values come from sketch (a QuantileSketch of every chunk), or of these values.
+    With codes the quartiles are those of the group of the value. Values of small
+    groups (less than min_group_size) and values with no group use the quartiles of all values.
+    With group_sketches (one merged sketch per code, see sketches_by_code) the quartiles and
+    sizes of the groups come from the sketches instead of these values.
+    """
+    values = np.asarray(values, dtype=float)
+    if sketch is None:
+        sketch = QuantileSketch().add(values)
+    q1, q3 = sketch.percentiles([25, 75])
+    if codes is not None and len(values):
+        if group_sketches is None:
+            quartiles, counts = grouped_percentiles(values, codes, [25, 75])
+        else:
+            quartiles = np.array([s.percentiles([25, 75]) for s in group_sketches]).reshape(-1, 2)
+            counts = np.array([s.count for s in group_sketches], dtype=np.int64)
+        q1 = _per_value(codes, counts, min_group_size, quartiles[:, 0], q1)
+        q3 = _per_value(codes, counts, min_group_size, quartiles[:, 1], q3)
+    iqr = q3 - q1
+    return (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+
+
+def zscore_outliers(values, threshold, codes=None, min_group_size=DEFAULT_MIN_GROUP_SIZE):
+    """
+    Values more than threshold standard deviations from the mean (none where the deviation is 0).
+    With codes the mean and deviation are those of the group of the value, with the same
+    fallback to all values as iqr_outliers.
+    """
+    values = np.asarray(values, dtype=float)
+    mean, std = np.mean(values), np.std(values)
+    if codes is not None and len(values):
+        means, stds, counts = grouped_mean_std(values, codes)
+        mean = _per_value(codes, counts, min_group_size, means, mean)
+        std = _per_value(codes, counts, min_group_size, stds, std)
+    std = np.broadcast_to(std, values.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (std != 0) & (np.abs((values - mean) / std) > threshold)
+
+
+def _per_value(codes, counts, min_group_size, group_stats, overall):
+    """The statistic of the group of each value, or the overall one for small or missing groups."""
+    stats = np.where(counts >= min_group_size, group_stats, overall)
+    # Code -1 takes the last entry, which is the overall statistic
+    return np.append(stats, overall)[np.asarray(codes)]
@@ -0,0 +1,292 @@
+import re
+
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store, NamedNode, Literal, BlankNode, RdfFormat
+
+from Convert.rules.result_writer import DQAF_BASE
+
+# Named graph with the fingerprints of the last incremental run:
+#   <obs> dqaf:fingerprint "..."                     (one per observation)
+#   <http://example.com/assess/NAME/> dqaf:inputFingerprint "..."   (one per rule)
+FINGERPRINTS = NamedNode(DQAF_BASE + "fingerprints")
+FINGERPRINT = NamedNode(DQAF_BASE + "fingerprint")
+INPUT_FINGERPRINT = NamedNode(DQAF_BASE + "inputFingerprint")
+
+# Named graph with the observations that per-record rules must assess in this run
+PENDING = NamedNode(DQAF_BASE + "pendingObservations")
+PENDING_CLASS = NamedNode(DQAF_BASE + "PendingObservation")
+RDF_TYPE = NamedNode("http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
+
+# Parts of the subgraph of an observation that the rules read
+PARTS = ("observation", "time", "sample", "procedure", "geometry")
+
+# Rows are read and hashed in chunks of this size
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Every triple of the observation, its times, its sample, the procedure of the
+# sample and the geometry of the procedure, with the part it belongs to.
+# Geometries are matched in both geometry namespaces, like in coordinate_frame.py.
+FINGERPRINT_QUERY = """
+PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX time: <http://www.w3.org/2006/time#>
+PREFIX geo:  <http://www.opengis.net/ont/geosparql#>
+PREFIX geo_old: <http://www.opengis.net/geosparql#>
+
+SELECT ?observation ?part ?p ?o
+WHERE {
+  ?observation a tern:Observation .
+  {
+    ?observation ?p ?o .
+    BIND("observation" AS ?part)
+  } UNION {
+    ?observation time:hasTime|sosa:phenomenonTime ?node .
+    ?node ?p ?o .
+    BIND("time" AS ?part)
+  } UNION {
+    ?observation sosa:hasFeatureOfInterest ?node .
+    ?node ?p ?o .
+    BIND("sample" AS ?part)
+  } UNION {
+    ?observation sosa:hasFeatureOfInterest/sosa:isResultOf ?node .
+    ?node ?p ?o .
+    BIND("procedure" AS ?part)
+  } UNION {
+    VALUES ?hasGeometry { geo:hasGeometry geo_old:hasGeometry }
+    ?observation sosa:hasFeatureOfInterest/sosa:isResultOf ?procedure .
+    ?procedure ?hasGeometry ?node .
+    ?node ?p ?o .
+    BIND("geometry" AS ?part)
+  }
+}
+"""
+
+REMOVE_PENDING_RESULTS = """
+PREFIX dqaf: <http://example.com/def/dqaf/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+
+DELETE {{ GRAPH dqaf:fullResults {{ ?observation dqaf:hasResult ?result . ?result ?p ?o }} }}
+WHERE {{
+  GRAPH dqaf:pendingObservations {{ ?observation a dqaf:PendingObservation }}
+  GRAPH dqaf:fullResults {{
+    ?observation dqaf:hasResult ?result .
+    ?result sosa:observedProperty ?property .
+    VALUES ?property {{ {properties} }}
+    ?result ?p ?o .
+  }}
+}}
+"""
+
+REMOVE_ALL_RESULTS = """
+PREFIX dqaf: <http://example.com/def/dqaf/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+
+DELETE {{ GRAPH dqaf:fullResults {{ ?observation dqaf:hasResult ?result . ?result ?p ?o }} }}
+WHERE {{
+  GRAPH dqaf:fullResults {{
+    ?observation dqaf:hasResult ?result .
+    ?result sosa:observedProperty ?property .
+    VALUES ?property {{ {properties} }}
+    ?result ?p ?o .
+  }}
+}}
+"""
+
+# What an incremental run does with a rule
+SKIP = "skipped"         # inputs did not change, the old results are kept
+CHANGED = "changed"      # per-record rule: only new and changed observations
+ALL = "all"              # the rule runs on every observation
+
+
+class Fingerprints:
+    """
+    Fingerprints of the data in a store.
+    - observations: {observation URI: 64-bit hash of its subgraph}
+    - parts: {part name: 64-bit hash of that part over all observations}
+    Hashes are sums of one hash per triple, so the order of the triples does not matter.
+    """
+
+    def __init__(self, observations, parts):
+        self.observations = observations
+        self.parts = parts
+
+    def dataset(self, parts) -> int:
+        """Hash of the given parts of all observations."""
+        return int(np.sum(np.array([self.parts.get(part, 0) for part in parts], dtype=np.uint64),
+                          dtype=np.uint64))
+
+
+class IncrementalPlan:
+    """
+    What an incremental run must do.
+    - changed: observations that are new or whose subgraph changed
+    - removed: observations that were assessed before but are gone now
+    - actions: {rule name: SKIP, CHANGED or ALL}
+    - rule_fingerprints: {rule name: fingerprint to save after the rule ran}
+    """
+
+    def __init__(self, fingerprints, changed, removed, actions, rule_fingerprints):
+        self.fingerprints = fingerprints
+        self.changed = changed
+        self.removed = removed
+        self.actions = actions
+        self.rule_fingerprints = rule_fingerprints
+
+    def summary(self) -> dict:
+        return {
+            "observations": len(self.fingerprints.observations),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+        }
+
+
+def compute_fingerprints(store: Store, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Fingerprints:
+    """
+    Hash the subgraph of every observation (see FINGERPRINT_QUERY).
+    Blank nodes are hashed as "_:", so the fingerprints stay the same when
+    the same file is loaded again with new blank node labels.
+    """
+    codes = {}
+    row_codes = []
+    row_parts = []
+    hashes = []
+    texts = []
+    for observation, part, p, o in store.query(FINGERPRINT_QUERY):
+        code = codes.setdefault(observation.value, len(codes))
+        row_codes.append(code)
+        row_parts.append(PARTS.index(part.value))
+        texts.append(f"{observation.value}|{part.value}|{p.value}|{_term_text(o)}")
+        if len(texts) >= chunk_size:
+            hashes.append(pd.util.hash_array(np.array(texts, dtype=object), categorize=False))
+            texts = []
+    if texts:
+        hashes.append(pd.util.hash_array(np.array(texts, dtype=object), categorize=False))
+
+    row_hashes = np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+    row_codes = np.array(row_codes, dtype=np.intp)
+    row_parts = np.array(row_parts, dtype=np.intp)
+
+    # Sums wrap around at 2**64, which is what we want for a hash
+    per_observation = np.zeros(len(codes), dtype=np.uint64)
+    np.add.at(per_observation, row_codes, row_hashes)
+    per_part = np.zeros(len(PARTS), dtype=np.uint64)
+    np.add.at(per_part, row_parts, row_hashes)
+
+    observations = dict(zip(codes.keys(), per_observation.tolist()))
+    return Fingerprints(observations, dict(zip(PARTS, per_part.tolist())))
+
+
+def read_saved_fingerprints(store: Store):
+    """The fingerprints saved by the last run: ({observation: hash}, {rule assess URI: text})."""
+    observations = {}
+    rules = {}
+    for quad in store.quads_for_pattern(None, None, None, FINGERPRINTS):
+        if quad.predicate == FINGERPRINT:
+            observations[quad.subject.value] = int(quad.object.value, 16)
+        elif quad.predicate == INPUT_FINGERPRINT:
+            rules[quad.subject.value] = quad.object.value
+    return observations, rules
+
+
+def plan_incremental_run(store: Store, rules, queries) -> IncrementalPlan:
+    """
+    Compare the data with the fingerprints of the last run and decide what each rule must do.
+
+    - Per-record rules (rule.per_record) only assess new and changed observations.
+      They run on every observation when they did not run before or their query changed.
+    - Dataset rules run again (on every observation) only when a part of the data
+      they read (rule.reads) changed, because their statistics use all observations.
+    """
+    fingerprints = compute_fingerprints(store)
+    saved_observations, saved_rules = read_saved_fingerprints(store)
+
+    current = fingerprints.observations
+    changed = [obs for obs, value in current.items() if saved_observations.get(obs) != value]
+    removed = [obs for obs in saved_observations if obs not in current]
+
+    actions = {}
+    rule_fingerprints = {}
+    for rule in rules:
+        if rule.per_record:
+            # The query text is the input of the rule that is the same for every record
+            value = "record:" + _hex(pd.util.hash_array(np.array([queries.get(rule.name, rule.name)],
+                                                                  dtype=object))[0])
+        else:
+            value = "dataset:" + _hex(fingerprints.dataset(rule.reads))
+            if rule.options:
+                # Other options give other results from the same data
+                value += ":" + ",".join(f"{key}={rule.options[key]}" for key in sorted(rule.options))
+        rule_fingerprints[rule.name] = value
+
+        if saved_rules.get(rule_uri(rule)) != value:
+            actions[rule.name] = ALL
+        elif rule.per_record:
+            actions[rule.name] = CHANGED if changed or removed else SKIP
+        else:
+            actions[rule.name] = SKIP
+
+    return IncrementalPlan(fingerprints, changed, removed, actions, rule_fingerprints)
+
+
+def mark_pending(store: Store, observations):
+    """Put the observations in the pending graph (the graph is cleared first)."""
+    store.clear_graph(PENDING)
+    lines = [f"{NamedNode(obs)} {RDF_TYPE} {PENDING_CLASS} {PENDING} .\n" for obs in observations]
+    if lines:
+        store.load("".join(lines).encode("utf-8"), format=RdfFormat.N_QUADS)
+
+
+def restrict_to_pending(query: str) -> str:
+    """
+    Make a rule query only match observations in the pending graph.
+    The pattern is put first in the WHERE block, so the store starts from
+    the pending observations.
+    """
+    pattern = f"\n  GRAPH {PENDING} {{ ?observation {RDF_TYPE} {PENDING_CLASS} }}\n"
+    restricted, found = re.subn(r"WHERE\s*\{", lambda m: m.group(0) + pattern, query, count=1)
+    if not found:
+        raise ValueError("The rule query has no WHERE block")
+    return restricted
+
+
+def remove_results(store: Store, observed_properties, pending_only: bool):
+    """Remove the old results of these assessments (only of pending observations if pending_only)."""
+    properties = " ".join(str(NamedNode(prop)) for prop in observed_properties)
+    template = REMOVE_PENDING_RESULTS if pending_only else REMOVE_ALL_RESULTS
+    store.update(template.format(properties=properties))
+
+
+def save_fingerprints(store: Store, plan: IncrementalPlan, rules):
+    """Save the fingerprints of the changed and removed observations and of the rules that ran."""
+    current = plan.fingerprints.observations
+
+    # Step 1: Remove the old fingerprints that are replaced
+    subjects = [NamedNode(obs) for obs in plan.changed + plan.removed]
+    subjects += [NamedNode(rule_uri(rule)) for rule in rules]
+    for subject in subjects:
+        for quad in list(store.quads_for_pattern(subject, None, None, FINGERPRINTS)):
+            store.remove(quad)
+
+    # Step 2: Write the new ones as N-Quads text
+    lines = [f"{NamedNode(obs)} {FINGERPRINT} {Literal(_hex(current[obs]))} {FINGERPRINTS} .\n"
+             for obs in plan.changed]
+    lines += [f"{NamedNode(rule_uri(rule))} {INPUT_FINGERPRINT} "
+              f"{Literal(plan.rule_fingerprints[rule.name])} {FINGERPRINTS} .\n" for rule in rules]
+    if lines:
+        store.load("".join(lines).encode("utf-8"), format=RdfFormat.N_QUADS)
+    store.clear_graph(PENDING)
+
+
+def rule_uri(rule) -> str:
+    return f"http://example.com/assess/{rule.name}/"
+
+
+def _hex(value) -> str:
+    return format(int(value), "016x")
+
+
+def _term_text(term) -> str:
+    if isinstance(term, BlankNode):
+        return "_:"
+    return str(term)
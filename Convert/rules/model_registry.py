@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+
+# Rows scored at one time, so memory stays the same for any input size
+DEFAULT_BATCH_SIZE = 65_536
+
+
+class RegisteredModel:
+    """
+    A loaded model and what is known about it.
+    - training_size: number of rows the model was trained on
+    - contamination: expected share of outliers
+    - feature_order: names of the feature columns, e.g. ("lon", "lat")
+    - sha256: hash of the model file
+    """
+
+    def __init__(self, path, model, sha256, training_size=None, contamination=None, feature_order=None):
+        self.path = path
+        self.model = model
+        self.sha256 = sha256
+        self.training_size = training_size
+        self.contamination = contamination
+        self.feature_order = tuple(feature_order) if feature_order else None
+
+    def metadata(self) -> dict:
+        return {
+            "training_size": self.training_size,
+            "contamination": self.contamination,
+            "feature_order": list(self.feature_order) if self.feature_order else None,
+            "sha256": self.sha256,
+        }
+
+
+# Loaded models by absolute path: (file time, mmap_mode, RegisteredModel)
+_registry = {}
+
+
+def load_model(path, mmap_mode=None) -> RegisteredModel:
+    """
+    Load a model one time per process. It is loaded again only when the file changes.
+    With mmap_mode="r" the arrays of the model (like the tree arrays) are
+    memory-mapped from the file instead of read into memory.
+    The metadata comes from the .json file next to the model (see save_model).
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    entry = _registry.get(path)
+    if entry is not None and entry[0] == mtime and entry[1] == mmap_mode:
+        return entry[2]
+
+    print(f"Loading model from: {path}")
+    model = joblib.load(path, mmap_mode=mmap_mode)
+    sha256 = file_sha256(path)
+
+    metadata = read_model_metadata(path)
+    if metadata.get("sha256") not in (None, sha256):
+        raise ValueError(f"Model file '{path}' does not match the sha256 in its metadata")
+
+    registered = RegisteredModel(
+        path, model, sha256,
+        training_size=metadata.get("training_size"),
+        contamination=metadata.get("contamination", getattr(model, "contamination", None)),
+        feature_order=metadata.get("feature_order"),
+    )
+    _registry[path] = (mtime, mmap_mode, registered)
+    return registered
+
+
+def save_model(model, path, training_size, feature_order, contamination=None):
+    """Save a model with joblib and write its metadata .json file next to it."""
+    joblib.dump(model, path)
+    metadata = {
+        "training_size": int(training_size),
+        "contamination": contamination if contamination is not None else getattr(model, "contamination", None),
+        "feature_order": list(feature_order),
+        "sha256": file_sha256(path),
+    }
+    with open(_metadata_path(path), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+
+def read_model_metadata(path) -> dict:
+    """The metadata of a model, or {} when the model has no .json file."""
+    metadata_path = _metadata_path(path)
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path, "r") as f:
+        return json.load(f)
+
+
+def clear_model_registry():
+    """Forget all loaded models."""
+    _registry.clear()
+
+
+def score_in_batches(model, features, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Score rows in float32 batches of batch_size.
+    Works for models where predict is -1 when decision_function < 0, else 1
+    (IsolationForest, EllipticEnvelope). decision_function is run one time per
+    batch and the predictions come from the scores.
+    Returns (predictions, scores).
+    """
+    n = len(features)
+    scores = np.empty(n, dtype=np.float64)
+    for start in range(0, n, batch_size):
+        batch = np.asarray(features[start:start + batch_size], dtype=np.float32)
+        scores[start:start + len(batch)] = model.decision_function(batch)
+
+    predictions = np.where(scores < 0, -1, 1)
+    return predictions, scores
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + ".json"
@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+
+from pyoxigraph import Store, NamedNode, Literal, Quad, RdfFormat, DefaultGraph
+
+from Convert.rules.model_registry import file_sha256
+from Convert.rules.result_writer import DQAF_BASE
+
+# Named graph that records which input files are in the store:
+#   <file:///.../chunk_1.ttl> dqaf:sha256 "..." ; dqaf:fileSize "..." ; dqaf:modifiedTime "..."
+LOADED_INPUTS = NamedNode(DQAF_BASE + "loadedInputs")
+SHA256 = NamedNode(DQAF_BASE + "sha256")
+FILE_SIZE = NamedNode(DQAF_BASE + "fileSize")
+MODIFIED_TIME = NamedNode(DQAF_BASE + "modifiedTime")
+
+
+def open_store(store_dir=None) -> Store:
+    """
+    Open the store saved in store_dir (it is made when it does not exist yet).
+    Without store_dir an in-memory store is returned.
+    """
+    if store_dir is None:
+        return Store()
+    os.makedirs(store_dir, exist_ok=True)
+    return Store(str(store_dir))
+
+
+def load_inputs(store: Store, paths) -> list:
+    """
+    Bulk load the input Turtle files that are not in the store yet.
+
+    - A file that is already loaded (same size and time, or same sha256) is skipped.
+    - When a loaded file has changed, or is no longer in paths, its old triples
+      cannot be told apart from the others, so the data is cleared and all
+      files are loaded again. Named graphs (results, fingerprints) are kept.
+    - With no paths the store is used as it is.
+
+    Returns the paths that were loaded.
+    """
+    if not paths:
+        return []
+    files = {Path(os.path.abspath(path)).as_uri(): path for path in paths}
+    loaded = loaded_inputs(store)
+
+    # Step 1: Start again when a loaded file changed or was left out
+    unchanged = {}
+    for iri, info in loaded.items():
+        if iri in files and _same_content(files[iri], info):
+            unchanged[iri] = info
+    if len(unchanged) < len(loaded):
+        print(f"⚠️ {len(loaded) - len(unchanged)} loaded input file(s) changed or were removed, "
+              f"loading all files again.")
+        store.clear_graph(DefaultGraph())
+        store.clear_graph(LOADED_INPUTS)
+        unchanged = {}
+
+    # Step 2: Bulk load the new files and record them
+    new_paths = []
+    for iri, path in files.items():
+        if iri in unchanged:
+            # Only the file time changed: save the new time so the file is not hashed again
+            if unchanged[iri].get("mtime") != str(os.stat(path).st_mtime_ns):
+                _record_input(store, iri, path, unchanged[iri]["sha256"])
+            continue
+        store.bulk_load(path=str(path), format=RdfFormat.TURTLE)
+        _record_input(store, iri, path)
+        new_paths.append(path)
+
+    store.flush()
+    return new_paths
+
+
+def loaded_inputs(store: Store) -> dict:
+    """The recorded input files: {file IRI: {"sha256", "size", "mtime"}}."""
+    names = {SHA256: "sha256", FILE_SIZE: "size", MODIFIED_TIME: "mtime"}
+    loaded = {}
+    for quad in store.quads_for_pattern(None, None, None, LOADED_INPUTS):
+        if quad.predicate in names:
+            loaded.setdefault(quad.subject.value, {})[names[quad.predicate]] = quad.object.value
+    return loaded
+
+
+def _record_input(store: Store, iri, path, sha256=None):
+    stat = os.stat(path)
+    subject = NamedNode(iri)
+    for quad in list(store.quads_for_pattern(subject, None, None, LOADED_INPUTS)):
+        store.remove(quad)
+    store.extend([
+        Quad(subject, SHA256, Literal(sha256 or file_sha256(path)), LOADED_INPUTS),
+        Quad(subject, FILE_SIZE, Literal(str(stat.st_size)), LOADED_INPUTS),
+        Quad(subject, MODIFIED_TIME, Literal(str(stat.st_mtime_ns)), LOADED_INPUTS),
+    ])
+
+
+def _same_content(path, info) -> bool:
+    """True when the file still has the content that was loaded."""
+    if not os.path.exists(path):
+        return False
+    stat = os.stat(path)
+    if info.get("size") != str(stat.st_size):
+        return False
+    if info.get("mtime") == str(stat.st_mtime_ns):
+        return True
+    # The time changed: only the hash tells if the content changed too
+    return info.get("sha256") == file_sha256(path)
@@ -0,0 +1,416 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from pyoxigraph import Store, RdfFormat
+
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.coordinate_inside_australia_check import run_coordinate_inside_australia_check
+from Convert.rules.coordinate_outlier_iqr import run_coordinate_outlier_iqr
+from Convert.rules.coordinate_outlier_isolation_forest import run_coordinate_outlier_isolation_forest
+from Convert.rules.coordinate_outlier_robust_covariance import run_coordinate_outlier_robust_covariance
+from Convert.rules.coordinate_outlier_zscore import run_coordinate_outlier_zscore
+from Convert.rules.coordinate_unusual import run_coordinate_unusual
+from Convert.rules.date_outlier_iqr import run_date_outlier_iqr
+from Convert.rules.date_outlier_kmeans import run_date_outlier_kmeans
+from Convert.rules.duplicate_entries import run_duplicate_entries
+from Convert.rules.fused_procedure_rules import run_fused_procedure_rules, FUSED_ASSESSMENTS
+from Convert.rules.grouped_stats import DEFAULT_MIN_GROUP_SIZE, GROUP_BY
+from Convert.rules.incremental import (PARTS, FINGERPRINTS, SKIP, CHANGED, ALL, plan_incremental_run, mark_pending,
+                                       restrict_to_pending, remove_results, save_fingerprints)
+from Convert.rules.persistent_store import open_store, load_inputs
+from Convert.rules.result_writer import FULL_RESULTS
+
+QUERIES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "queries")
+ASSESS_BASE = "http://example.com/assess/"
+
+RESULTS_COUNT_QUERY = """
+PREFIX dqaf: <http://example.com/def/dqaf/>
+SELECT (COUNT(*) AS ?count) WHERE { GRAPH dqaf:fullResults { ?s ?p ?o } }
+"""
+
+# Rules that can use statistics per taxon (see group_outlier_rules)
+GROUPED_RULES = ("coordinate_outlier_iqr", "coordinate_outlier_zscore", "date_outlier_iqr")
+
+# Rule that can keep its fitted estimator in a file (see reuse_robust_covariance_model)
+ROBUST_COVARIANCE_RULE = "coordinate_outlier_robust_covariance"
+
+# Parts of the data (see Convert.rules.incremental) the Python rules read
+COORDINATE_PARTS = ("observation", "sample", "procedure", "geometry")
+DATE_PARTS = ("observation", "time")
+
+# The INSERT template of a rule update, up to its WHERE block (see count_query)
+INSERT_TEMPLATE = re.compile(r"^INSERT\s*\{.*?^(?=WHERE\b)", re.MULTILINE | re.DOTALL)
+
+PROPERTY_COUNT_QUERY = """
+PREFIX dqaf: <http://example.com/def/dqaf/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+SELECT (COUNT(*) AS ?count) WHERE {{ GRAPH dqaf:fullResults {{ ?result sosa:observedProperty <{prop}> }} }}
+"""
+
+
+class PipelineRule:
+    """
+    One step of the pipeline.
+    - name: the assessment name, also used for the observed property URI
+    - sparql_file: a file in Convert/queries (for SPARQL rules)
+    - run: a Python function that takes the store and returns the number of rows it read (for Python rules)
+    - depends_on: names of rules (or assessments) that must run before this one
+    - assesses: assessment names the rule writes, when it is not only its own name
+    - reads: parts of the data a Python rule uses; in incremental mode it runs
+      again only when one of them changed (SPARQL rules are per record)
+    - options: keyword arguments for the run function; in incremental mode the
+      rule runs again when they change
+    - uses_frame: the run function takes the coordinate frame (see coordinate_frame.py),
+      which RulePipeline.run builds one time for all these rules
+    """
+
+    def __init__(self, name, sparql_file=None, run=None, depends_on=(), assesses=None, reads=PARTS, options=None,
+                 uses_frame=False):
+        if (sparql_file is None) == (run is None):
+            raise ValueError(f"Rule '{name}' needs either a sparql_file or a run function")
+        self.name = name
+        self.sparql_file = sparql_file
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.assesses = tuple(assesses) if assesses else (name,)
+        self.reads = tuple(reads)
+        self.options = dict(options or {})
+        self.uses_frame = uses_frame
+
+    @property
+    def kind(self):
+        return "sparql" if self.sparql_file else "python"
+
+    @property
+    def per_record(self):
+        # The result of an observation only depends on its own subgraph
+        return self.sparql_file is not None
+
+    @property
+    def observed_properties(self):
+        return [f"{ASSESS_BASE}{name}/" for name in self.assesses]
+
+
+# All rules of the Convert engine, in the order they are normally run
+DEFAULT_RULES = [
+    PipelineRule("date_completeness", sparql_file="assess_date_completeness.sparql"),
+    PipelineRule("date_recency", sparql_file="assess_date_recency.sparql"),
+    PipelineRule("date_format_validation", sparql_file="assess_date_format_validation.sparql"),
+    PipelineRule("coordinate_completeness", sparql_file="assess_coordinate_completeness.sparql"),
+    PipelineRule("coordinate_precision", sparql_file="assess_coordinate_precision.sparql"),
+    PipelineRule("coordinate_unusual", run=run_coordinate_unusual, reads=COORDINATE_PARTS),
+    PipelineRule("geo_spatial_accuracy_precision", sparql_file="assess_geo_spatial_accuracy_precision.sparql"),
+    PipelineRule("datum_completeness", sparql_file="assess_datum_completeness.sparql"),
+    PipelineRule("datum_type", sparql_file="assess_datum_validation.sparql"),
+    PipelineRule("scientific_name_completeness", sparql_file="assess_scientific_name_completeness.sparql"),
+    PipelineRule("scientific_name_validation", sparql_file="assess_scientific_name_validation.sparql"),
+    PipelineRule("duplicate", run=run_duplicate_entries),
+    PipelineRule("coordinate_in_australia", run=run_coordinate_inside_australia_check,
+                 depends_on=["coordinate_completeness"], reads=COORDINATE_PARTS, uses_frame=True),
+    PipelineRule("coordinate_outlier_iqr", run=run_coordinate_outlier_iqr,
+                 depends_on=["coordinate_completeness"], reads=COORDINATE_PARTS, uses_frame=True),
+    PipelineRule("coordinate_outlier_zscore", run=run_coordinate_outlier_zscore,
+                 depends_on=["coordinate_completeness"], reads=COORDINATE_PARTS, uses_frame=True),
+    PipelineRule(ROBUST_COVARIANCE_RULE, run=run_coordinate_outlier_robust_covariance,
+                 depends_on=["coordinate_completeness"], reads=COORDINATE_PARTS, uses_frame=True),
+    PipelineRule("coordinate_outlier_isolation_forest", run=run_coordinate_outlier_isolation_forest,
+                 depends_on=["coordinate_completeness"], reads=COORDINATE_PARTS, uses_frame=True),
+    PipelineRule("date_outlier_iqr", run=run_date_outlier_iqr, reads=DATE_PARTS),
+    PipelineRule("date_outlier_kmeans", run=run_date_outlier_kmeans, reads=DATE_PARTS),
+]
+
+
+class RulePipeline:
+    """
+    Run a list of rules on one store and time each rule.
+    The SPARQL files are read one time, when the pipeline is made.
+    With fused=True the procedure rules run as one rule (see fuse_procedure_rules).
+    With group_by the outlier rules use statistics per taxon (see group_outlier_rules).
+    With robust_covariance_model the robust covariance rule keeps its estimator in that
+    file (see reuse_robust_covariance_model).
+    """
+
+    def __init__(self, rules=None, queries_dir=QUERIES_DIR, fused=False, group_by=None,
+                 min_group_size=DEFAULT_MIN_GROUP_SIZE, robust_covariance_model=None):
+        rules = DEFAULT_RULES if rules is None else rules
+        if fused:
+            rules = fuse_procedure_rules(rules)
+        if group_by:
+            rules = group_outlier_rules(rules, group_by, min_group_size)
+        if robust_covariance_model:
+            rules = reuse_robust_covariance_model(rules, robust_covariance_model)
+        self.rules = dependency_order(rules)
+        self.queries = {}
+        self.count_queries = {}
+        for rule in self.rules:
+            if rule.sparql_file:
+                with open(os.path.join(queries_dir, rule.sparql_file), "r") as f:
+                    self.queries[rule.name] = f.read()
+                self.count_queries[rule.name] = count_query(self.queries[rule.name])
+
+    def run(self, store: Store, incremental: bool = False) -> dict:
+        """
+        Run every rule in dependency order.
+        The coordinate frame is built one time, before the first rule that uses it;
+        the rules only write into dqaf:fullResults, so it stays the same for the run.
+        With incremental=True only what changed since the last incremental run on
+        this store is assessed again (see Convert.rules.incremental).
+        Returns the timing report as a dictionary (see timing_report).
+        """
+        timings = []
+        started = time.perf_counter()
+
+        plan = None
+        if incremental:
+            plan = plan_incremental_run(store, self.rules, self.queries)
+            mark_pending(store, plan.changed + plan.removed)
+
+        frame = None
+        results_before = _count(store, RESULTS_COUNT_QUERY)
+        for rule in self.rules:
+            action = plan.actions[rule.name] if plan else ALL
+            property_queries = [PROPERTY_COUNT_QUERY.format(prop=prop) for prop in rule.observed_properties]
+
+            if plan and action != SKIP:
+                # Remove the results that are made again
+                remove_results(store, rule.observed_properties, pending_only=action == CHANGED)
+                results_before = _count(store, RESULTS_COUNT_QUERY)
+            written_before = sum(_count(store, query) for query in property_queries)
+            rows_read = 0
+            if rule.sparql_file and action != SKIP:
+                # The solutions of the WHERE block are the rows the update reads
+                query = self.count_queries[rule.name]
+                rows_read = _count(store, restrict_to_pending(query) if action == CHANGED else query)
+
+            # Only the rule itself is timed, not the counting and removing around it
+            rule_started = time.perf_counter()
+            if action == SKIP:
+                pass
+            elif rule.sparql_file:
+                query = self.queries[rule.name]
+                store.update(restrict_to_pending(query) if action == CHANGED else query)
+            elif rule.uses_frame:
+                if frame is None:
+                    frame = load_coordinate_frame(store)
+                rows_read = rule.run(store, frame=frame, **rule.options) or 0
+            else:
+                rows_read = rule.run(store, **rule.options) or 0
+            seconds = time.perf_counter() - rule_started
+
+            results_after = _count(store, RESULTS_COUNT_QUERY)
+            timing = {
+                "rule": rule.name,
+                "kind": rule.kind,
+                "seconds": round(seconds, 6),
+                "rows_read": rows_read,
+                "results_written": sum(_count(store, query) for query in property_queries) - written_before,
+                "quads_written": results_after - results_before,
+            }
+            if plan:
+                timing["incremental"] = action
+            timings.append(timing)
+            results_before = results_after
+
+        report = timing_report(timings, time.perf_counter() - started)
+        if plan:
+            save_fingerprints(store, plan, self.rules)
+            report["incremental"] = plan.summary()
+        return report
+
+
+def timing_report(timings, total_seconds):
+    """
+    Make the machine-readable report.
+    Rules are also listed slowest first, so the rule to optimise is on top.
+    """
+    return {
+        "total_seconds": round(total_seconds, 6),
+        "rules": timings,
+        "slowest_first": [t["rule"] for t in sorted(timings, key=lambda t: t["seconds"], reverse=True)],
+    }
+
+
+def fuse_procedure_rules(rules):
+    """
+    Replace the separate procedure .sparql rules with the fused rule,
+    which reads observation -> sample -> procedure one time for all of them.
+    The fused rule takes the place of the first rule it replaces.
+    """
+    fused_rule = PipelineRule("fused_procedure_rules", run=run_fused_procedure_rules, assesses=FUSED_ASSESSMENTS)
+    fused = []
+    for rule in rules:
+        if rule.name not in FUSED_ASSESSMENTS:
+            fused.append(rule)
+        elif fused_rule not in fused:
+            fused.append(fused_rule)
+    return fused
+
+
+def group_outlier_rules(rules, group_by, min_group_size=DEFAULT_MIN_GROUP_SIZE):
+    """
+    Run the IQR and z-score outlier rules with quartiles, means and deviations per
+    taxon ("scientific_name" or "genus"). They also read the sample part, which has the name.
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"Unknown group_by: {group_by}, use one of {GROUP_BY}")
+    grouped = []
+    for rule in rules:
+        if rule.name in GROUPED_RULES:
+            reads = rule.reads + tuple(part for part in ("sample",) if part not in rule.reads)
+            rule = PipelineRule(rule.name, run=rule.run, depends_on=rule.depends_on, assesses=rule.assesses,
+                                reads=reads, options={**rule.options, "group_by": group_by,
+                                                      "min_group_size": min_group_size},
+                                uses_frame=rule.uses_frame)
+        grouped.append(rule)
+    return grouped
+
+
+def reuse_robust_covariance_model(rules, model_path):
+    """
+    Run the robust covariance rule with model_path: the first run saves its fitted
+    estimator there, and later runs (e.g. the next chunks of a submission) score with it.
+    """
+    reused = []
+    for rule in rules:
+        if rule.name == ROBUST_COVARIANCE_RULE:
+            rule = PipelineRule(rule.name, run=rule.run, depends_on=rule.depends_on, assesses=rule.assesses,
+                                reads=rule.reads, options={**rule.options, "model_path": str(model_path)},
+                                uses_frame=rule.uses_frame)
+        reused.append(rule)
+    return reused
+
+
+def dependency_order(rules):
+    """
+    Sort rules so every rule comes after the rules it depends on.
+    A dependency can name a rule or an assessment that a rule writes.
+    Rules without a dependency between them keep their declared order.
+    """
+    provider = {}
+    for rule in rules:
+        provider[rule.name] = rule.name
+        for name in rule.assesses:
+            provider.setdefault(name, rule.name)
+    for rule in rules:
+        for dep in rule.depends_on:
+            if dep not in provider:
+                raise ValueError(f"Rule '{rule.name}' depends on unknown rule '{dep}'")
+
+    ordered = []
+    done = set()
+    remaining = list(rules)
+    while remaining:
+        ready = [rule for rule in remaining if all(provider[dep] in done for dep in rule.depends_on)]
+        if not ready:
+            names = ", ".join(rule.name for rule in remaining)
+            raise ValueError(f"Rules have a dependency cycle: {names}")
+        # Take the first ready rule, then look again from the start of the list
+        rule = ready[0]
+        ordered.append(rule)
+        done.add(rule.name)
+        remaining.remove(rule)
+    return ordered
+
+
+def load_store(paths) -> Store:
+    """Load all input Turtle files into one in-memory store."""
+    store = Store()
+    for path in paths:
+        store.load(path=str(path), format=RdfFormat.TURTLE)
+    return store
+
+
+def count_query(query: str) -> str:
+    """
+    The rule update as a SELECT that counts the solutions of its WHERE block,
+    which are the rows the rule reads.
+    """
+    counted, found = INSERT_TEMPLATE.subn("SELECT (COUNT(*) AS ?count)\n", query, count=1)
+    if not found:
+        raise ValueError("The rule query has no INSERT template before its WHERE block")
+    return counted
+
+
+def _count(store: Store, query: str) -> int:
+    row = next(iter(store.query(query)))
+    return int(row["count"].value)
+
+
+def cli(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m Convert.rules.pipeline",
+        description="Run all Convert rules on the input files and report the time of each rule.",
+    )
+    parser.add_argument("data", nargs="*", help="Turtle files to assess")
+    parser.add_argument("--store", help="Keep the data in a store in this directory and reuse it in later runs "
+                                        "(only new or changed files are loaded)")
+    parser.add_argument("--report", help="Write the timing report to this JSON file")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only assess new and changed observations of the --store, and run the "
+                             "dataset rules only when their data changed")
+    parser.add_argument("--fused", action="store_true",
+                        help="Run the coordinate, datum and accuracy rules with one shared query")
+    parser.add_argument("--group-outliers-by", choices=GROUP_BY,
+                        help="Use the quartiles, mean and deviation of each taxon in the IQR and z-score "
+                             "outlier rules instead of those of all records")
+    parser.add_argument("--min-group-size", type=int, default=DEFAULT_MIN_GROUP_SIZE,
+                        help="Taxa with fewer records use the statistics of all records "
+                             f"(default {DEFAULT_MIN_GROUP_SIZE})")
+    parser.add_argument("--robust-covariance-model",
+                        help="Save the estimator of the robust covariance rule to this file, or use the one "
+                             "saved there, so every chunk of a submission is scored with the same estimator")
+    parsed = parser.parse_args(args)
+    if not parsed.data and not parsed.store:
+        parser.error("give the Turtle files to assess, or a --store that already has them")
+    if parsed.incremental and not parsed.store:
+        parser.error("--incremental needs a --store to keep the results of the last run")
+    return parsed
+
+
+def main(args=None):
+    args = cli(sys.argv[1:] if args is None else args)
+
+    load_started = time.perf_counter()
+    if args.store:
+        store = open_store(args.store)
+        load_inputs(store, args.data)
+        if not args.incremental:
+            # Results of an earlier run on the saved store are made again
+            store.clear_graph(FULL_RESULTS)
+            store.clear_graph(FINGERPRINTS)
+    else:
+        store = load_store(args.data)
+    load_seconds = time.perf_counter() - load_started
+
+    report = RulePipeline(fused=args.fused, group_by=args.group_outliers_by,
+                          min_group_size=args.min_group_size,
+                          robust_covariance_model=args.robust_covariance_model).run(store, incremental=args.incremental)
+    report["load_seconds"] = round(load_seconds, 6)
+    report["inputs"] = [str(path) for path in args.data]
+    if args.store:
+        report["store"] = str(args.store)
+        store.flush()
+
+    print(f"{'rule':<40} {'kind':<7} {'seconds':>10} {'rows':>10} {'results':>10} {'quads':>10}")
+    for t in report["rules"]:
+        print(f"{t['rule']:<40} {t['kind']:<7} {t['seconds']:>10.3f} {t['rows_read']:>10} "
+              f"{t['results_written']:>10} {t['quads_written']:>10}")
+    print(f"Loaded in {report['load_seconds']:.3f}s, rules ran in {report['total_seconds']:.3f}s")
+    if "incremental" in report:
+        counts = report["incremental"]
+        print(f"Incremental: {counts['changed']} new or changed and {counts['removed']} removed "
+              f"of {counts['observations']} observations")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Timing report saved to '{args.report}'")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+from pyoxigraph import Store, NamedNode, BlankNode, Literal, RdfFormat
+
+# RDF terms used for every result
+DQAF_BASE = "http://example.com/def/dqaf/"
+FULL_RESULTS = NamedNode(DQAF_BASE + "fullResults")
+HAS_RESULT = NamedNode(DQAF_BASE + "hasResult")
+OBSERVED_PROPERTY = NamedNode("http://www.w3.org/ns/sosa/observedProperty")
+VALUE = NamedNode("http://schema.org/value")
+
+# Results are written in batches of this many observations
+DEFAULT_BATCH_SIZE = 50_000
+
+
+def write_results(store: Store, observations, codes, labels, observed_property: str,
+                  batch_size: int = DEFAULT_BATCH_SIZE, bulk: bool = False) -> int:
+    """
+    Write one result per observation into the dqaf:fullResults graph.
+
+    - observations: observation URIs (without < >)
+    - codes: label code for each observation (index into labels)
+    - labels: the label values, e.g. ("normal_coordinate", "outlier_coordinate").
+      A label of None writes the result without schema:value, the same as
+      a SPARQL rule where the label is not bound.
+    - observed_property: the assessment URI, e.g. "http://example.com/assess/coordinate_outlier_iqr/"
+    - bulk: use Store.bulk_load (faster, but not transactional)
+
+    The shape is the same as the SPARQL rules make:
+      <obs> dqaf:hasResult [ sosa:observedProperty <assess> ; schema:value "label" ]
+
+    Each batch is loaded as N-Quads text, so the store parses it in one call
+    instead of making one Python Quad object per triple.
+
+    Returns the number of quads written.
+    """
+    # Make the text of each RDF term one time, not one time per observation
+    graph = f" {FULL_RESULTS} .\n"
+    has_result = f" {HAS_RESULT} "
+    result_property = f" {OBSERVED_PROPERTY} {NamedNode(observed_property)}{graph}"
+    values = [None if label is None else f" {VALUE} {Literal(label)}{graph}" for label in labels]
+    load = store.bulk_load if bulk else store.load
+    # Boolean masks work too: False -> labels[0], True -> labels[1]
+    codes = np.asarray(codes, dtype=np.intp).tolist()
+
+    # Blank node labels of this call, so they do not clash with earlier results
+    prefix = f"_:r{BlankNode().value}_"
+
+    written = 0
+    lines = []
+    for i, (obs_uri, code) in enumerate(zip(observations, codes)):
+        result = f"{prefix}{i}"
+        # NamedNode checks that the URI is valid before it goes into the text
+        lines.append(f"{NamedNode(obs_uri)}{has_result}{result}{graph}{result}{result_property}")
+        written += 2
+        if values[code] is not None:
+            lines.append(f"{result}{values[code]}")
+            written += 1
+
+        if len(lines) >= batch_size:
+            load("".join(lines).encode("utf-8"), format=RdfFormat.N_QUADS)
+            lines = []
+
+    if lines:
+        load("".join(lines).encode("utf-8"), format=RdfFormat.N_QUADS)
+    return written
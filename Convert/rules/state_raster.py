@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# The coastline shapefiles that come with the old implementation
+MAP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                       "Old Implementation", "dq", "map")
+DEFAULT_RASTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_raster.npy")
+DEFAULT_RESOLUTION = 0.01  # degrees
+
+# Same states and order as AustraliaGeographyChecker: when a point is in two states, the first one is used
+STATE_SHAPEFILES = {
+    "New_South_Wales": os.path.join(MAP_DIR, "new_south_wales", "cstnswcd_r.shp"),
+    "Victoria": os.path.join(MAP_DIR, "victoria", "cstviccd_r.shp"),
+    "Queensland": os.path.join(MAP_DIR, "queensland", "cstqldmd_r.shp"),
+    "Western_Australia": os.path.join(MAP_DIR, "western_australia", "cstwacd_r.shp"),
+    "South_Australia": os.path.join(MAP_DIR, "south_australia", "cstsacd_r.shp"),
+    "Tasmania": os.path.join(MAP_DIR, "tasmania", "csttascd_r.shp"),
+    "Northern_Territory": os.path.join(MAP_DIR, "northern_territory", "cstntcd_r.shp"),
+    "Australian_Capital_Territory": os.path.join(MAP_DIR, "australia", "cstauscd_r.shp"),
+}
+
+# Cell values: 0 = in no state, 1..254 = state number + 1, 255 = a border runs through the cell
+OUTSIDE = 0
+BORDER = 255
+
+# Rows of the raster that are filled at one time while building
+BUILD_ROWS = 256
+
+
+class StateRaster:
+    """
+    A grid of state numbers over Australia.
+    Points in a cell with one state get it by array indexing.
+    Points in a border cell are checked against the polygons.
+    """
+
+    def __init__(self, cells, min_lon, min_lat, resolution, states, shapefiles):
+        self.cells = cells
+        self.min_lon = min_lon
+        self.min_lat = min_lat
+        self.resolution = resolution
+        self.states = list(states)
+        self.shapefiles = dict(shapefiles)
+        self._polygons = None
+
+    @classmethod
+    def load(cls, path=DEFAULT_RASTER_PATH):
+        """Open a raster made by build_state_raster. The cells are memory-mapped, not read."""
+        with open(_metadata_path(path), "r") as f:
+            metadata = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+        shapefiles = {name: os.path.join(base, shapefile) for name, shapefile in metadata["shapefiles"].items()}
+        return cls(np.load(path, mmap_mode="r"), metadata["min_lon"], metadata["min_lat"],
+                   metadata["resolution"], metadata["states"], shapefiles)
+
+    def lookup(self, lons, lats) -> np.ndarray:
+        """
+        State number + 1 of each point (0 when the point is in no state).
+        A point on the edge of a polygon is not in it, the same as GeoDataFrame.contains.
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        n_rows, n_cols = self.cells.shape
+
+        # Step 1: Cell of each point (NaN and points off the grid are outside)
+        cols = np.floor((lons - self.min_lon) / self.resolution)
+        rows = np.floor((lats - self.min_lat) / self.resolution)
+        on_grid = (cols >= 0) & (cols < n_cols) & (rows >= 0) & (rows < n_rows)
+
+        states = np.full(len(lons), OUTSIDE, dtype=np.uint8)
+        states[on_grid] = self.cells[rows[on_grid].astype(np.intp), cols[on_grid].astype(np.intp)]
+
+        # Step 2: Exact polygon test only for points in border cells
+        border = states == BORDER
+        if border.any():
+            states[border] = self._exact_lookup(lons[border], lats[border])
+        return states
+
+    def find_states(self, lons, lats) -> np.ndarray:
+        """State name of each point, or "Outside Australia"."""
+        names = np.array(["Outside Australia"] + self.states, dtype=object)
+        return names[self.lookup(lons, lats)]
+
+    def _exact_lookup(self, lons, lats):
+        if self._polygons is None:
+            self._polygons = load_state_polygons(self.shapefiles)
+        geometries, polygon_states = self._polygons
+        return exact_lookup(geometries, polygon_states, lons, lats)
+
+
+def load_state_polygons(shapefiles):
+    """
+    Read the state shapefiles in order.
+    Returns the polygons (prepared) and the state number of each polygon.
+    Missing shapefiles are skipped with a warning.
+    """
+    geometries = []
+    polygon_states = []
+    for state_number, (state, shapefile) in enumerate(shapefiles.items()):
+        if not os.path.exists(shapefile):
+            print(f"⚠️ Shapefile for {state} not found: {shapefile}")
+            continue
+        state_geometries = gpd.read_file(shapefile).to_crs(epsg=4326).geometry
+        state_geometries = state_geometries[~(state_geometries.isna() | state_geometries.is_empty)].values
+        geometries.extend(state_geometries)
+        polygon_states.extend([state_number] * len(state_geometries))
+
+    geometries = np.array(geometries, dtype=object)
+    shapely.prepare(geometries)
+    return geometries, np.array(polygon_states, dtype=np.intp)
+
+
+def exact_lookup(geometries, polygon_states, lons, lats):
+    """State number + 1 of each point by polygon tests (first state wins)."""
+    points = shapely.points(lons, lats)
+    states = np.full(len(points), np.iinfo(np.intp).max, dtype=np.intp)
+    if len(points) and len(geometries):
+        # Put the points in an STRtree and ask which points each prepared polygon contains
+        polygon_index, point_index = shapely.STRtree(points).query(geometries, predicate="contains")
+        np.minimum.at(states, point_index, polygon_states[polygon_index])
+    return np.where(states == np.iinfo(np.intp).max, OUTSIDE, states + 1).astype(np.uint8)
+
+
+def build_state_raster(shapefiles=None, output_path=DEFAULT_RASTER_PATH, resolution=DEFAULT_RESOLUTION):
+    """
+    Build the state raster and save it as a .npy file (cells) and a .json file (grid and states).
+    """
+    shapefiles = STATE_SHAPEFILES if shapefiles is None else shapefiles
+    if len(shapefiles) > BORDER - 1:
+        raise ValueError(f"At most {BORDER - 1} states fit in the raster")
+
+    # Step 1: Read the polygons of all states
+    geometries, polygon_states = load_state_polygons(shapefiles)
+    if len(geometries) == 0:
+        raise ValueError("No state polygons found")
+
+    # Step 2: Make the grid, with one spare cell around the polygons
+    min_x, min_y, max_x, max_y = shapely.total_bounds(geometries)
+    min_lon = float(np.floor(min_x / resolution) * resolution - resolution)
+    min_lat = float(np.floor(min_y / resolution) * resolution - resolution)
+    n_cols = int(np.ceil((max_x - min_lon) / resolution)) + 2
+    n_rows = int(np.ceil((max_y - min_lat) / resolution)) + 2
+    cells = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8, shape=(n_rows, n_cols))
+    cells[:] = OUTSIDE
+
+    # Step 3: State of each cell centre. Polygons are done in state order and
+    # a cell that already has a state is not changed, so the first state wins.
+    bounds = shapely.bounds(geometries)
+    for row_start in range(0, n_rows, BUILD_ROWS):
+        row_end = min(row_start + BUILD_ROWS, n_rows)
+        band_min = min_lat + row_start * resolution
+        band_max = min_lat + row_end * resolution
+        in_band = (bounds[:, 1] <= band_max) & (bounds[:, 3] >= band_min)
+
+        for geometry, state_number, (x0, y0, x1, y1) in zip(geometries[in_band], polygon_states[in_band],
+                                                           bounds[in_band]):
+            r0 = max(int((y0 - min_lat) / resolution), row_start)
+            r1 = min(int((y1 - min_lat) / resolution) + 1, row_end)
+            c0 = max(int((x0 - min_lon) / resolution), 0)
+            c1 = min(int((x1 - min_lon) / resolution) + 1, n_cols)
+            block = cells[r0:r1, c0:c1]
+            free = block == OUTSIDE
+            if not free.any():
+                continue
+            rows, cols = np.nonzero(free)
+            xs = min_lon + (cols + c0 + 0.5) * resolution
+            ys = min_lat + (rows + r0 + 0.5) * resolution
+            inside = shapely.contains_xy(geometry, xs, ys)
+            block[rows[inside], cols[inside]] = state_number + 1
+
+    # Step 4: Mark every cell a polygon edge runs through, and the cells next to it, as BORDER.
+    # Edges are split into steps of half a cell, so a cell an edge only clips at a
+    # corner is always next to a cell with a point of the edge.
+    border = np.zeros((n_rows, n_cols), dtype=bool)
+    edges = shapely.segmentize(shapely.boundary(geometries), resolution / 2)
+    coords = shapely.get_coordinates(edges)
+    cols = np.floor((coords[:, 0] - min_lon) / resolution).astype(np.intp)
+    rows = np.floor((coords[:, 1] - min_lat) / resolution).astype(np.intp)
+    border[rows, cols] = True
+    grown = border.copy()
+    grown[1:, :] |= border[:-1, :]
+    grown[:-1, :] |= border[1:, :]
+    border = grown.copy()
+    grown[:, 1:] |= border[:, :-1]
+    grown[:, :-1] |= border[:, 1:]
+    cells[grown] = BORDER
+    cells.flush()
+
+    # Step 5: Save the grid and the states next to the cells
+    base = os.path.dirname(os.path.abspath(output_path))
+    metadata = {
+        "min_lon": min_lon,
+        "min_lat": min_lat,
+        "resolution": resolution,
+        "states": list(shapefiles.keys()),
+        "shapefiles": {name: os.path.relpath(os.path.abspath(shapefile), base)
+                       for name, shapefile in shapefiles.items()},
+    }
+    with open(_metadata_path(output_path), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"State raster {n_rows} x {n_cols} saved to '{output_path}' "
+          f"({int(grown.sum())} border cells)")
+    return StateRaster.load(output_path)
+
+
+_cache = {"path": None, "mtime": None, "raster": None}
+
+
+def load_state_raster(path=DEFAULT_RASTER_PATH):
+    """
+    Open the raster one time per process (again only when the file changes).
+    Returns None when the raster has not been built.
+    """
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _cache["path"] != path or _cache["mtime"] != mtime:
+        _cache.update(path=path, mtime=mtime, raster=StateRaster.load(path))
+    return _cache["raster"]
+
+
+def _metadata_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the state raster for the in-Australia check.")
+    parser.add_argument("--output", default=DEFAULT_RASTER_PATH, help="Path of the .npy file")
+    parser.add_argument("--resolution", type=float, default=DEFAULT_RESOLUTION, help="Cell size in degrees")
+    args = parser.parse_args()
+    build_state_raster(output_path=args.output, resolution=args.resolution)
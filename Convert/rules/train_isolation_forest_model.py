@@ -1,8 +1,9 @@
 import pandas as pd
-import joblib
 from sklearn.ensemble import IsolationForest
 import folium
 
+from Convert.rules.model_registry import save_model
+
 # Input/output paths
 TRAINING_PATH = "../test_data_generation/training_coordinates.csv"
 MODEL_PATH = "isolation_forest_model.pkl"
@@ -30,7 +31,7 @@ def train_model(input_csv=TRAINING_PATH, model_path=MODEL_PATH):
     # === Train the model ===
     model = IsolationForest(contamination=0.1, random_state=42)
     model.fit(coords_train)
-    joblib.dump(model, model_path)
+    save_model(model, model_path, training_size=len(coords_train), feature_order=["lon", "lat"])
     print(f"Model saved to {model_path}")
 
     # === Step 2: Predict on all points ===
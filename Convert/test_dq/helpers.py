@@ -0,0 +1,92 @@
+# Data and result helpers shared by the Convert rule tests
+from collections import Counter
+
+from pyoxigraph import Store
+
+from Convert.test_data_generation.data_generation_coordinate_completeness import create_coordinate_completeness_test_data
+from Convert.test_data_generation.data_generation_coordinate_precision import create_coordinate_precision_test_data
+from Convert.test_data_generation.data_generation_coordinate_unusual import create_coordinate_unusual_test_data
+from Convert.test_data_generation.data_generation_datum_completeness import create_datum_completeness_test_data
+from Convert.test_data_generation.data_generation_datum_type import create_datum_type_test_data
+from Convert.test_data_generation.data_generation_geospatial_accuracy_precision import create_geospatial_accuracy_precision_test_data
+
+# Records with more than one geometry, WKT, datum or accuracy, and values the rules can not read
+EDGE_CASES = """
+@prefix tern: <https://w3id.org/tern/ontologies/tern/> .
+@prefix sosa: <http://www.w3.org/ns/sosa/> .
+@prefix geo:  <http://www.opengis.net/ont/geosparql#> .
+@prefix xsd:  <http://www.w3.org/2001/XMLSchema#> .
+@prefix ex:   <http://example.com/edge/> .
+
+ex:obs_many a tern:Observation ; sosa:hasFeatureOfInterest ex:sample_many .
+ex:sample_many a tern:Sample ; sosa:isResultOf ex:proc_many .
+ex:proc_many geo:hasGeometry ex:geom_a , ex:geom_b , ex:geom_empty ;
+    geo:hasGeometryDatum "GDA2020" , <http://www.opengis.net/def/crs/EPSG/0/4326> , "wgs84 (gda94)" ;
+    geo:hasMetricSpatialAccuracy "10000.0001" , "10000.001" , "NaN" , " 5 " , "5"@en , _:acc .
+ex:geom_a geo:asWKT "POINT(145.123123123 -37.1)" , "<http://www.opengis.net/def/crs/EPSG/0/4283> POINT (1.55 2.5)" .
+ex:geom_b geo:asWKT _:wkt .
+
+ex:obs_two_samples a tern:Observation ; sosa:hasFeatureOfInterest ex:sample_x , ex:sample_y .
+ex:sample_x a tern:Sample ; sosa:isResultOf ex:proc_many , ex:proc_bare .
+ex:sample_y a tern:Sample ; sosa:isResultOf ex:proc_numbers .
+ex:proc_numbers geo:hasGeometry ex:geom_n ;
+    geo:hasMetricSpatialAccuracy "20000"^^xsd:integer , "1.5e3"^^xsd:double , "true"^^xsd:boolean , "INF" , "abc" .
+ex:geom_n geo:asWKT "POINT(145.12345 -37.98765)" .
+
+ex:obs_no_sample a tern:Observation .
+"""
+
+
+def results_of(store):
+    """All results as a Counter of (observation, assessment, value or None)."""
+    query = """
+    PREFIX dqaf: <http://example.com/def/dqaf/>
+    PREFIX sosa: <http://www.w3.org/ns/sosa/>
+    PREFIX schema: <http://schema.org/>
+
+    SELECT ?observation ?property ?value
+    WHERE {
+      GRAPH dqaf:fullResults {
+        ?observation dqaf:hasResult ?result .
+        ?result sosa:observedProperty ?property .
+        OPTIONAL { ?result schema:value ?value . }
+      }
+    }
+    """
+    return Counter(
+        (row["observation"].value, row["property"].value.split("/")[-2],
+         None if row["value"] is None else row["value"].value)
+        for row in store.query(query)
+    )
+
+
+def load_test_store():
+    store = Store()
+    for make_data in [create_coordinate_completeness_test_data, create_coordinate_precision_test_data,
+                      create_coordinate_unusual_test_data, create_datum_completeness_test_data,
+                      create_datum_type_test_data, create_geospatial_accuracy_precision_test_data]:
+        store.load(make_data().encode("utf-8"), format="text/turtle")
+    store.load(EDGE_CASES.encode("utf-8"), format="text/turtle")
+    return store
+
+
+def make_taxon_data(points, start=0):
+    """
+    Turtle with one observation per (name, lon, lat), numbered from start;
+    name None leaves out dwc:scientificName.
+    """
+    lines = [
+        "@prefix tern: <https://w3id.org/tern/ontologies/tern/> .",
+        "@prefix sosa: <http://www.w3.org/ns/sosa/> .",
+        "@prefix geo:  <http://www.opengis.net/ont/geosparql#> .",
+        "@prefix dwc:  <http://rs.tdwg.org/dwc/terms/> .",
+        "@prefix ex:   <http://example.com/test/> .",
+    ]
+    for i, (name, lon, lat) in enumerate(points, start):
+        lines.append(f"ex:obs_{i} a tern:Observation ; sosa:hasFeatureOfInterest ex:sample_{i} .")
+        lines.append(f"ex:sample_{i} a tern:Sample ; sosa:isResultOf ex:proc_{i} .")
+        if name is not None:
+            lines.append(f'ex:sample_{i} dwc:scientificName "{name}" .')
+        lines.append(f"ex:proc_{i} geo:hasGeometry ex:geom_{i} .")
+        lines.append(f'ex:geom_{i} geo:asWKT "POINT({lon} {lat})" .')
+    return "\n".join(lines)
@@ -0,0 +1,42 @@
+import itertools
+
+import numpy as np
+
+from Convert.rules.clustering_1d import kmeans_1d, best_n_clusters
+
+
+def sum_of_squares(values, labels):
+    return sum(((values[labels == c] - values[labels == c].mean()) ** 2).sum() for c in np.unique(labels))
+
+
+def test_kmeans_1d_is_optimal():
+    # Step 1: Small random cases, checked against every way to cut the sorted distinct values
+    rng = np.random.default_rng(3)
+    for _ in range(100):
+        values = rng.integers(1900, 1920, size=rng.integers(3, 9)).astype(float)
+        n_clusters = int(rng.integers(1, 4))
+        labels = kmeans_1d(values, n_clusters)
+
+        distinct = np.unique(values)
+        k = min(n_clusters, len(distinct))
+        best = min(sum_of_squares(values, np.searchsorted(np.array(cuts), values, side="right"))
+                   for cuts in itertools.combinations(distinct[1:], k - 1))
+        assert np.isclose(sum_of_squares(values, labels), best)
+        # Clusters are numbered from the lowest values
+        assert (np.diff(labels[np.argsort(values, kind="stable")]) >= 0).all()
+
+
+def test_kmeans_1d_many_timestamps():
+    # Step 1: A million timestamps in two groups, more distinct values than bins
+    rng = np.random.default_rng(5)
+    timestamps = np.concatenate([rng.normal(1.6e9, 1e6, 999_000), rng.normal(0.9e9, 1e6, 1000)])
+    labels = kmeans_1d(timestamps, 2)
+    assert np.bincount(labels).tolist() == [1000, 999_000]
+
+    # Step 2: The silhouette of each k is computed on a sample, and k=2 is the best
+    years = np.concatenate([rng.integers(2000, 2021, 9000), rng.integers(1950, 1953, 100)])
+    best_k, labels = best_n_clusters(years, sample_size=2000)
+    assert best_k == 2
+    assert np.bincount(labels).tolist() == [100, 9000]
+    assert (labels[years < 1960] == 0).all()
+    assert best_n_clusters([2020, 2020, 2020]) == (2, None)
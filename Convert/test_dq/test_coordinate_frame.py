@@ -0,0 +1,57 @@
+import numpy as np
+from pyoxigraph import Store
+
+from Convert.rules.coordinate_frame import load_coordinate_frame
+from Convert.rules.coordinate_outlier_iqr import run_coordinate_outlier_iqr
+from Convert.rules.pipeline import PipelineRule, RulePipeline
+from Convert.test_data_generation.data_generation_coordinate_outlier_iqr import create_coordinate_outlier_iqr_test_data
+
+
+def test_coordinate_frame_is_shared_between_rules():
+    # Step 1: Load the IQR test data (213 points)
+    store = Store()
+    store.load(create_coordinate_outlier_iqr_test_data().encode("utf-8"), format="text/turtle")
+
+    # Step 2: Build the frame and check the columns
+    frame = load_coordinate_frame(store)
+    assert len(frame) == 213
+    assert frame.lons.dtype == np.float64 and frame.lats.dtype == np.float64
+    assert "http://example.com/test/obs_210" in set(frame.observations)
+
+    # Step 3: The pipeline builds the frame one time and gives it to every rule that uses it
+    frames = []
+
+    def record_frame(store, frame):
+        frames.append(frame)
+        run_coordinate_outlier_iqr(store, frame=frame)
+
+    rules = [PipelineRule("coordinate_outlier_iqr", run=record_frame, uses_frame=True),
+             PipelineRule("coordinate_outlier_zscore", run=record_frame, uses_frame=True)]
+    RulePipeline(rules=rules).run(store)
+    assert len(frames) == 2 and frames[0] is frames[1]
+    assert len(frames[0]) == 213
+
+    # Step 4: The next run reads the new input data
+    store.update("""
+    PREFIX tern: <https://w3id.org/tern/ontologies/tern/>
+    PREFIX sosa: <http://www.w3.org/ns/sosa/>
+    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+    INSERT DATA {
+      <http://example.com/test/obs_new> a tern:Observation ;
+          sosa:hasFeatureOfInterest <http://example.com/test/sample_new> .
+      <http://example.com/test/sample_new> a tern:Sample ;
+          sosa:isResultOf <http://example.com/test/proc_new> .
+      <http://example.com/test/proc_new> geo:hasGeometry <http://example.com/test/geom_new> .
+      <http://example.com/test/geom_new> geo:asWKT
+          "<http://www.opengis.net/def/crs/EPSG/0/4283> POINT (145.5 -37.25)" .
+    }
+    """)
+    RulePipeline(rules=rules).run(store)
+    new_frame = frames[-1]
+    assert new_frame is not frames[0]
+    assert len(new_frame) == 214
+
+    # The WKT with a CRS prefix and a space after POINT is also parsed
+    index = list(new_frame.observations).index("http://example.com/test/obs_new")
+    assert new_frame.lons[index] == 145.5
+    assert new_frame.lats[index] == -37.25
@@ -1,6 +1,12 @@
 import folium
+import numpy as np
 from pyoxigraph import Store
-from Convert.rules.coordinate_outlier_robust_covariance import run_coordinate_outlier_robust_covariance
+from sklearn.covariance import MinCovDet
+from Convert.rules.coordinate_outlier_robust_covariance import run_coordinate_outlier_robust_covariance, \
+    robust_covariance_model, mahalanobis_in_batches, LABELS
+from Convert.rules.model_registry import clear_model_registry, load_model
+from Convert.rules.pipeline import DEFAULT_RULES, ROBUST_COVARIANCE_RULE, RulePipeline, main
+from Convert.test_dq.helpers import results_of, make_taxon_data
 from Convert.test_data_generation.data_generation_coordinate_outlier_robust_covariance import create_coordinate_outlier_robust_covariance_test_data
 
 def test_dq_coordinate_outlier_robust_covariance_map():
@@ -63,6 +69,84 @@ def test_dq_coordinate_outlier_robust_covariance_map():
     m.save("test_dq_coordinate_outlier_robust_covariance_map.html")
     print("Map saved: test_dq_coordinate_outlier_robust_covariance_map.html")
 
+
+def test_robust_covariance_fitted_on_a_sample_and_reused(tmp_path):
+    # Step 1: Coordinates around Melbourne with a few far away
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.normal(145, 0.1, 3000), rng.normal(-37.8, 0.1, 3000)])
+    coords[:5] += 3
+
+    # Step 2: The same sample is fitted each time, and the batched distances are the same as MinCovDet's
+    model = robust_covariance_model(coords, max_fit_size=500, random_state=1)
+    again = robust_covariance_model(coords, max_fit_size=500, random_state=1)
+    assert np.array_equal(model.location_, again.location_)
+    assert np.allclose(mahalanobis_in_batches(model, coords, batch_size=700), model.mahalanobis(coords))
+    assert (mahalanobis_in_batches(model, coords)[:5] > 5.0).all()
+
+    # Step 3: Small inputs are fitted on all coordinates
+    small = robust_covariance_model(coords[:400])
+    assert np.allclose(small.covariance_, MinCovDet(random_state=0).fit(coords[:400]).covariance_)
+
+    # Step 4: The first chunk saves the estimator, the next chunk is scored with it
+    model_path = str(tmp_path / "robust_covariance.pkl")
+    clear_model_registry()
+    saved = robust_covariance_model(coords[:1000], model_path=model_path)
+    loaded = robust_covariance_model(coords[1000:], model_path=model_path)
+    assert np.array_equal(loaded.location_, saved.location_)
+
+    # Step 5: The rule labels the next chunk with the saved estimator
+    chunk = coords[1000:1300].copy()
+    chunk[:3] += 3
+    store = Store()
+    store.load(make_taxon_data([(None, lon, lat) for lon, lat in chunk], start=1000).encode("utf-8"),
+               format="text/turtle")
+    run_coordinate_outlier_robust_covariance(store, model_path=model_path)
+    labels = labels_of(store)
+    expected = mahalanobis_in_batches(saved, chunk) > 5.0
+    assert labels == {f"http://example.com/test/obs_{1000 + i}": LABELS[is_out] for i, is_out in enumerate(expected.tolist())}
+    assert [labels[f"http://example.com/test/obs_{i}"] for i in range(1000, 1003)] == ["outlier_coordinate"] * 3
+
+
+def test_pipeline_reuses_the_robust_covariance_model(tmp_path):
+    # Step 1: Two chunks of one submission around Melbourne, the second with a few far away points
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.normal(145, 0.1, 400), rng.normal(-37.8, 0.1, 400)])
+    coords[300:303] += 3
+    first, second = tmp_path / "chunk_1.ttl", tmp_path / "chunk_2.ttl"
+    first.write_text(make_taxon_data([(None, lon, lat) for lon, lat in coords[:300]]), encoding="utf-8")
+    second.write_text(make_taxon_data([(None, lon, lat) for lon, lat in coords[300:]], start=300),
+                      encoding="utf-8")
+
+    # Step 2: The first chunk fits the estimator and saves it
+    model_path = tmp_path / "robust_covariance.pkl"
+    clear_model_registry()
+    main([str(first), "--robust-covariance-model", str(model_path)])
+    assert model_path.exists()
+    fitted = load_model(str(model_path)).model
+
+    # Step 3: The second chunk is scored with the saved estimator, the far away points are outliers
+    rules = [rule for rule in DEFAULT_RULES if rule.name in ("coordinate_completeness", ROBUST_COVARIANCE_RULE)]
+    store = Store()
+    store.load(path=str(second), format="text/turtle")
+    RulePipeline(rules, robust_covariance_model=model_path).run(store)
+    labels = labels_of(store)
+    expected = mahalanobis_in_batches(fitted, coords[300:]) > 5.0
+    assert labels == {f"http://example.com/test/obs_{300 + i}": LABELS[is_out] for i, is_out in enumerate(expected.tolist())}
+    assert [labels[f"http://example.com/test/obs_{i}"] for i in range(300, 303)] == ["outlier_coordinate"] * 3
+
+    # Step 4: Running again from the saved file gives the same labels
+    clear_model_registry()
+    again = Store()
+    again.load(path=str(second), format="text/turtle")
+    RulePipeline(rules, robust_covariance_model=model_path).run(again)
+    assert labels_of(again) == labels
+
+
+def labels_of(store):
+    """The robust covariance label of each observation."""
+    return {observation: value for (observation, assessment, value) in results_of(store)
+            if assessment == "coordinate_outlier_robust_covariance"}
+
 # Run this test if the script is executed directly
 if __name__ == "__main__":
     test_dq_coordinate_outlier_robust_covariance_map()
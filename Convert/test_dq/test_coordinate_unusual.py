@@ -0,0 +1,53 @@
+import re
+
+import numpy as np
+import pandas as pd
+from pyoxigraph import Store
+
+from Convert.rules.coordinate_unusual import unusual_decimals, coordinate_unusual_codes, run_coordinate_unusual
+from Convert.rules.fused_procedure_rules import run_fused_procedure_rules
+from Convert.test_dq.helpers import EDGE_CASES, results_of, load_test_store
+
+# The pattern of assess_coordinate_unusual.sparql
+UNUSUAL_PATTERN = re.compile(r"([0-9]{1,3})\1{2,}")
+
+
+def test_unusual_decimals_match_the_sparql_pattern():
+    # Step 1: Known cases, with a group of one, two and three digits
+    decimals = ["111", "11", "121212", "12121", "123123123", "12312312", "9876543", "", "1a1a1a", "50000"]
+    assert unusual_decimals(decimals).tolist() == [True, False, True, False, True, False, False, False, False, True]
+
+    # Step 2: Random decimals, in small batches, give the same answer as the regex
+    rng = np.random.default_rng(7)
+    decimals = ["".join(rng.choice(list("0123"), size=rng.integers(0, 12))) for _ in range(5000)]
+    expected = [UNUSUAL_PATTERN.search(d) is not None for d in decimals]
+    assert unusual_decimals(decimals, batch_size=700).tolist() == expected
+
+
+def test_coordinate_unusual_codes():
+    wkts = pd.Series(["POINT(145.123123123 -37.1)", "POINT(145.12 -37.555)", "POINT(145.12 -37.5)",
+                      "POINT (1.555 2.5)", None], dtype=object)
+    codes, labels = coordinate_unusual_codes(wkts)
+    # "POINT (" has no "POINT(", so there are no decimals to check
+    assert [labels[c] for c in codes] == ["unusual", "unusual", "usual", "usual", None]
+
+
+def test_run_coordinate_unusual_matches_fused_rule():
+    # Step 1: Run the pipeline rule and the fused rule on the same data
+    separate = load_test_store()
+    run_coordinate_unusual(separate)
+    fused = load_test_store()
+    run_fused_procedure_rules(fused)
+
+    # Step 2: Same labels for every observation
+    def unusual(results):
+        return {key: n for key, n in results.items() if key[1] == "coordinate_unusual"}
+
+    assert unusual(results_of(separate)) == unusual(results_of(fused))
+    assert results_of(separate)[("http://example.com/edge/obs_many", "coordinate_unusual", "unusual")] == 1
+
+    # Step 3: A store with no geometries writes nothing
+    empty = Store()
+    empty.load(EDGE_CASES.split("ex:obs_many")[0].encode("utf-8"), format="text/turtle")
+    run_coordinate_unusual(empty)
+    assert not results_of(empty)
@@ -54,3 +54,76 @@ def test_duplicate_entries():
         assert obs_uri in actual, f"Missing: {obs_uri}"
         assert actual[obs_uri] == expected_val, \
             f"Expected: {expected_val}, Got: {actual[obs_uri]}"
+
+
+# Records with missing parts, two features, a blank node WKT and a name with "||" in it
+DUPLICATE_EDGE_CASES = """
+@prefix tern: <https://w3id.org/tern/ontologies/tern/> .
+@prefix sosa: <http://www.w3.org/ns/sosa/> .
+@prefix geo:  <http://www.opengis.net/ont/geosparql#> .
+@prefix dwc:  <http://rs.tdwg.org/dwc/terms/> .
+@prefix time: <http://www.w3.org/2006/time#> .
+@prefix ex:   <http://example.com/edge/> .
+
+ex:obs_a a tern:Observation ; sosa:hasFeatureOfInterest ex:f_a .
+ex:obs_b a tern:Observation ; sosa:hasFeatureOfInterest ex:f_b .
+ex:f_a dwc:scientificName "Acacia" .
+ex:f_b dwc:scientificName "Acacia" .
+
+ex:obs_two a tern:Observation ; sosa:hasFeatureOfInterest ex:f_x , ex:f_y ;
+    time:hasTime ex:t_two .
+ex:t_two time:inXSDgYear "2001" .
+ex:f_x sosa:isResultOf ex:p_x . ex:p_x geo:hasGeometry ex:g_x . ex:g_x geo:asWKT _:wkt .
+ex:f_y sosa:isResultOf ex:p_y . ex:p_y geo:hasGeometry ex:g_y . ex:g_y geo:asWKT "POINT(1 2)" .
+
+ex:obs_pipe a tern:Observation ; sosa:hasFeatureOfInterest ex:f_pipe .
+ex:f_pipe dwc:scientificName "A||2001" .
+ex:obs_name a tern:Observation ; sosa:hasFeatureOfInterest ex:f_name ; time:hasTime ex:t_name .
+ex:f_name dwc:scientificName "A" .
+ex:t_name time:inXSDgYear "2001||" .
+
+ex:obs_alone a tern:Observation ; sosa:hasFeatureOfInterest ex:f_alone .
+"""
+
+
+def test_duplicate_engine_matches_sparql_rule():
+    from collections import Counter
+    from Convert.rules.duplicate_entries import run_duplicate_entries
+
+    query = """
+    PREFIX dqaf: <http://example.com/def/dqaf/>
+    PREFIX sosa: <http://www.w3.org/ns/sosa/>
+    PREFIX schema: <http://schema.org/>
+
+    SELECT ?observation ?value
+    WHERE {
+      GRAPH dqaf:fullResults {
+        ?observation dqaf:hasResult [
+          sosa:observedProperty <http://example.com/assess/duplicate/> ;
+          schema:value ?value
+        ] .
+      }
+    }
+    """
+    ttl = create_duplicate_test_data().encode("utf-8")
+
+    # Step 1: Run the SPARQL rule and the Python engine on the same data
+    results = {}
+    for engine in ["sparql", "python"]:
+        store = Store()
+        store.load(ttl, format="text/turtle")
+        store.load(DUPLICATE_EDGE_CASES.encode("utf-8"), format="text/turtle")
+        if engine == "sparql":
+            with open("../queries/assess_duplicate_entries.sparql", "r") as f:
+                store.update(f.read())
+        else:
+            # A small chunk size so the keys are hashed in several chunks
+            run_duplicate_entries(store, chunk_size=2)
+        results[engine] = Counter((row["observation"].value, row["value"].value) for row in store.query(query))
+
+    # Step 2: Same results, with the same number of results per observation
+    assert results["python"] == results["sparql"]
+    assert results["python"][("http://example.com/edge/obs_a", "duplicate_entry")] == 1
+    assert results["python"][("http://example.com/edge/obs_two", "unique_entry")] == 2
+    assert results["python"][("http://example.com/edge/obs_pipe", "duplicate_entry")] == 1
+    assert results["python"][("http://example.com/test/obs3", "unique_entry")] == 1
@@ -0,0 +1,54 @@
+from collections import Counter
+
+from Convert.rules.fused_procedure_rules import run_fused_procedure_rules, FUSED_ASSESSMENTS, PROCEDURE_QUERY
+from Convert.rules.result_writer import FULL_RESULTS
+from Convert.test_dq.helpers import results_of, load_test_store
+
+SPARQL_FILES = {
+    "coordinate_completeness": "../queries/assess_coordinate_completeness.sparql",
+    "coordinate_precision": "../queries/assess_coordinate_precision.sparql",
+    "coordinate_unusual": "../queries/assess_coordinate_unusual.sparql",
+    "geo_spatial_accuracy_precision": "../queries/assess_geo_spatial_accuracy_precision.sparql",
+    "datum_completeness": "../queries/assess_datum_completeness.sparql",
+    "datum_type": "../queries/assess_datum_validation.sparql",
+}
+
+
+def test_fused_rules_match_sparql_files():
+    # Step 1: Run the six .sparql files on one store
+    separate = load_test_store()
+    for name in FUSED_ASSESSMENTS:
+        with open(SPARQL_FILES[name], "r") as f:
+            separate.update(f.read())
+
+    # Step 2: Run the fused rule on a second store with the same data
+    fused = load_test_store()
+    rows_read = run_fused_procedure_rules(fused)
+    assert rows_read == len(list(fused.query(PROCEDURE_QUERY)))
+
+    expected = results_of(separate)
+    actual = results_of(fused)
+    written = len(list(fused.quads_for_pattern(None, None, None, FULL_RESULTS)))
+    assert written == sum(3 if value is not None else 2 for (_, _, value) in actual.elements())
+
+    # Step 3: Same results, with the same number of results per observation
+    def without_unusual(results):
+        return Counter({key: n for key, n in results.items() if key[1] != "coordinate_unusual"})
+
+    assert without_unusual(actual) == without_unusual(expected)
+    assert actual[("http://example.com/edge/obs_many", "geo_spatial_accuracy_precision", "high_precision")] == 1
+    assert actual[("http://example.com/edge/obs_many", "geo_spatial_accuracy_precision", None)] == 4
+
+    # The store can not run the backreference REGEX, so the .sparql rule writes no value.
+    # The fused rule uses the same pattern in Python, so it gives the labels.
+    unusual_expected = Counter()
+    unusual_actual = Counter()
+    for (obs, name, _), n in expected.items():
+        if name == "coordinate_unusual":
+            unusual_expected[obs] += n
+    for (obs, name, _), n in actual.items():
+        if name == "coordinate_unusual":
+            unusual_actual[obs] += n
+    assert unusual_actual == unusual_expected
+    assert actual[("http://example.com/edge/obs_many", "coordinate_unusual", "unusual")] == 1
+    assert actual[("http://example.com/edge/obs_many", "coordinate_unusual", "usual")] == 1
@@ -0,0 +1,59 @@
+import numpy as np
+from pyoxigraph import Store
+
+from Convert.rules.coordinate_outlier_iqr import run_coordinate_outlier_iqr
+from Convert.rules.grouped_stats import (taxon_codes, grouped_percentiles, grouped_mean_std, iqr_outliers,
+                                         zscore_outliers)
+from Convert.rules.pipeline import RulePipeline, DEFAULT_RULES, GROUPED_RULES
+from Convert.test_dq.helpers import results_of, make_taxon_data
+
+
+def test_grouped_statistics_match_numpy():
+    # Step 1: Many groups of different sizes, some values without a group
+    rng = np.random.default_rng(0)
+    codes = rng.integers(-1, 500, 20_000)
+    values = rng.normal(0, 1, 20_000) + codes
+
+    # Step 2: Each group gives the same statistics as numpy on its own values
+    quartiles, counts = grouped_percentiles(values, codes, [25, 75])
+    means, stds, _ = grouped_mean_std(values, codes)
+    for group in range(500):
+        group_values = values[codes == group]
+        assert counts[group] == len(group_values)
+        assert np.allclose(quartiles[group], np.percentile(group_values, [25, 75]))
+        assert np.isclose(means[group], group_values.mean()) and np.isclose(stds[group], group_values.std())
+
+    # Step 3: Without groups, and with only small groups, the statistics of all values are used
+    q1, q3 = np.percentile(values, [25, 75])
+    overall = (values < q1 - 1.5 * (q3 - q1)) | (values > q3 + 1.5 * (q3 - q1))
+    assert np.array_equal(iqr_outliers(values), overall)
+    assert np.array_equal(iqr_outliers(values, codes, min_group_size=10_000), overall)
+    assert np.array_equal(zscore_outliers(values, 1.0, np.full(len(values), -1)), zscore_outliers(values, 1.0))
+
+
+def test_outliers_per_taxon():
+    # Step 1: A tropical and an alpine species, one alpine record is far from the others
+    points = [("Tropicus one", 145.0 + i * 0.01, -16.0 - i * 0.01) for i in range(20)]
+    points += [("Alpinus two", 148.0 + i * 0.01, -36.0 - i * 0.01) for i in range(20)]
+    points += [("Alpinus two", 148.0, -33.0), ("Rarus three", 120.0, -20.0), (None, 148.1, -36.1)]
+    store = Store()
+    store.load(make_taxon_data(points).encode("utf-8"), format="text/turtle")
+
+    # Step 2: Names become group numbers, the genus is the first word of the name
+    observations = [f"http://example.com/test/obs_{i}" for i in range(len(points))]
+    codes = taxon_codes(store, observations)
+    assert codes[0] == codes[19] != codes[20] == codes[40] and codes[42] == -1
+    assert taxon_codes(store, observations, "genus").max() == 2
+
+    # Step 3: With all records the far alpine record is normal, per taxon it is an outlier.
+    # The rare taxon and the record without a name use the statistics of all records.
+    run_coordinate_outlier_iqr(store)
+    assert results_of(store)[("http://example.com/test/obs_40", "coordinate_outlier_iqr", "normal_coordinate")] == 1
+    grouped = Store()
+    grouped.load(make_taxon_data(points).encode("utf-8"), format="text/turtle")
+    names = ("coordinate_completeness",) + GROUPED_RULES
+    report = RulePipeline(rules=[r for r in DEFAULT_RULES if r.name in names], group_by="scientific_name").run(grouped)
+    assert [t["rule"] for t in report["rules"]] == list(names)
+    outliers = {obs for (obs, name, value) in results_of(grouped)
+                if name == "coordinate_outlier_iqr" and value == "outlier_coordinate"}
+    assert outliers == {"http://example.com/test/obs_40", "http://example.com/test/obs_41"}
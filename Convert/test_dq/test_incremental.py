@@ -0,0 +1,134 @@
+import gc
+from collections import Counter
+
+from pyoxigraph import Store
+
+from Convert.rules.incremental import SKIP, CHANGED, ALL, plan_incremental_run, save_fingerprints
+from Convert.rules.persistent_store import open_store
+from Convert.rules.pipeline import RulePipeline, main
+from Convert.test_data_generation.data_generation_coordinate_outlier_zscore import \
+    create_coordinate_outlier_zscore_test_data
+
+RESULTS_QUERY = """
+PREFIX dqaf: <http://example.com/def/dqaf/>
+PREFIX sosa: <http://www.w3.org/ns/sosa/>
+PREFIX schema: <http://schema.org/>
+
+SELECT ?observation ?property ?value
+WHERE {
+  GRAPH dqaf:fullResults {
+    ?observation dqaf:hasResult ?result .
+    ?result sosa:observedProperty ?property .
+    OPTIONAL { ?result schema:value ?value }
+  }
+}
+"""
+
+# MinCovDet picks random subsets, so its labels can change between runs
+RANDOM_RULES = {"http://example.com/assess/coordinate_outlier_robust_covariance/"}
+
+
+def make_data(n=40, renamed=None):
+    """Observations with a name, a year and a point. renamed gets another name."""
+    lines = [
+        "@prefix tern: <https://w3id.org/tern/ontologies/tern/> .",
+        "@prefix sosa: <http://www.w3.org/ns/sosa/> .",
+        "@prefix time: <http://www.w3.org/2006/time#> .",
+        "@prefix geo:  <http://www.opengis.net/ont/geosparql#> .",
+        "@prefix dwc:  <http://rs.tdwg.org/dwc/terms/> .",
+        "@prefix xsd:  <http://www.w3.org/2001/XMLSchema#> .",
+        "@prefix ex:   <http://example.com/test/> .",
+    ]
+    for i in range(n):
+        name = "Renamed species" if i == renamed else f"Species {i % 7}"
+        lon = 140 + (i * 37 % 100) / 10
+        lat = -30 - (i * 53 % 100) / 10
+        lines.append(f"""
+ex:obs_{i} a tern:Observation ; sosa:hasFeatureOfInterest ex:sample_{i} ;
+    time:hasTime [ time:inXSDgYear "{1990 + i % 30}"^^xsd:gYear ] .
+ex:sample_{i} a tern:Sample ; dwc:scientificName "{name}" ; sosa:isResultOf ex:proc_{i} .
+ex:proc_{i} geo:hasGeometry ex:geom_{i} ; geo:hasGeometryDatum "EPSG:4326" .
+ex:geom_{i} geo:asWKT "POINT({lon:.4f} {lat:.4f})" .""")
+    return "\n".join(lines) + "\n"
+
+
+def read_results(store_dir):
+    store = open_store(store_dir)
+    results = Counter(
+        (row["observation"].value, row["property"].value, row["value"].value if row["value"] else None)
+        for row in store.query(RESULTS_QUERY)
+        if row["property"].value not in RANDOM_RULES
+    )
+    del store
+    gc.collect()
+    return results
+
+
+def test_incremental_run_matches_full_run(tmp_path):
+    data_path = tmp_path / "data.ttl"
+    data_path.write_text(make_data(), encoding="utf-8")
+    store_dir = tmp_path / "store"
+
+    # Step 1: The first incremental run assesses everything
+    report = main([str(data_path), "--store", str(store_dir), "--incremental"])
+    assert {t["incremental"] for t in report["rules"]} == {ALL}
+    assert report["incremental"] == {"observations": 40, "changed": 40, "removed": 0}
+    first = read_results(store_dir)
+
+    # Step 2: Nothing changed, so every rule is skipped and the results stay the same
+    report = main([str(data_path), "--store", str(store_dir), "--incremental"])
+    assert {t["incremental"] for t in report["rules"]} == {SKIP}
+    assert all(t["quads_written"] == 0 for t in report["rules"])
+    assert read_results(store_dir) == first
+
+    # Step 3: One name changes (the sample part of obs_5)
+    data_path.write_text(make_data(renamed=5), encoding="utf-8")
+    report = main([str(data_path), "--store", str(store_dir), "--incremental"])
+    actions = {t["rule"]: t["incremental"] for t in report["rules"]}
+    written = {t["rule"]: t["results_written"] for t in report["rules"]}
+    assert report["incremental"] == {"observations": 40, "changed": 1, "removed": 0}
+    assert actions["scientific_name_completeness"] == CHANGED
+    assert written["scientific_name_completeness"] == 1
+    assert {t["rule"]: t["rows_read"] for t in report["rules"]}["scientific_name_completeness"] == 1
+    assert actions["duplicate"] == ALL
+    assert actions["date_outlier_iqr"] == SKIP
+
+    # Step 4: The results are the same as a full run on the changed data
+    full_dir = tmp_path / "full"
+    main([str(data_path), "--store", str(full_dir)])
+    assert read_results(store_dir) == read_results(full_dir)
+
+    # Step 5: A removed observation loses its results
+    data_path.write_text(make_data(n=39, renamed=5), encoding="utf-8")
+    report = main([str(data_path), "--store", str(store_dir), "--incremental"])
+    assert report["incremental"] == {"observations": 39, "changed": 0, "removed": 1}
+    assert not any(obs == "http://example.com/test/obs_39" for obs, _, _ in read_results(store_dir))
+
+
+def test_geometry_in_old_namespace_is_fingerprinted():
+    # Step 1: Data with geometries in the older "http://www.opengis.net/geosparql#" namespace
+    store = Store()
+    store.load(create_coordinate_outlier_zscore_test_data().encode("utf-8"), format="text/turtle")
+    pipeline = RulePipeline()
+    plan = plan_incremental_run(store, pipeline.rules, pipeline.queries)
+    assert plan.fingerprints.parts["geometry"] != 0
+    save_fingerprints(store, plan, pipeline.rules)
+
+    # Step 2: Edit the WKT of one observation
+    row = next(iter(store.query("""
+    PREFIX geo_old: <http://www.opengis.net/geosparql#>
+    SELECT ?observation ?geometry ?wkt WHERE {
+      ?observation <http://www.w3.org/ns/sosa/hasFeatureOfInterest>/<http://www.w3.org/ns/sosa/isResultOf> ?procedure .
+      ?procedure geo_old:hasGeometry ?geometry .
+      ?geometry geo_old:asWKT ?wkt .
+    } LIMIT 1
+    """)))
+    store.update(f"""
+    DELETE DATA {{ {row["geometry"]} <http://www.opengis.net/geosparql#asWKT> {row["wkt"]} }} ;
+    INSERT DATA {{ {row["geometry"]} <http://www.opengis.net/geosparql#asWKT> "POINT(150.5 -20.5)" }}
+    """)
+
+    # Step 3: The observation is changed, and the coordinate rules run again
+    plan = plan_incremental_run(store, pipeline.rules, pipeline.queries)
+    assert plan.changed == [row["observation"].value]
+    assert plan.actions["coordinate_outlier_zscore"] == ALL
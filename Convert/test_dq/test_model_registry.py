@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from Convert.rules.model_registry import load_model, save_model, score_in_batches, clear_model_registry
+
+
+def test_model_is_loaded_once_and_scored_in_batches(tmp_path):
+    # Step 1: Train a small model and save it with its metadata
+    rng = np.random.default_rng(0)
+    coords = np.column_stack([rng.normal(145, 1, 500), rng.normal(-37, 1, 500)])
+    model = IsolationForest(contamination=0.05, random_state=42).fit(coords)
+    model_path = str(tmp_path / "model.pkl")
+    save_model(model, model_path, training_size=len(coords), feature_order=["lon", "lat"])
+
+    # Step 2: The second load gives the same object, with the saved metadata
+    clear_model_registry()
+    registered = load_model(model_path)
+    assert load_model(model_path) is registered
+    assert registered.training_size == 500
+    assert registered.contamination == 0.05
+    assert registered.feature_order == ("lon", "lat")
+    assert len(registered.sha256) == 64
+
+    # Step 3: Scores in small float32 batches are the same as scoring all rows at once
+    preds, scores = score_in_batches(registered.model, coords, batch_size=64)
+    assert np.array_equal(preds, model.predict(coords))
+    assert np.allclose(scores, model.decision_function(coords))
+
+    # Step 4: A memory-mapped load is a separate entry and scores the same
+    mapped = load_model(model_path, mmap_mode="r")
+    assert mapped is not registered
+    assert np.array_equal(score_in_batches(mapped.model, coords)[0], preds)
+
+    # Step 5: A new model file is loaded again
+    save_model(IsolationForest(random_state=0).fit(coords[:100]), model_path, 100, ["lon", "lat"])
+    os.utime(model_path, (1, 1))
+    assert load_model(model_path).training_size == 100
@@ -0,0 +1,62 @@
+import gc
+import os
+
+from Convert.rules.persistent_store import open_store, load_inputs, loaded_inputs
+from Convert.rules.pipeline import main, _count, RESULTS_COUNT_QUERY
+from Convert.test_data_generation.data_generation_coordinate_outlier_iqr import create_coordinate_outlier_iqr_test_data
+
+TRIPLES_QUERY = "SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"
+
+
+def test_inputs_are_loaded_once(tmp_path):
+    store_dir = tmp_path / "store"
+    first = tmp_path / "first.ttl"
+    second = tmp_path / "second.ttl"
+    first.write_text("<http://example.com/a> <http://example.com/p> 1 .\n", encoding="utf-8")
+    second.write_text("<http://example.com/b> <http://example.com/p> 2 .\n", encoding="utf-8")
+
+    # Step 1: The first run loads the file
+    store = open_store(store_dir)
+    assert load_inputs(store, [first]) == [first]
+    assert _count(store, TRIPLES_QUERY) == 1
+
+    # Step 2: After opening the store again, only the new file is loaded
+    # Only one Store can have the directory open at a time
+    del store
+    gc.collect()
+    store = open_store(store_dir)
+    assert load_inputs(store, [first, second]) == [second]
+    assert _count(store, TRIPLES_QUERY) == 2
+    assert len(loaded_inputs(store)) == 2
+
+    # Step 3: A new file time with the same content is not loaded again
+    os.utime(first, ns=(0, 0))
+    assert load_inputs(store, [first, second]) == []
+
+    # Step 4: A changed file means all files are loaded again, without the old triples
+    first.write_text("<http://example.com/c> <http://example.com/p> 3 .\n", encoding="utf-8")
+    assert load_inputs(store, [first, second]) == [first, second]
+    subjects = {row["s"].value for row in store.query("SELECT ?s WHERE { ?s ?p ?o }")}
+    assert subjects == {"http://example.com/b", "http://example.com/c"}
+
+
+def test_pipeline_reuses_saved_store(tmp_path):
+    data_path = tmp_path / "coordinates.ttl"
+    data_path.write_text(create_coordinate_outlier_iqr_test_data(), encoding="utf-8")
+    store_dir = tmp_path / "store"
+
+    # Step 1: Run two times on the same store, the second time without input files
+    main([str(data_path), "--store", str(store_dir)])
+    gc.collect()
+    store = open_store(store_dir)
+    first_results = _count(store, RESULTS_COUNT_QUERY)
+    del store
+    gc.collect()
+
+    main(["--store", str(store_dir)])
+    gc.collect()
+
+    # Step 2: The results of the first run were replaced, not added to
+    store = open_store(store_dir)
+    assert first_results > 0
+    assert _count(store, RESULTS_COUNT_QUERY) == first_results
@@ -0,0 +1,96 @@
+import pickle
+
+import numpy as np
+import pytest
+from pyoxigraph import Store
+
+from Convert.rules.coordinate_outlier_iqr import run_coordinate_outlier_iqr, coordinate_sketches
+from Convert.rules.grouped_stats import merge_taxon_sketches
+from Convert.rules.quantile_sketch import QuantileSketch, merge_sketches
+from Convert.test_dq.helpers import results_of, make_taxon_data
+
+
+def test_sketch_quantiles_do_not_depend_on_chunks():
+    # Step 1: Small inputs keep their values, so the quartiles are those of np.percentile
+    rng = np.random.default_rng(2)
+    values = rng.normal(-37, 2, 5000)
+    merged = merge_sketches([QuantileSketch().add(part) for part in np.split(values, [10, 2000])])
+    assert merged.exact
+    assert np.array_equal(merged.percentiles([25, 75]), np.percentile(values, [25, 75]))
+
+    # Step 2: Larger inputs are counted in buckets, within the relative accuracy
+    values = np.concatenate([rng.normal(-37, 2, 30_000), rng.normal(145, 1, 20_000), np.zeros(5)])
+    rng.shuffle(values)
+    whole = QuantileSketch(max_exact=10_000).add(values)
+    assert not whole.exact
+    percentiles = [0, 25, 50, 75, 100]
+    assert np.allclose(whole.percentiles(percentiles), np.percentile(values, percentiles), rtol=2e-5)
+
+    # Step 3: Any split in chunks, merged in any order (also after pickling), gives the same quartiles
+    for cuts in ([100, 9_000, 49_000], [5, 25_000]):
+        sketches = [pickle.loads(pickle.dumps(QuantileSketch(max_exact=10_000).add(part)))
+                    for part in np.split(values, cuts)]
+        merged = merge_sketches(sketches[::-1])
+        assert merged.count == len(values)
+        assert np.array_equal(merged.percentiles(percentiles), whole.percentiles(percentiles))
+
+
+def outliers(store):
+    return {obs for (obs, _, value) in results_of(store) if value == "outlier_coordinate"}
+
+
+def test_chunks_labelled_with_merged_quartiles():
+    # Step 1: The same records as one store and as three chunk stores
+    rng = np.random.default_rng(4)
+    points = [(None, round(lon, 6), round(lat, 6))
+              for lon, lat in zip(rng.normal(145, 1, 90), rng.normal(-37, 1, 90))]
+    points += [(None, 160.0, -37.0), (None, 145.0, -10.0)]
+    whole = Store()
+    whole.load(make_taxon_data(points).encode("utf-8"), format="text/turtle")
+    chunks = []
+    for start, end in [(0, 40), (40, 85), (85, len(points))]:
+        chunk = Store()
+        chunk.load(make_taxon_data(points[start:end], start).encode("utf-8"), format="text/turtle")
+        chunks.append(chunk)
+
+    # Step 2: First pass sketches every chunk, second pass labels each chunk with the merged sketches
+    lon_sketch = merge_sketches(coordinate_sketches(chunk)[0] for chunk in chunks)
+    lat_sketch = merge_sketches(coordinate_sketches(chunk)[1] for chunk in chunks)
+    for chunk in chunks:
+        run_coordinate_outlier_iqr(chunk, sketches=(lon_sketch, lat_sketch))
+    run_coordinate_outlier_iqr(whole)
+
+    # Step 3: Same outliers as one run on all records
+    assert {"http://example.com/test/obs_90", "http://example.com/test/obs_91"} <= outliers(whole)
+    assert set().union(*(outliers(chunk) for chunk in chunks)) == outliers(whole)
+
+
+def test_grouped_chunks_labelled_with_merged_taxon_quartiles():
+    # Step 1: The first chunk has a tight cluster of one species with a record at 145.5,
+    # the second chunk has records of the same species from 144.0 to 146.0
+    first = [("Alpha one", 145.0 + i * 0.001, -37.0) for i in range(12)] + [("Alpha one", 145.5, -37.0)]
+    first += [("Beta two", 130.0 + i * 0.01, -20.0) for i in range(12)] + [(None, 150.0, -30.0)]
+    second = [("Alpha one", 144.0 + i * 0.1, -37.0) for i in range(21)]
+    second += [("Beta two", 130.0 + i * 0.01, -20.0) for i in range(12)] + [("Beta two", 100.0, -20.0)]
+    whole = Store()
+    whole.load(make_taxon_data(first + second).encode("utf-8"), format="text/turtle")
+    chunks = [Store(), Store()]
+    chunks[0].load(make_taxon_data(first).encode("utf-8"), format="text/turtle")
+    chunks[1].load(make_taxon_data(second, len(first)).encode("utf-8"), format="text/turtle")
+
+    # Step 2: Sketches per taxon, merged by name over the chunks, label every chunk
+    lon_sketches = merge_taxon_sketches(coordinate_sketches(chunk, group_by="scientific_name")[0] for chunk in chunks)
+    lat_sketches = merge_taxon_sketches(coordinate_sketches(chunk, group_by="scientific_name")[1] for chunk in chunks)
+    for chunk in chunks:
+        run_coordinate_outlier_iqr(chunk, group_by="scientific_name", sketches=(lon_sketches, lat_sketches))
+    run_coordinate_outlier_iqr(whole, group_by="scientific_name")
+
+    # Step 3: Same outliers as one run on all records. With the quartiles of its own chunk
+    # the record at 145.5 would be an outlier and the record at 144.0 would not.
+    assert "http://example.com/test/obs_12" not in outliers(whole)
+    assert "http://example.com/test/obs_26" in outliers(whole)
+    assert set().union(*(outliers(chunk) for chunk in chunks)) == outliers(whole)
+
+    # Sketches of all records can not give the quartiles of each taxon
+    with pytest.raises(ValueError):
+        run_coordinate_outlier_iqr(chunks[0], group_by="scientific_name", sketches=coordinate_sketches(chunks[0]))
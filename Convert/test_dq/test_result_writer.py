@@ -0,0 +1,42 @@
+import numpy as np
+from pyoxigraph import Store
+
+from Convert.rules.result_writer import write_results
+
+
+def test_write_results_in_batches():
+    # Step 1: Make 2500 observations, every third one is an outlier
+    store = Store()
+    observations = [f"http://example.com/test/obs_{i}" for i in range(2500)]
+    codes = np.arange(2500) % 3 == 0
+
+    # Step 2: Write with a small batch size so several batches are used
+    written = write_results(store, observations, codes, ("normal_coordinate", "outlier_coordinate"),
+                            "http://example.com/assess/coordinate_outlier_iqr/", batch_size=1000)
+    assert written == 3 * 2500
+
+    # Step 3: Read the results back in the same way as the SPARQL rule tests
+    query = """
+    PREFIX dqaf: <http://example.com/def/dqaf/>
+    PREFIX sosa: <http://www.w3.org/ns/sosa/>
+    PREFIX schema: <http://schema.org/>
+
+    SELECT ?observation ?value
+    WHERE {
+      GRAPH dqaf:fullResults {
+        ?observation dqaf:hasResult [
+          sosa:observedProperty <http://example.com/assess/coordinate_outlier_iqr/> ;
+          schema:value ?value
+        ] .
+      }
+    }
+    """
+    actual = {
+        row["observation"].value: row["value"].value
+        for row in store.query(query)
+    }
+
+    assert len(actual) == 2500
+    assert actual["http://example.com/test/obs_0"] == "outlier_coordinate"
+    assert actual["http://example.com/test/obs_1"] == "normal_coordinate"
+    assert sum(1 for v in actual.values() if v == "outlier_coordinate") == 834
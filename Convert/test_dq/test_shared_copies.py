@@ -0,0 +1,52 @@
+import ast
+import io
+import os
+import tokenize
+
+import pytest
+
+# Modules (and functions) kept the same in the Convert engine and the old implementation
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONVERT_RULES = os.path.join(REPO_DIR, "Convert", "rules")
+OLD_DQ = os.path.join(REPO_DIR, "Old Implementation", "dq")
+
+UNUSUAL_DEFINITIONS = ("MAX_GROUP", "MIN_REPEATS", "DEFAULT_BATCH_SIZE", "unusual_decimals")
+
+
+def read(directory, file_name):
+    with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def tokens(source):
+    """The tokens with their positions, strings by their value, so only the quote style may differ."""
+    return [(token.type, token.start, repr(ast.literal_eval(token.string)) if token.type == tokenize.STRING
+             else token.string)
+            for token in tokenize.generate_tokens(io.StringIO(source).readline)]
+
+
+def definitions(source, names):
+    """The source of the top-level functions and assignments with these names."""
+    segments = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.FunctionDef):
+            name = node.name
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+        else:
+            continue
+        if name in names:
+            segments.append(ast.get_source_segment(source, node))
+    return "\n".join(segments)
+
+
+@pytest.mark.parametrize("file_name", ["clustering_1d.py", "quantile_sketch.py"])
+def test_copied_modules_are_the_same(file_name):
+    assert tokens(read(CONVERT_RULES, file_name)) == tokens(read(OLD_DQ, file_name))
+
+
+def test_unusual_decimals_is_the_same():
+    convert = definitions(read(CONVERT_RULES, "coordinate_unusual.py"), UNUSUAL_DEFINITIONS)
+    old = definitions(read(OLD_DQ, "unusual_numbers.py"), UNUSUAL_DEFINITIONS)
+    assert "def unusual_decimals" in convert
+    assert tokens(convert) == tokens(old)
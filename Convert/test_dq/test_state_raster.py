@@ -0,0 +1,91 @@
+import geopandas as gpd
+import numpy as np
+from pyoxigraph import Store
+from shapely.geometry import Polygon, box
+
+from Convert.rules.coordinate_inside_australia_check import run_coordinate_inside_australia_check
+from Convert.rules.state_raster import build_state_raster, exact_lookup, load_state_polygons, StateRaster
+
+
+def make_shapefiles(tmp_path):
+    # Two test states that overlap, one with a hole, and a missing shapefile
+    shapes = {
+        "State_A": [Polygon([(0, 0), (10, 0), (10, 10), (0, 10)], [[(2, 2), (4, 2), (4, 4), (2, 4)]])],
+        "State_B": [Polygon([(5, 5), (20, 5), (12.5, 20)]), box(30, 30, 31, 31)],
+    }
+    shapefiles = {}
+    for name, geometries in shapes.items():
+        path = tmp_path / f"{name}.shp"
+        gpd.GeoDataFrame(geometry=geometries, crs="EPSG:4326").to_file(path)
+        shapefiles[name] = str(path)
+    shapefiles["State_C"] = str(tmp_path / "missing.shp")
+    return shapefiles
+
+
+def test_raster_matches_polygon_test(tmp_path):
+    # Step 1: Build a coarse raster from the test shapefiles
+    shapefiles = make_shapefiles(tmp_path)
+    raster = build_state_raster(shapefiles, str(tmp_path / "raster.npy"), resolution=0.5)
+    assert isinstance(raster.cells, np.memmap)
+
+    # Step 2: Random points, points on edges and corners, and NaN
+    rng = np.random.default_rng(0)
+    lons = np.r_[rng.uniform(-5, 35, 5000), [10, 5, 2, 3, 30, 0.25, 50], np.nan]
+    lats = np.r_[rng.uniform(-5, 35, 5000), [7, 5, 3, 3, 30.5, 0.25, 50], 1]
+
+    # Step 3: Same states as testing every point against the polygons
+    geometries, polygon_states = load_state_polygons(shapefiles)
+    expected = exact_lookup(geometries, polygon_states, lons, lats)
+    actual = StateRaster.load(str(tmp_path / "raster.npy")).lookup(lons, lats)
+    assert np.array_equal(actual, expected)
+
+    # The first state wins where they overlap, and edges and holes are outside
+    assert list(raster.find_states([7, 15, 10, 3, 30.5, np.nan], [7, 8, 7, 3, 30.5, 1])) == [
+        "State_A", "State_B", "State_B", "Outside Australia", "State_B", "Outside Australia"]
+
+
+def test_inside_australia_check_uses_raster(tmp_path):
+    raster_path = str(tmp_path / "raster.npy")
+    build_state_raster(make_shapefiles(tmp_path), raster_path, resolution=0.5)
+
+    # One point inside State_A, one in its hole, one far away
+    store = Store()
+    store.load("""
+    @prefix tern: <https://w3id.org/tern/ontologies/tern/> .
+    @prefix sosa: <http://www.w3.org/ns/sosa/> .
+    @prefix geo:  <http://www.opengis.net/ont/geosparql#> .
+    @prefix ex:   <http://example.com/test/> .
+    ex:obs_in a tern:Observation ; sosa:hasFeatureOfInterest ex:s_in .
+    ex:s_in a tern:Sample ; sosa:isResultOf ex:p_in . ex:p_in geo:hasGeometry ex:g_in .
+    ex:g_in geo:asWKT "POINT(1.5 1.5)" .
+    ex:obs_hole a tern:Observation ; sosa:hasFeatureOfInterest ex:s_hole .
+    ex:s_hole a tern:Sample ; sosa:isResultOf ex:p_hole . ex:p_hole geo:hasGeometry ex:g_hole .
+    ex:g_hole geo:asWKT "POINT(3 3)" .
+    ex:obs_far a tern:Observation ; sosa:hasFeatureOfInterest ex:s_far .
+    ex:s_far a tern:Sample ; sosa:isResultOf ex:p_far . ex:p_far geo:hasGeometry ex:g_far .
+    ex:g_far geo:asWKT "POINT(140 -30)" .
+    """.encode("utf-8"), format="text/turtle")
+
+    run_coordinate_inside_australia_check(store, raster_path=raster_path)
+
+    query = """
+    PREFIX dqaf: <http://example.com/def/dqaf/>
+    PREFIX sosa: <http://www.w3.org/ns/sosa/>
+    PREFIX schema: <http://schema.org/>
+
+    SELECT ?observation ?value
+    WHERE {
+      GRAPH dqaf:fullResults {
+        ?observation dqaf:hasResult [
+          sosa:observedProperty <http://example.com/assess/coordinate_in_australia/> ;
+          schema:value ?value
+        ] .
+      }
+    }
+    """
+    actual = {row["observation"].value: row["value"].value for row in store.query(query)}
+    assert actual == {
+        "http://example.com/test/obs_in": "inside_australia",
+        "http://example.com/test/obs_hole": "outside_australia",
+        "http://example.com/test/obs_far": "outside_australia",
+    }
@@ -2,9 +2,11 @@ import argparse
 import os
 import sys
 from pathlib import Path
-from rdflib import Graph
 
 from dq.assess import RDFDataQualityAssessment
+from dq.checkpoint import CheckpointWriter
+from dq.matrix_writer import write_result_matrix
+from dq.data_loader import expand_inputs, load_graph
 from dq.defined_namespaces import DirectoryStructure
 from dq.scoring_manager import ScoringManager
 from dq.usecase_manager import UseCaseManager
@@ -35,10 +37,45 @@ def cli(args=None):
     parser.add_argument(
         "--data-to-assess",
         type=Path,
-        help="The ABIS-compliant RDF file, or an RDFLib graph object, to assess",
+        nargs="+",
+        help="The ABIS-compliant RDF files (or globs like 'input/chunk_*.ttl') to assess",
         required=False  # Make this argument optional
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="The number of processes that parse the input files and run the assessments in parallel",
+    )
+
+    parser.add_argument(
+        "--checkpoint-format",
+        choices=["ttl", "nt", "none"],
+        default="ttl",
+        help="The format of the Results checkpoint file, written in the background ('nt' is the fastest)",
+    )
+
+    parser.add_argument(
+        "--matrix-format",
+        choices=["parquet", "csv", "xlsx"],
+        default=None,
+        help="The format of the output1..3 result matrices (default: parquet when pyarrow is installed, else csv)",
+    )
+
+    parser.add_argument(
+        "--approximate-statistics",
+        help="Count the unique subjects and objects in the report with HyperLogLog (bounded memory)",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--compact-results",
+        help="Share one result node per assessment and label, with one result time for the run",
+        action="store_true",
+    )
+
     return parser.parse_args(args)
 
 
@@ -63,46 +100,41 @@ def main(args=None):
 
     report_txt_file = os.path.join(directory_structure.report_base_path,
                                    'Report.txt')
-    input_data_to_assess = args.data_to_assess
-    is_chunk = False
-    if is_chunk:
-        # new function
-        combined_graph = Graph()
-
-        # Load each TTL file into separate RDF graphs and merge them
-        ttl_files = ['chunk_1.ttl', 'chunk_2.ttl', 'chunk_3.ttl', 'chunk_4.ttl']
-        print('Combining the chunk files...')
-        for ttl_file in ttl_files:
-            graph = Graph()
-            ttl_file_path = os.path.join(directory_structure.input_base_path, ttl_file)
-            print(ttl_file_path)
-            graph.parse(ttl_file_path, format='ttl')
-            combined_graph += graph
-
-        # Save the combined graph into a TTL file
-        combined_ttl_file_path = os.path.join(directory_structure.input_base_path, 'combined_graph.ttl')
-        combined_graph.serialize(destination=combined_ttl_file_path, format='turtle')
-
-        combined_graph = Graph()
-        combined_graph.parse(combined_ttl_file_path, format='turtle')
-
-        input_data_to_assess = combined_graph
+    jobs = getattr(args, 'jobs', 1)
+    patterns = args.data_to_assess if isinstance(args.data_to_assess, list) else [args.data_to_assess]
+    input_files = expand_inputs(patterns)
+    if len(input_files) == 1:
+        input_data_to_assess = input_files[0]
+    else:
+        # Load the files (for example chunk_1.ttl ... chunk_4.ttl) into one graph
+        print('Combining the input files...')
+        for input_file in input_files:
+            print(input_file)
+        input_data_to_assess = load_graph(input_files, jobs)
 
     print(input_data_to_assess)
 
     with open(report_txt_file, "w") as report_file:
-        dq_assessment = RDFDataQualityAssessment(input_data_to_assess, report_file)
-        result_filename = os.path.join(dq_assessment.directory_structure.result_base_path, "Results.ttl")
+        dq_assessment = RDFDataQualityAssessment(input_data_to_assess, report_file,
+                                                 compact_results=getattr(args, 'compact_results', False))
+        checkpoint_format = getattr(args, 'checkpoint_format', 'ttl')
+        checkpoints = CheckpointWriter(None if checkpoint_format == 'none' else checkpoint_format)
+        matrix_format = getattr(args, 'matrix_format', None)
 
         all_labels = dq_assessment.vocab_manager.create_excel_template(
             os.path.join(dq_assessment.directory_structure.template_base_path, 'usecase_template.xlsx'))
         print("All Labels:", all_labels)
 
-        dq_assessment.report_analysis.generate_report()
+        dq_assessment.report_analysis.generate_report(getattr(args, 'approximate_statistics', False))
+
+        dq_assessment.assessments(jobs=jobs)
 
-        dq_assessment.assessments()
+        # The stages pass the graph and the matrix in memory, the checkpoint is written in the background
+        result_filename = checkpoints.write(dq_assessment.g,
+                                            os.path.join(dq_assessment.directory_structure.result_base_path, "Results"))
+        if result_filename:
+            print(result_filename)
 
-        dq_assessment.g.serialize(destination=result_filename, format="turtle")
         use_case_definition_file = os.path.join(dq_assessment.directory_structure.use_case_base_path,
                                                 'usecase_definition.xlsx')
         scoring_definition_file = os.path.join(dq_assessment.directory_structure.scoring_base_path,
@@ -110,19 +142,23 @@ def main(args=None):
         output_result_file = os.path.join(dq_assessment.directory_structure.result_base_path,
                                           'Final_Usecase_Results.ttl')
         dq_assessment.result_matrix_df = dq_assessment.result_matrix_df.sort_values(by='observation_id', ascending=True)
-        dq_assessment.result_matrix_df.to_excel(os.path.join(dq_assessment.directory_structure.result_base_path,
-                                                             'output1.xlsx'), sheet_name="matrix", index=None)
+        print(write_result_matrix(dq_assessment.result_matrix_df,
+                                  os.path.join(dq_assessment.directory_structure.result_base_path, 'output1'),
+                                  matrix_format))
 
-        use_case_manager = UseCaseManager(use_case_definition_file, dq_assessment.result_matrix_df, result_filename,
-                                          output_result_file, report_file)
+        use_case_manager = UseCaseManager(use_case_definition_file, dq_assessment.result_matrix_df, dq_assessment.g,
+                                          None, report_file)
         use_case_manager.assess_use_cases()
-        use_case_manager.result_matrix_df.to_excel(os.path.join(dq_assessment.directory_structure.result_base_path,
-                                                                'output2.xlsx'), sheet_name="matrix", index=None)
-        scoring_manager = ScoringManager(scoring_definition_file, dq_assessment.result_matrix_df, output_result_file,
-                                         output_result_file, report_file)
+        print(write_result_matrix(use_case_manager.result_matrix_df,
+                                  os.path.join(dq_assessment.directory_structure.result_base_path, 'output2'),
+                                  matrix_format))
+        scoring_manager = ScoringManager(scoring_definition_file, dq_assessment.result_matrix_df,
+                                         use_case_manager.results_graph, output_result_file, report_file)
         scoring_manager.apply_scoring_methods()
-        scoring_manager.result_matrix_df.to_excel(os.path.join(dq_assessment.directory_structure.result_base_path,
-                                                               'output3.xlsx'), sheet_name="matrix", index=None)
+        print(write_result_matrix(scoring_manager.result_matrix_df,
+                                  os.path.join(dq_assessment.directory_structure.result_base_path, 'output3'),
+                                  matrix_format))
+        checkpoints.close()
 
     print("Complete")
 
@@ -1,6 +1,8 @@
 import datetime
+import io
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -12,21 +14,57 @@ import pandas as pd
 from collections import defaultdict
 
 from rdflib import Graph, URIRef, Literal, BNode
-from rdflib.namespace import NamespaceManager, SOSA, TIME, GEO, SDO, XSD, RDF, RDFS
-from shapely.geometry import Point
-from sklearn.cluster import KMeans
+from rdflib.namespace import SOSA, TIME, SDO, XSD, RDF, RDFS
+import shapely
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import silhouette_score
 from sklearn.covariance import EllipticEnvelope
+from .clustering_1d import best_n_clusters, kmeans_1d
 from .defined_namespaces import DQAF, TERN, DirectoryStructure
+from .observation_index import ObservationIndex
 from .report_analysis import ReportAnalysis
+from .quantile_sketch import QuantileSketch
+from .result_matrix import ResultMatrix
+from .unusual_numbers import unusual_decimals, unusual_coordinates
 from .usecase_manager import UseCaseManager
 from .vocab_manager import VocabManager
 
 
+# The assessments run by RDFDataQualityAssessment.assessments(), in order.
+# Each one only reads the input data and writes its own results, so they can run in parallel.
+ASSESSMENTS = [
+    "assess_geo_spatial_accuracy_precision",
+    "assess_coordinate_precision",
+    "assess_coordinate_completeness",
+    "assess_coordinate_unusual",
+    "assess_coordinate_in_australia_state",
+    "assess_coordinate_outlier_irq",
+    "assess_coordinate_outlier_isolation_forest",
+    "assess_coordinate_outlier_robust_covariance",
+    "assess_coordinate_outlier_zscore",
+    "assess_date_recency",
+    "assess_date_format_validation",
+    "assess_date_completeness",
+    "assess_date_outlier_kmeans",
+    "assess_date_outlier_irq",
+    "assess_scientific_name_completeness",
+    "assess_scientific_name_validation",
+    "assess_datum_completeness",
+    "assess_datum_type",
+    "assess_datum_validation",
+]
+
+# Results are added to the graph with Graph.addN in batches of this many triples
+RESULT_BATCH_SIZE = 10_000
+
+# The robust covariance is fitted on a random sample of at most this many points,
+# and the points are scored in batches of SCORE_BATCH_SIZE
+ROBUST_COVARIANCE_FIT_SIZE = 20_000
+SCORE_BATCH_SIZE = 65_536
+
+
 class RDFDataQualityAssessment:
-    def __init__(self, g: Union[Path, Graph], report_file=None, duplicate_predicates_to_check=None):
+    def __init__(self, g: Union[Path, Graph], report_file=None, duplicate_predicates_to_check=None,
+                 compact_results=False):
         self.directory_structure = DirectoryStructure()
         self.report_file = report_file
         self.g = self.load_data(g)
@@ -37,7 +75,16 @@ class RDFDataQualityAssessment:
         self.vocab_manager.bind_custom_namespaces(self.g)
         self.duplicate_predicates_to_check = duplicate_predicates_to_check
         columns = ['observation_id'] + self.vocab_manager.get_all_labels()
-        self.result_matrix_df = pd.DataFrame(columns=columns)
+        self.result_matrix = ResultMatrix(columns)
+        self._result_matrix_df = None
+        self._index = None
+        # Compact results: one result node per assessment and label, shared by the observations,
+        # with the one result time of the run
+        self.compact_results = compact_results
+        self.result_time = Literal(datetime.now(), datatype=XSD.dateTime)
+        self._shared_results = {}
+        self._label_uris = {}
+        self._pending_results = []
         self.data_type = {
             'time': {
                 'name': SOSA.phenomenonTime,
@@ -46,6 +93,25 @@ class RDFDataQualityAssessment:
 
         }
 
+    @property
+    def index(self) -> ObservationIndex:
+        # Built on the first assessment, then shared by all of them
+        if self._index is None:
+            self._index = ObservationIndex(self.g)
+        return self._index
+
+    @property
+    def result_matrix_df(self) -> pd.DataFrame:
+        # The DataFrame is made from the collected results only when it is used
+        if self._result_matrix_df is None:
+            self._result_matrix_df = self.result_matrix.to_dataframe()
+        return self._result_matrix_df
+
+    @result_matrix_df.setter
+    def result_matrix_df(self, df: pd.DataFrame):
+        self.result_matrix = ResultMatrix.from_dataframe(df)
+        self._result_matrix_df = df
+
     @staticmethod
     def load_data(path_or_graph: Union[Path, Graph]) -> Graph:
         if isinstance(path_or_graph, Path):
@@ -55,7 +121,7 @@ class RDFDataQualityAssessment:
         else:
             raise ValueError("Input must be either a Path object pointing to a Turtle file or an RDFlib Graph")
 
-    def assessments(self):
+    def assessments(self, jobs=1):
 
         # Add custom labels definition to the new graph and save it into new file name
         self.vocab_manager.create_output_definition_file(
@@ -66,26 +132,36 @@ class RDFDataQualityAssessment:
         if self.duplicate_predicates_to_check:
             self.assess_duplicate_value_combination(self.duplicate_predicates_to_check)
 
-        self.assess_geo_spatial_accuracy_precision()
-
-        self.assess_coordinate_precision()
-        self.assess_coordinate_completeness()
-        self.assess_coordinate_unusual()
-        self.assess_coordinate_in_australia_state()
-        self.assess_coordinate_outlier_irq()
-        self.assess_coordinate_outlier_isolation_forest()
-        self.assess_coordinate_outlier_robust_covariance()
-        self.assess_coordinate_outlier_zscore()
-        self.assess_date_recency()
-        self.assess_date_format_validation()
-        self.assess_date_completeness()
-        self.assess_date_outlier_kmeans()
-        self.assess_date_outlier_irq()
-        self.assess_scientific_name_completeness()
-        self.assess_scientific_name_validation()
-        self.assess_datum_completeness()
-        self.assess_datum_type()
-        self.assess_datum_validation()
+        if jobs > 1:
+            self.run_assessments_in_parallel(ASSESSMENTS, jobs)
+        else:
+            for assessment in ASSESSMENTS:
+                getattr(self, assessment)()
+
+    def run_assessments_in_parallel(self, assessments, jobs):
+        """
+        Run the assessments in a pool of jobs processes.
+
+        The workers get a copy of this object with the observation index but without
+        the graph, and record the results instead of adding them. The results are
+        then added here one assessment at a time, in the order of assessments, so the
+        graph, the result matrix and the report are the same as a run in sequence.
+        """
+        worker = _RecordingAssessment.from_assessment(self)
+        returned = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(worker,)) as pool:
+            futures = [pool.submit(_run_recorded_assessment, assessment) for assessment in assessments]
+            for future in futures:
+                result, results, matrix_rows, report_text = future.result()
+                for subject, assessment_type, value in results:
+                    self._add_assessment_result(subject, assessment_type, value)
+                for row in matrix_rows:
+                    self._add_assessment_result_to_matrix(*row)
+                if self.report_file and report_text:
+                    self.report_file.write(report_text)
+                returned.append(result)
+        self.flush_results()
+        return returned
 
     def assess_date_completeness(self):
         assessment_name = "date_completeness"
@@ -93,10 +169,10 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for s, _, o in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, ot in self.g.triples((s, TIME.hasTime, None)):
+        for s in self.index.observations:
+            for ot in self.index.times[s]:
                 date_is_not_empty = False
-                for _, _, date_literal in self.g.triples((ot, TIME.inXSDgYear, None)):
+                for date_literal in self.index.years[ot]:
                     if DateChecker.is_date_not_empty(date_literal):
                         date_is_not_empty = True
                     break  # Assuming only one date per observation; remove if multiple dates need assessment
@@ -116,13 +192,13 @@ class RDFDataQualityAssessment:
 
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, observation_time in self.g.triples((procedure, TIME.hasTime, None)):
+        for observation in self.index.observations:
+            for sample, is_sample in self.index.samples[observation]:
+                if is_sample:
+                    for procedure in self.index.procedures[sample]:
+                        for observation_time in self.index.times[procedure]:
                             date_within_range = False
-                            for _, _, date_literal in self.g.triples((observation_time, TIME.inXSDgYear, None)):
+                            for date_literal in self.index.years[observation_time]:
                                 if DateChecker.is_date_recent(date_literal):
                                     date_within_range = True
                                 break  # Assuming only one date per observation; remove if multiple dates need assessment
@@ -223,11 +299,11 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        geometry_node = next(self.g.objects(procedure, GEO.hasMetricSpatialAccuracy), None)
+        for observation in self.index.observations:
+            for sample, is_sample in self.index.samples[observation]:
+                if is_sample:
+                    for procedure in self.index.procedures[sample]:
+                        geometry_node = self.index.spatial_accuracy[procedure]
                         if geometry_node is None or float(geometry_node) > 10000:
                             result_label = "low_precision"
                         else:
@@ -250,21 +326,16 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                datum_is_empty = self.datum_checker.is_not_empty(str(geometry))
-                                result_label = "not_empty" if datum_is_empty else "empty"
+        for row in self.index.geometry_rows():
+            observation, geometry = row.observation, row.wkt
+            datum_is_empty = self.datum_checker.is_not_empty(str(geometry))
+            result_label = "not_empty" if datum_is_empty else "empty"
 
-                                result_counts[result_label] += 1
-                                total_assessments += 1
+            result_counts[result_label] += 1
+            total_assessments += 1
 
-                                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
-                                self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report('Assess Datum Completeness', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -275,21 +346,16 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                epsg_link = self.datum_checker.extract_epsg_link(str(geometry))
-                                datum_metadata = self.datum_checker.get_datum_metadata(epsg_link)
-                                result_label = "valid" if datum_metadata else "invalid"
-
-                                result_counts[result_label] += 1
-                                total_assessments += 1
-                                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
-                                self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+        for row in self.index.geometry_rows():
+            observation, geometry = row.observation, row.wkt
+            epsg_link = self.datum_checker.extract_epsg_link(str(geometry))
+            datum_metadata = self.datum_checker.get_datum_metadata(epsg_link)
+            result_label = "valid" if datum_metadata else "invalid"
+
+            result_counts[result_label] += 1
+            total_assessments += 1
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report('Assess Datum Validation', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -299,23 +365,18 @@ class RDFDataQualityAssessment:
 
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                epsg_link = self.datum_checker.extract_epsg_link(str(geometry))
-                                datum_metadata = self.datum_checker.get_datum_metadata(epsg_link)
+        for row in self.index.geometry_rows():
+            observation, geometry = row.observation, row.wkt
+            epsg_link = self.datum_checker.extract_epsg_link(str(geometry))
+            datum_metadata = self.datum_checker.get_datum_metadata(epsg_link)
 
-                                result_label = datum_metadata["name"] if datum_metadata else "None"
+            result_label = datum_metadata["name"] if datum_metadata else "None"
 
-                                result_counts[result_label] += 1
-                                total_assessments += 1
+            result_counts[result_label] += 1
+            total_assessments += 1
 
-                                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
-                                self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report('Assess Datum Type', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -334,22 +395,16 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                result_label, longitude, latitude = GeoChecker.extract_and_assess_coordinate_precision(
-                                    geometry)
-
-                                if result_label:
-                                    result_counts[result_label] += 1
-                                    total_assessments += 1
-                                    self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+        for row in self.index.geometry_rows():
+            observation, geometry = row.observation, row.wkt
+            result_label, longitude, latitude = GeoChecker.extract_and_assess_coordinate_precision(geometry)
 
-                                    self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            if result_label:
+                result_counts[result_label] += 1
+                total_assessments += 1
+                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+
+                self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report('Assess Coordinate Precision', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -360,26 +415,21 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                result_label = GeoChecker.check_geometry_completeness(geometry)
-                                result_counts[result_label] += 1
-
-                                total_assessments += 1
-                                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                else:
-                                    long, lat = 0, 0
-                                geometry_point = str(long) + ', ' + str(lat)
-                                self._add_assessment_result_to_matrix(observation, assessment_name, result_label,
-                                                                      "location", geometry_point)
+        for row in self.index.geometry_rows():
+            observation, geometry = row.observation, row.wkt
+            result_label = GeoChecker.check_geometry_completeness(geometry)
+            result_counts[result_label] += 1
+
+            total_assessments += 1
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+            match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
+            if match:
+                long, lat = map(float, match.groups())
+            else:
+                long, lat = 0, 0
+            geometry_point = str(long) + ', ' + str(lat)
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label,
+                                                  "location", geometry_point)
 
         self.add_to_report(f'Assess Coordinate Completeness', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -392,9 +442,9 @@ class RDFDataQualityAssessment:
         observation_dates = []
         date_type_test = False
 
-        for s, _, o in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, ot in self.g.triples((s, TIME.hasTime, None)):
-                for _, _, date_literal in self.g.triples((ot, TIME.inXSDgYear, None)):
+        for s in self.index.observations:
+            for ot in self.index.times[s]:
+                for date_literal in self.index.years[ot]:
                     if date_literal.datatype in [XSD.dateTime, XSD.dateTimeStamp]:
                         datetime_obj = datetime.fromisoformat(date_literal)
                         observation_dates.append(datetime_obj.date())
@@ -414,9 +464,9 @@ class RDFDataQualityAssessment:
         Q3 = np.percentile(observation_dates, 75)
         IQR = Q3 - Q1
 
-        for s, _, o in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, ot in self.g.triples((s, TIME.hasTime, None)):
-                for _, _, date_literal in self.g.triples((ot, TIME.inXSDgYear, None)):
+        for s in self.index.observations:
+            for ot in self.index.times[s]:
+                for date_literal in self.index.years[ot]:
                     if date_literal.datatype in [XSD.dateTime, XSD.dateTimeStamp]:
                         datetime_obj = datetime.fromisoformat(date_literal)
                         observation_date = datetime_obj.date().toordinal()  # Convert date to ordinal value
@@ -450,76 +500,51 @@ class RDFDataQualityAssessment:
 
         observation_dates = []
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, observation_time in self.g.triples((procedure, TIME.hasTime, None)):
-                            for _, _, date_literal in self.g.triples((observation_time, TIME.inXSDgYear, None)):
-                                if date_literal.datatype in [XSD.gYear]:
-                                    datetime_obj = int(date_literal)
-                                    observation_dates.append(datetime_obj)
+        for observation in self.index.observations:
+            for _, procedure in self.index.procedures_of(observation):
+                for observation_time in self.index.times[procedure]:
+                    for date_literal in self.index.years[observation_time]:
+                        if date_literal.datatype in [XSD.gYear]:
+                            datetime_obj = int(date_literal)
+                            observation_dates.append(datetime_obj)
 
         if observation_dates:
-            base_date = min(observation_dates)
-            numeric_dates = np.array([(date - base_date) for date in observation_dates]).reshape(-1, 1)
-
-            scaler = MinMaxScaler()
-            scaled_dates = scaler.fit_transform(numeric_dates)
-
-            best_k = 2
-            best_score = -1
-
-            if len(np.unique(scaled_dates)) > 1:
-                for k in range(2, min(len(scaled_dates), 10)):
-                    kmeans = KMeans(n_clusters=k, random_state=42, verbose=1)
-                    labels = kmeans.fit_predict(scaled_dates)
-                    if len(set(labels)) > 1:
-                        score = silhouette_score(scaled_dates, labels)
-                        if score > best_score:
-                            best_k = k
-                            best_score = score
-                    else:
-                        break  # Break the loop if only one cluster has been formed
-
+            # Exact 1-D k-means for each k, the best k by the silhouette score of a sample
+            best_k, labels = best_n_clusters(observation_dates, range(2, min(len(observation_dates), 10)))
             print('Best K for kmeans as the number of clusters is ', best_k)
-
-            kmeans = KMeans(n_clusters=best_k, random_state=42, verbose=1)
-            kmeans.fit(scaled_dates)
-            labels = kmeans.labels_
+            if labels is None:
+                labels = kmeans_1d(observation_dates, best_k)
 
             outlier_cluster = np.argmin(np.bincount(labels))
-            outliers_indices = [i for i, label in enumerate(labels) if label == outlier_cluster]
+            outliers_indices = {i for i, label in enumerate(labels) if label == outlier_cluster}
 
             # Initialize a new index counter for consistent access in outliers_indices
             index_counter = 0
 
-            for observation in self.g.subjects(RDF.type, TERN.Observation):
-                for sample in self.g.objects(observation, SOSA.hasFeatureOfInterest):
-                    if (sample, RDF.type, TERN.Sample) in self.g:
-                        for procedure in self.g.objects(sample, SOSA.isResultOf):
-                            for observation_time in self.g.objects(procedure, TIME.hasTime):
-                                for date_literal in self.g.objects(observation_time, TIME.inXSDgYear):
-                                    # Check if the date is a valid datetime object and proceed
-                                    if date_literal.datatype == XSD.gYear:
-                                        try:
-                                            year = int(str(date_literal))
-                                            date = datetime(year, 1, 1)  # Assume January 1st of that year
-                                            if index_counter in outliers_indices:
-                                                result_label = "outlier_date"
-                                            else:
-                                                result_label = "normal_date"
-
-                                            result_counts[result_label] += 1
-                                            self._add_assessment_result(observation, assess_namespace,
-                                                                        namespace[result_label])
-                                            self._add_assessment_result_to_matrix(observation, assessment_name,
-                                                                                  result_label)
-
-                                            index_counter += 1
-                                        except ValueError:
-                                            index_counter += 1
-                                            continue  # Skip invalid or incorrectly formatted date literals
+            for observation in self.index.observations:
+                for _, procedure in self.index.procedures_of(observation):
+                    for observation_time in self.index.times[procedure]:
+                        for date_literal in self.index.years[observation_time]:
+                            # Check if the date is a valid datetime object and proceed
+                            if date_literal.datatype == XSD.gYear:
+                                try:
+                                    year = int(str(date_literal))
+                                    date = datetime(year, 1, 1)  # Assume January 1st of that year
+                                    if index_counter in outliers_indices:
+                                        result_label = "outlier_date"
+                                    else:
+                                        result_label = "normal_date"
+
+                                    result_counts[result_label] += 1
+                                    self._add_assessment_result(observation, assess_namespace,
+                                                                namespace[result_label])
+                                    self._add_assessment_result_to_matrix(observation, assessment_name,
+                                                                          result_label)
+
+                                    index_counter += 1
+                                except ValueError:
+                                    index_counter += 1
+                                    continue  # Skip invalid or incorrectly formatted date literals
 
             self.add_to_report(f'Assess Date Outlier Kmeans', total_assessments, result_counts)
             return assessment_name, total_assessments, result_counts
@@ -530,24 +555,32 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for s, _, o in self.g.triples((None, GEO.hasGeometry, None)):
-            if self.has_relevant_comment(s, "field-sampling"):
-                geometry = next(self.g.objects(o, GEO.asWKT), None)
+        # Collect all points first, so the states are found in one bulk query
+        subjects, longs, lats = [], [], []
+        for s, o in self.index.geometry_links:
+            if self.index.has_comment(s, "field-sampling"):
+                geometry = self.index.geometry_wkt[o]
 
                 if geometry:
                     match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
                     if match:
                         long, lat = map(float, match.groups())
-                        in_australia, state_name = self.geo_checker.is_point_in_australia_state(lat, long)
-                        result_label = state_name if in_australia else "Outside_Australia"
+                        subjects.append(s)
+                        longs.append(long)
+                        lats.append(lat)
 
-                        result_counts[result_label] += 1
+        state_names = self.geo_checker.find_states(longs, lats)
 
-                        total_assessments += 1
-                        result_label_uri = namespace[result_label.replace(' ', '_')]
+        for s, state_name in zip(subjects, state_names):
+            result_label = "Outside_Australia" if state_name == "Outside Australia" else state_name
 
-                        self._add_assessment_result(s, assess_namespace, result_label_uri)
-                        self._add_assessment_result_to_matrix(s, assessment_name, result_label)
+            result_counts[result_label] += 1
+
+            total_assessments += 1
+            result_label_uri = namespace[result_label.replace(' ', '_')]
+
+            self._add_assessment_result(s, assess_namespace, result_label_uri)
+            self._add_assessment_result_to_matrix(s, assessment_name, result_label)
 
         self.add_to_report(f'Assess Coordinate in Australia State', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -559,28 +592,16 @@ class RDFDataQualityAssessment:
                 return URIRef(namespace + local_part)
         return URIRef(prefixed_name)  # Return the original prefixed name as a URIRef if no matching prefix is found
 
-    def __uri_to_prefixed_name(self, uri):
-        if not isinstance(uri, URIRef):
-            raise ValueError("uri must be an instance of URIRef")
-
-        ns_manager = NamespaceManager(self.g)
-        for prefix, namespace in ns_manager.namespaces():
-            if uri.startswith(namespace):
-                # Replace the namespace URI with its prefix to form the prefixed name
-                return uri.replace(namespace, prefix + ":")
-
-        return str(uri)
-
     def assess_date_format_validation(self):
         assessment_name = "date_format_validation"
 
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for s, _, o in self.g.triples((None, self.data_type['time']['name'], None)):
-            if self.has_relevant_comment(s, self.data_type['time']['relevant_comment']):
+        for s, o in self.index.phenomenon_times:
+            if self.index.has_comment(s, self.data_type['time']['relevant_comment']):
                 found_date_within_range = False
-                for _, _, date_literal in self.g.triples((o, TIME.inXSDDateTimeStamp, None)):
+                for date_literal in self.index.timestamps[o]:
                     date_str = str(date_literal)
                     date_check = DateChecker(date_str[:10])
                     is_valid_date, detected_format = date_check.check_date_format_and_validate()
@@ -600,19 +621,16 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                result_label = GeoChecker.unusual_check(geometry)
-
-                                result_counts[result_label] += 1
-                                total_assessments += 1
-                                self._add_assessment_result(observation, assess_namespace, namespace[result_label])
-                                self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+        rows = self.index.geometry_rows()
+        unusual = unusual_coordinates(row.wkt for row in rows)
+        for row, is_unusual in zip(rows, unusual):
+            observation = row.observation
+            result_label = "unusual" if is_unusual else "usual"
+
+            result_counts[result_label] += 1
+            total_assessments += 1
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report('Assess Coordinate Unusual', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -620,37 +638,20 @@ class RDFDataQualityAssessment:
     @staticmethod
     def detect_unusual_numbers(number_str):
         """
-        Attempts to detect unusual numbers by looking for repeating patterns in the decimal part.
-        This is a heuristic approach and may not accurately detect all repeating patterns.
+        Detect unusual numbers: a group of 1-3 digits repeated 3 or more times in a row
+        in the decimal part (see unusual_numbers.unusual_decimals).
         """
         decimal_part = number_str.split('.')[-1] if '.' in number_str else ''
-        for length in range(1, len(decimal_part)):
-            for start in range(len(decimal_part) - length):
-                pattern = decimal_part[start:start + length]
-                remainder = decimal_part[start + length:]
-                if remainder.startswith(pattern):
-                    return 'unusual'
-        return 'usual'
+        return 'unusual' if unusual_decimals([decimal_part])[0] else 'usual'
 
     def assess_coordinate_outlier_zscore(self):
         assessment_name = "coordinate_outlier_zscore"
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        latitudes = []
-        longitudes = []
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    latitudes.append(lat)
-                                    longitudes.append(long)
+        points = self.index.points()
+        latitudes = [lat for _, _, lat in points]
+        longitudes = [long for _, long, _ in points]
 
         if not latitudes or not longitudes:
             print("No valid geographic points found.")
@@ -667,27 +668,17 @@ class RDFDataQualityAssessment:
             print("Error calculating statistics.")
             return
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    lat_z = (lat - lat_mean) / lat_std
-                                    long_z = (long - long_mean) / long_std
-                                    is_outlier = abs(lat_z) > 3 or abs(long_z) > 3
-                                    result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
-
-                                    total_assessments += 1
-                                    result_counts[result_label] += 1
+        for observation, long, lat in points:
+            lat_z = (lat - lat_mean) / lat_std
+            long_z = (long - long_mean) / long_std
+            is_outlier = abs(lat_z) > 3 or abs(long_z) > 3
+            result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
 
-                                    self._add_assessment_result(observation, assess_namespace,
-                                                                namespace[result_label.lower()])
-                                    self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            total_assessments += 1
+            result_counts[result_label] += 1
+
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label.lower()])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report(f'Assess Coordinate Outlier Zscore', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -698,20 +689,9 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        latitudes = []
-        longitudes = []
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    latitudes.append(lat)
-                                    longitudes.append(long)
+        points = self.index.points()
+        latitudes = [lat for _, _, lat in points]
+        longitudes = [long for _, long, _ in points]
 
         if not latitudes or not longitudes:
             print("No valid geographic points found.")
@@ -721,32 +701,23 @@ class RDFDataQualityAssessment:
             print("Insufficient data for outlier analysis.")
             return
 
-        lat_q1, lat_q3 = np.percentile(latitudes, [25, 75])
-        long_q1, long_q3 = np.percentile(longitudes, [25, 75])
+        # Quartiles from sketches: exact up to 100,000 points, bounded memory above (see quantile_sketch.py)
+        lat_q1, lat_q3 = QuantileSketch().add(latitudes).percentiles([25, 75])
+        long_q1, long_q3 = QuantileSketch().add(longitudes).percentiles([25, 75])
         lat_iqr = lat_q3 - lat_q1
         long_iqr = long_q3 - long_q1
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    lat_outlier = lat < lat_q1 - 1.5 * lat_iqr or lat > lat_q3 + 1.5 * lat_iqr
-                                    long_outlier = long < long_q1 - 1.5 * long_iqr or long > long_q3 + 1.5 * long_iqr
-                                    is_outlier = lat_outlier or long_outlier
-                                    result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
-
-                                    total_assessments += 1
-                                    result_counts[result_label] += 1
+        for observation, long, lat in points:
+            lat_outlier = lat < lat_q1 - 1.5 * lat_iqr or lat > lat_q3 + 1.5 * lat_iqr
+            long_outlier = long < long_q1 - 1.5 * long_iqr or long > long_q3 + 1.5 * long_iqr
+            is_outlier = lat_outlier or long_outlier
+            result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
 
-                                    self._add_assessment_result(observation, assess_namespace,
-                                                                namespace[result_label.lower()])
-                                    self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            total_assessments += 1
+            result_counts[result_label] += 1
+
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label.lower()])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report(f'Assess Coordinate Outlier IRQ', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -757,18 +728,8 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        coordinates = []
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    coordinates.append([lat, long])
+        points = self.index.points()
+        coordinates = [[lat, long] for _, long, lat in points]
 
         if not coordinates:
             print("No valid geographic points found.")
@@ -784,26 +745,16 @@ class RDFDataQualityAssessment:
 
         outlier_predictions = clf.predict(coordinates)
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    coordinate = [lat, long]
-                                    is_outlier = outlier_predictions[coordinates.index(coordinate)] == -1
-                                    result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
-
-                                    total_assessments += 1
-                                    result_counts[result_label] += 1
+        # The points are in the same order as the predictions (equal points get equal predictions)
+        for (observation, _, _), prediction in zip(points, outlier_predictions):
+            is_outlier = prediction == -1
+            result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
 
-                                    self._add_assessment_result(observation, assess_namespace,
-                                                                namespace[result_label.lower()])
-                                    self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
+            total_assessments += 1
+            result_counts[result_label] += 1
+
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label.lower()])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report(f'Assess Coordinate Outlier Isolation Forest', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -814,18 +765,8 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        coordinates = []
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    coordinates.append([lat, long])
+        points = self.index.points()
+        coordinates = [[lat, long] for _, long, lat in points]
 
         if not coordinates:
             print("No valid geographic points found.")
@@ -837,34 +778,30 @@ class RDFDataQualityAssessment:
 
         coordinates = np.array(coordinates)
 
+        # Fitted on a bounded random sample, then all points are scored in batches
+        fit_coordinates = coordinates
+        if len(coordinates) > ROBUST_COVARIANCE_FIT_SIZE:
+            rows = np.random.default_rng(42).choice(len(coordinates), size=ROBUST_COVARIANCE_FIT_SIZE, replace=False)
+            fit_coordinates = coordinates[np.sort(rows)]
+
         cov_estimator = EllipticEnvelope(contamination=0.1, random_state=42)
-        cov_estimator.fit(coordinates)
+        cov_estimator.fit(fit_coordinates)
 
-        outlier_predictions = cov_estimator.predict(coordinates)
+        outlier_predictions = np.concatenate([
+            cov_estimator.predict(coordinates[start:start + SCORE_BATCH_SIZE])
+            for start in range(0, len(coordinates), SCORE_BATCH_SIZE)
+        ])
 
-        for observation, _, _ in self.g.triples((None, RDF.type, TERN.Observation)):
-            for _, _, sample in self.g.triples((observation, SOSA.hasFeatureOfInterest, None)):
-                if (sample, RDF.type, TERN.Sample) in self.g:
-                    for _, _, procedure in self.g.triples((sample, SOSA.isResultOf, None)):
-                        for _, _, geometry_node in self.g.triples((procedure, GEO.hasGeometry, None)):
-                            geometry = next(self.g.objects(geometry_node, GEO.asWKT), None)
-                            if geometry:
-                                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(geometry))
-                                if match:
-                                    long, lat = map(float, match.groups())
-                                    coordinate = [lat, long]
-                                    coordinate_index = np.where((coordinates == coordinate).all(axis=1))[0]
-                                    if len(coordinate_index) > 0:
-                                        is_outlier = outlier_predictions[coordinate_index[0]] == -1
-                                        result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
-
-                                        total_assessments += 1
-                                        result_counts[result_label] += 1
-
-                                        self._add_assessment_result(observation, assess_namespace,
-                                                                    namespace[result_label.lower()])
-                                        self._add_assessment_result_to_matrix(observation, assessment_name,
-                                                                              result_label)
+        # The points are in the same order as the predictions (equal points get equal predictions)
+        for (observation, _, _), prediction in zip(points, outlier_predictions):
+            is_outlier = prediction == -1
+            result_label = "outlier_coordinate" if is_outlier else "normal_coordinate"
+
+            total_assessments += 1
+            result_counts[result_label] += 1
+
+            self._add_assessment_result(observation, assess_namespace, namespace[result_label.lower()])
+            self._add_assessment_result_to_matrix(observation, assessment_name, result_label)
 
         self.add_to_report(f'Assess Coordinate Outlier Robust Covariance', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -874,21 +811,19 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for s, p, o in self.g.triples((None, RDF.value, None)):
-
-            if (s, RDF.type, TERN.FeatureOfInterest) in self.g:
-                scientific_name = str(o).strip()
+        for s, o in self.index.names:
+            scientific_name = str(o).strip()
 
-                if scientific_name is None or str(scientific_name).strip() == "":
-                    result_label = "empty_name"
-                else:
-                    result_label = "non_empty_name"
+            if scientific_name is None or str(scientific_name).strip() == "":
+                result_label = "empty_name"
+            else:
+                result_label = "non_empty_name"
 
-                result_counts[result_label] += 1
-                total_assessments += 1
+            result_counts[result_label] += 1
+            total_assessments += 1
 
-                self._add_assessment_result(s, assess_namespace, namespace[result_label])
-                self._add_assessment_result_to_matrix(s, assessment_name, result_label)
+            self._add_assessment_result(s, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(s, assessment_name, result_label)
 
         self.add_to_report('Assess Scientific Name Completeness', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
@@ -898,79 +833,77 @@ class RDFDataQualityAssessment:
         namespace, assess_namespace, result_counts, total_assessments = self.vocab_manager.init_assessment(
             assessment_name)
 
-        for s, p, o in self.g.triples((None, RDF.value, None)):
-            if (s, RDF.type, TERN.FeatureOfInterest) in self.g:
-                scientific_name = str(o).strip()
+        for s, o in self.index.names:
+            scientific_name = str(o).strip()
 
-                if scientific_name and ScientificNameChecker.is_valid_scientific_name(scientific_name):
-                    result_label = "valid_name"
-                else:
-                    result_label = "invalid_name"
+            if scientific_name and ScientificNameChecker.is_valid_scientific_name(scientific_name):
+                result_label = "valid_name"
+            else:
+                result_label = "invalid_name"
 
-                total_assessments += 1
-                result_counts[result_label] += 1
-                self._add_assessment_result(s, assess_namespace, namespace[result_label])
-                self._add_assessment_result_to_matrix(s, assessment_name, result_label)
+            total_assessments += 1
+            result_counts[result_label] += 1
+            self._add_assessment_result(s, assess_namespace, namespace[result_label])
+            self._add_assessment_result_to_matrix(s, assessment_name, result_label)
 
         self.add_to_report('Assess Scientific Name Validation', total_assessments, result_counts)
         return assessment_name, total_assessments, result_counts
 
     def _add_assessment_result(self, subject, assessment_type, value, assessment_date=None):
-        result_bn = BNode()
-        self.g.add((subject, DQAF.hasDQAFResult, result_bn))
-
-        self.g.add((result_bn, SOSA.observedProperty, assessment_type))
-
         if isinstance(value, URIRef):
-            self.g.add((result_bn, SDO.value, value))
+            pass
         elif isinstance(value, str):
-            prefixed_name = self.__uri_to_prefixed_name(value)
-            uri_value = self.__prefixed_name_to_uri(prefixed_name)
-            self.g.add((result_bn, SDO.value, uri_value))
+            value = self._label_uri(value)
         else:
-            self.g.add((result_bn, SDO.value, Literal(value)))
-        if assessment_date is None:
-            assessment_date = datetime.now()
-        elif isinstance(assessment_date, datetime.date) and not isinstance(assessment_date, datetime.datetime):
-            assessment_date = datetime.datetime.combine(assessment_date, datetime.time.min)
-
-        self.g.add((result_bn, SOSA.resultTime, Literal(assessment_date, datatype=XSD.dateTime)))
-
-    def _add_assessment_result_to_matrix(self, subject, assessment_name, label, extra_field=None, extra_value=None):
-        observation_id = UseCaseManager.extract_record_number(subject)
-        field_name = assessment_name + ":" + label
-
-        if 'observation_id' in self.result_matrix_df.columns and \
-                any(self.result_matrix_df['observation_id'] == observation_id):
-            row_index = self.result_matrix_df[self.result_matrix_df['observation_id'] == observation_id].index
-            if field_name not in self.result_matrix_df.columns:
-                self.result_matrix_df[field_name] = pd.NA
-            self.result_matrix_df.loc[row_index, field_name] = 1
-            if extra_field is not None and extra_value is not None:
-                if extra_field not in self.result_matrix_df.columns:
-                    self.result_matrix_df[extra_field] = pd.NA
-                self.result_matrix_df.loc[row_index, extra_field] = extra_value
+            value = Literal(value)
+
+        if self.compact_results and assessment_date is None:
+            result_bn = self._shared_results.get((assessment_type, value))
+            if result_bn is None:
+                result_bn = self._shared_results[(assessment_type, value)] = BNode()
+                self._queue_result(result_bn, assessment_type, value, self.result_time)
+            self._pending_results.append((subject, DQAF.hasDQAFResult, result_bn, self.g))
         else:
-            new_row = {'observation_id': observation_id, field_name: 1}
-            if extra_field is not None and extra_value is not None:
-                new_row[extra_field] = extra_value
-            self.result_matrix_df.loc[len(self.result_matrix_df)] = new_row
+            if assessment_date is None:
+                assessment_date = datetime.now()
+            elif isinstance(assessment_date, datetime.date) and not isinstance(assessment_date, datetime.datetime):
+                assessment_date = datetime.datetime.combine(assessment_date, datetime.time.min)
+
+            result_bn = BNode()
+            self._pending_results.append((subject, DQAF.hasDQAFResult, result_bn, self.g))
+            self._queue_result(result_bn, assessment_type, value, Literal(assessment_date, datatype=XSD.dateTime))
+
+        if len(self._pending_results) >= RESULT_BATCH_SIZE:
+            self.flush_results()
+
+    def _queue_result(self, result_bn, assessment_type, value, result_time):
+        self._pending_results.append((result_bn, SOSA.observedProperty, assessment_type, self.g))
+        self._pending_results.append((result_bn, SDO.value, value, self.g))
+        self._pending_results.append((result_bn, SOSA.resultTime, result_time, self.g))
+
+    def _label_uri(self, label):
+        # A label given as text (a prefixed name or a URI) is resolved one time
+        uri = self._label_uris.get(label)
+        if uri is None:
+            uri = self._label_uris[label] = self.__prefixed_name_to_uri(label)
+        return uri
+
+    def flush_results(self):
+        """Add the queued results to the graph."""
+        if self._pending_results:
+            self.g.addN(self._pending_results)
+            self._pending_results = []
 
-    def _add_assessment_result_to_matrix_old(self, subject, assessment_name, label, extra_field=None, extra_value=None):
+    def _add_assessment_result_to_matrix(self, subject, assessment_name, label, extra_field=None, extra_value=None):
         observation_id = UseCaseManager.extract_record_number(subject)
         field_name = assessment_name + ":" + label
 
-        if 'observation_id' in self.result_matrix_df.columns and \
-                any(self.result_matrix_df['observation_id'] == observation_id):
-            row_index = self.result_matrix_df[self.result_matrix_df['observation_id'] == observation_id].index
-            if field_name not in self.result_matrix_df.columns:
-                self.result_matrix_df[field_name] = pd.NA
-            self.result_matrix_df.loc[row_index, field_name] = 1
-        else:
-            new_row = {'observation_id': observation_id, field_name: 1}
-            self.result_matrix_df.loc[len(self.result_matrix_df)] = new_row
+        self.result_matrix.add(observation_id, field_name, extra_field, extra_value)
+        self._result_matrix_df = None
 
     def add_to_report(self, assessment_name, total_assessments, result_counts):
+        # The last step of every assessment, so its results are in the graph when it returns
+        self.flush_results()
         if self.report_file:
             print(f'', file=self.report_file)
             print(f'- {assessment_name}: {total_assessments}', file=self.report_file)
@@ -978,6 +911,49 @@ class RDFDataQualityAssessment:
                 print(f'\t{quality}: {count}', file=self.report_file)
 
 
+class _RecordingAssessment(RDFDataQualityAssessment):
+    """An assessment in a worker process: it records the results it would add to the graph."""
+
+    @classmethod
+    def from_assessment(cls, assessment):
+        recorder = cls.__new__(cls)
+        recorder.__dict__.update(assessment.__dict__)
+        # Build the index here, so the workers share it and do not need the graph
+        recorder._index = assessment.index
+        recorder.g = None
+        recorder.report_analysis = None
+        recorder.report_file = None
+        recorder.result_matrix = None
+        recorder._result_matrix_df = None
+        recorder.results = []
+        recorder.matrix_rows = []
+        recorder._pending_results = []
+        return recorder
+
+    def _add_assessment_result(self, subject, assessment_type, value, assessment_date=None):
+        self.results.append((subject, assessment_type, value))
+
+    def _add_assessment_result_to_matrix(self, subject, assessment_name, label, extra_field=None, extra_value=None):
+        self.matrix_rows.append((subject, assessment_name, label, extra_field, extra_value))
+
+
+_worker_assessment = None
+
+
+def _init_worker(recorder):
+    global _worker_assessment
+    _worker_assessment = recorder
+
+
+def _run_recorded_assessment(assessment):
+    recorder = _worker_assessment
+    recorder.results = []
+    recorder.matrix_rows = []
+    recorder.report_file = io.StringIO()
+    result = getattr(recorder, assessment)()
+    return result, recorder.results, recorder.matrix_rows, recorder.report_file.getvalue()
+
+
 class DateChecker:
     def __init__(self, data, date_format="%Y-%m-%d"):
         self.data = data
@@ -1170,13 +1146,48 @@ class AustraliaGeographyChecker:
             state_name: gpd.read_file(shapefile).to_crs(epsg=4326)
             for state_name, shapefile in self.states_shapefiles.items()
         }
+        self._build_state_index()
+
+    def _build_state_index(self):
+        """
+        Keep the polygons of all states in one array, prepared one time,
+        with the state number of each polygon (in the order of states_data).
+        """
+        self.state_names = np.array(list(self.states_data.keys()) + ["Outside Australia"], dtype=object)
+        geometries = []
+        polygon_states = []
+        for state_number, state_data in enumerate(self.states_data.values()):
+            state_geometries = state_data.geometry.values
+            state_geometries = state_geometries[~(state_data.geometry.isna() | state_data.geometry.is_empty).values]
+            geometries.extend(state_geometries)
+            polygon_states.extend([state_number] * len(state_geometries))
+
+        self.state_geometries = np.array(geometries, dtype=object)
+        shapely.prepare(self.state_geometries)
+        self.polygon_states = np.array(polygon_states, dtype=np.intp)
+
+    def find_states(self, longs, lats):
+        """
+        Find the state of many points at once.
+        Returns an array of state names, or "Outside Australia" for points in no state.
+        When a point is in more than one state, the first state in states_data is used,
+        the same as is_point_in_australia_state.
+        """
+        points = shapely.points(np.asarray(longs, dtype=float), np.asarray(lats, dtype=float))
+        outside = len(self.state_names) - 1
+        state_numbers = np.full(len(points), outside, dtype=np.intp)
+
+        if len(points) and len(self.polygon_states):
+            # Put the points in an STRtree and ask which points each prepared polygon contains
+            point_tree = shapely.STRtree(points)
+            polygon_index, point_index = point_tree.query(self.state_geometries, predicate="contains")
+            np.minimum.at(state_numbers, point_index, self.polygon_states[polygon_index])
+
+        return self.state_names[state_numbers]
 
     def is_point_in_australia_state(self, lat, long):
-        point = Point(long, lat)
-        for state_name, state_data in self.states_data.items():
-            if state_data.contains(point).any():
-                return True, state_name
-        return False, "Outside Australia"
+        state_name = self.find_states([long], [lat])[0]
+        return state_name != "Outside Australia", state_name
 
 
 class ScientificNameChecker:
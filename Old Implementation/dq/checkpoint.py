@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from rdflib import Graph
+
+# Checkpoint formats: file extension and rdflib format
+CHECKPOINT_FORMATS = {
+    'nt': ('.nt', 'nt'),
+    'ttl': ('.ttl', 'turtle'),
+}
+
+
+class CheckpointWriter:
+    """
+    Writes the result graph of a stage to a file in a background thread, while the
+    next stage goes on with the graph in memory.
+
+    The triples are copied when the checkpoint is asked for, so the next stage can
+    add its results to the same graph. N-Triples ('nt') are written without the
+    sorting of Turtle, so they are much faster to write (and to read).
+    With checkpoint_format None nothing is written.
+    """
+
+    def __init__(self, checkpoint_format='nt'):
+        if checkpoint_format is not None and checkpoint_format not in CHECKPOINT_FORMATS:
+            raise ValueError(f"Unknown checkpoint format: {checkpoint_format}")
+        self.checkpoint_format = checkpoint_format
+        self._executor = ThreadPoolExecutor(max_workers=1) if checkpoint_format else None
+        self._futures = []
+
+    def write(self, g: Graph, base_path):
+        """Write g to base_path + the extension of the format. Returns the file name, or None."""
+        if not self.checkpoint_format:
+            return None
+        extension, rdf_format = CHECKPOINT_FORMATS[self.checkpoint_format]
+        destination = str(base_path) + extension
+        triples = list(g)
+        namespaces = list(g.namespaces())
+        self._futures.append(self._executor.submit(_write_triples, triples, namespaces, destination, rdf_format))
+        return destination
+
+    def close(self):
+        """Wait for the checkpoints to be written (an error in the writer is raised here)."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            for future in self._futures:
+                future.result()
+            self._futures = []
+
+
+def _write_triples(triples, namespaces, destination, rdf_format):
+    # The copy is put in a new graph on the writer thread and written with rdflib's serializer
+    g = Graph()
+    for prefix, namespace in namespaces:
+        g.bind(prefix, namespace, override=False)
+    g.addN((s, p, o, g) for s, p, o in triples)
+    g.serialize(destination=destination, format=rdf_format)
@@ -0,0 +1,64 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from rdflib import Graph, BNode
+
+
+def expand_inputs(patterns):
+    """
+    The files to assess: each pattern is a file or a glob like "input/chunk_*.ttl".
+    Files matched by a glob are sorted, and a file given twice is loaded once.
+    """
+    paths = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise FileNotFoundError(f"No files match {pattern}")
+        for match in matches:
+            path = Path(match)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def load_graph(paths, jobs=1) -> Graph:
+    """
+    Parse the files (in jobs worker processes) and merge their triples into one graph.
+
+    Blank nodes get the number of their file in the label, so blank nodes of
+    different files stay different, like in a graph that parses the files one by one.
+    """
+    g = Graph()
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            parsed = pool.map(_parse_file, paths, range(len(paths)))
+            for triples, namespaces in parsed:
+                _merge(g, triples, namespaces)
+    else:
+        for number, path in enumerate(paths):
+            _merge(g, *_parse_file(path, number))
+    return g
+
+
+def _parse_file(path, number):
+    file_graph = Graph().parse(source=str(path), format=_format(path))
+
+    def relabel(term):
+        return BNode(f"f{number}b{term}") if isinstance(term, BNode) else term
+
+    triples = [(relabel(s), p, relabel(o)) for s, p, o in file_graph]
+    return triples, list(file_graph.namespaces())
+
+
+def _merge(g, triples, namespaces):
+    for prefix, namespace in namespaces:
+        g.bind(prefix, namespace, override=False)
+    g.addN((s, p, o, g) for s, p, o in triples)
+
+
+def _format(path):
+    extension = os.path.splitext(str(path))[1].lower()
+    return {'.nt': 'nt', '.nq': 'nquads', '.rdf': 'xml', '.xml': 'xml', '.jsonld': 'json-ld'}.get(extension, 'ttl')
@@ -0,0 +1,76 @@
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet is optional, CSV and Excel work without it
+    pa = None
+    pq = None
+
+# Rows written per batch, so a large matrix is not converted in one piece
+DEFAULT_BATCH_SIZE = 100_000
+
+# Excel sheets have 1,048,576 rows, one of them is the header
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def write_parquet(df: pd.DataFrame, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Parquet with dictionary encoded, zstd compressed columns (needs pyarrow)."""
+    if pq is None:
+        raise ImportError("Writing Parquet needs pyarrow: pip install pyarrow")
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema, compression='zstd', use_dictionary=True) as writer:
+        for start in range(0, max(len(df), 1), batch_size):
+            batch = df.iloc[start:start + batch_size]
+            writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+
+
+def write_csv(df: pd.DataFrame, path, batch_size=DEFAULT_BATCH_SIZE):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        df.iloc[:0].to_csv(f, index=False)
+        for start in range(0, len(df), batch_size):
+            df.iloc[start:start + batch_size].to_csv(f, index=False, header=False)
+
+
+def write_xlsx(df: pd.DataFrame, path, batch_size=DEFAULT_BATCH_SIZE):
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df)} rows do not fit in an Excel sheet, use the parquet or csv format")
+    df.to_excel(path, sheet_name="matrix", index=None)
+
+
+# Result matrix formats: file extension and writer
+MATRIX_WRITERS = {
+    'parquet': ('.parquet', write_parquet),
+    'csv': ('.csv', write_csv),
+    'xlsx': ('.xlsx', write_xlsx),
+}
+
+
+def default_matrix_format():
+    return 'parquet' if pq is not None else 'csv'
+
+
+def write_result_matrix(df: pd.DataFrame, base_path, matrix_format=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Write the result matrix to base_path + the extension of the format. Returns the file name."""
+    if matrix_format is None:
+        matrix_format = default_matrix_format()
+    if matrix_format not in MATRIX_WRITERS:
+        raise ValueError(f"Unknown result matrix format: {matrix_format}")
+    extension, writer = MATRIX_WRITERS[matrix_format]
+    path = str(base_path) + extension
+    writer(df, path, batch_size)
+    return path
+
+
+def read_result_matrix(path, name=None) -> pd.DataFrame:
+    """
+    Read a result matrix written by write_result_matrix (the format comes from the extension).
+    path can also be an open file, e.g. an upload, with its file name given as name.
+    """
+    if name is None:
+        path = name = str(path)
+    if name.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if name.endswith('.csv'):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
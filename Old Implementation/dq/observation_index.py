@@ -0,0 +1,127 @@
+import re
+
+from rdflib import Graph
+from rdflib.namespace import SOSA, TIME, GEO, RDF, RDFS
+
+from .defined_namespaces import TERN
+
+
+class GeometryRow:
+    """One observation -> sample -> procedure -> geometry chain that has a WKT literal."""
+
+    __slots__ = ('observation', 'sample', 'procedure', 'geometry_node', 'wkt')
+
+    def __init__(self, observation, sample, procedure, geometry_node, wkt):
+        self.observation = observation
+        self.sample = sample
+        self.procedure = procedure
+        self.geometry_node = geometry_node
+        self.wkt = wkt
+
+
+class ObservationIndex:
+    """
+    Everything the assess_* methods read from the graph, collected in one pass.
+
+    For each tern:Observation it keeps its samples, the procedures of the samples,
+    the geometries (first geo:asWKT) and spatial accuracy of the procedures, the
+    time nodes and their year literals. It also keeps the geo:hasGeometry and
+    sosa:phenomenonTime links with the comments of their subjects, and the
+    rdf:value names of tern:FeatureOfInterest nodes.
+
+    The lists are in the same order as the graph lookups they replace, so the
+    results (and the rows of the result matrix) come in the same order as before.
+    """
+
+    def __init__(self, g: Graph):
+        self.observations = [s for s, _, _ in g.triples((None, RDF.type, TERN.Observation))]
+        self.samples = {}          # observation -> [(sample, is a tern:Sample)]
+        self.procedures = {}       # sample -> [procedure]
+        self.geometries = {}       # procedure -> [(geometry node, first WKT or None)]
+        self.spatial_accuracy = {}  # procedure -> first geo:hasMetricSpatialAccuracy or None
+        self.times = {}            # observation or procedure -> [time node]
+        self.years = {}            # time node -> [time:inXSDgYear literals]
+        self.timestamps = {}       # time node -> [time:inXSDDateTimeStamp literals]
+        self.comments = {}         # subject -> [rdfs:comment literals]
+
+        for observation in self.observations:
+            self._add_times(g, observation)
+            samples = self.samples[observation] = []
+            for sample in g.objects(observation, SOSA.hasFeatureOfInterest):
+                is_sample = (sample, RDF.type, TERN.Sample) in g
+                samples.append((sample, is_sample))
+                if is_sample and sample not in self.procedures:
+                    self.procedures[sample] = list(g.objects(sample, SOSA.isResultOf))
+                    for procedure in self.procedures[sample]:
+                        self._add_procedure(g, procedure)
+
+        # Links that the location and date format rules read without the observation
+        self.geometry_links = [(s, o) for s, _, o in g.triples((None, GEO.hasGeometry, None))]
+        self.phenomenon_times = [(s, o) for s, _, o in g.triples((None, SOSA.phenomenonTime, None))]
+        self.geometry_wkt = {}
+        for s, geometry_node in self.geometry_links:
+            self._add_comments(g, s)
+            if geometry_node not in self.geometry_wkt:
+                self.geometry_wkt[geometry_node] = next(g.objects(geometry_node, GEO.asWKT), None)
+        for s, time_node in self.phenomenon_times:
+            self._add_comments(g, s)
+            if time_node not in self.timestamps:
+                self.timestamps[time_node] = list(g.objects(time_node, TIME.inXSDDateTimeStamp))
+
+        self.names = [(s, o) for s, _, o in g.triples((None, RDF.value, None))
+                      if (s, RDF.type, TERN.FeatureOfInterest) in g]
+
+        self._geometry_rows = None
+        self._points = None
+
+    def procedures_of(self, observation):
+        """(sample, procedure) pairs of the tern:Sample features of an observation."""
+        for sample, is_sample in self.samples.get(observation, ()):
+            if is_sample:
+                for procedure in self.procedures[sample]:
+                    yield sample, procedure
+
+    def geometry_rows(self):
+        """Every observation -> sample -> procedure -> geometry chain with a WKT, in graph order."""
+        if self._geometry_rows is None:
+            self._geometry_rows = [
+                GeometryRow(observation, sample, procedure, geometry_node, wkt)
+                for observation in self.observations
+                for sample, procedure in self.procedures_of(observation)
+                for geometry_node, wkt in self.geometries[procedure]
+                if wkt
+            ]
+        return self._geometry_rows
+
+    def points(self):
+        """(observation, long, lat) for the geometry rows with a "POINT (long lat)" WKT."""
+        if self._points is None:
+            points = []
+            for row in self.geometry_rows():
+                match = re.search(r"POINT \(([^ ]+) ([^ ]+)\)", str(row.wkt))
+                if match:
+                    long, lat = map(float, match.groups())
+                    points.append((row.observation, long, lat))
+            self._points = points
+        return self._points
+
+    def has_comment(self, subject, text):
+        return any(text in str(comment) for comment in self.comments.get(subject, ()))
+
+    def _add_times(self, g, subject):
+        self.times[subject] = list(g.objects(subject, TIME.hasTime))
+        for time_node in self.times[subject]:
+            if time_node not in self.years:
+                self.years[time_node] = list(g.objects(time_node, TIME.inXSDgYear))
+
+    def _add_procedure(self, g, procedure):
+        if procedure in self.geometries:
+            return
+        self.geometries[procedure] = [(geometry_node, next(g.objects(geometry_node, GEO.asWKT), None))
+                                      for geometry_node in g.objects(procedure, GEO.hasGeometry)]
+        self.spatial_accuracy[procedure] = next(g.objects(procedure, GEO.hasMetricSpatialAccuracy), None)
+        self._add_times(g, procedure)
+
+    def _add_comments(self, g, subject):
+        if subject not in self.comments:
+            self.comments[subject] = list(g.objects(subject, RDFS.comment))
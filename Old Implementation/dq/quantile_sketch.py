@@ -0,0 +1,132 @@
+import math
+
+import numpy as np
+
+# Up to this many values the sketch keeps the values, and its quantiles are those of np.percentile
+DEFAULT_MAX_EXACT = 100_000
+
+# Above DEFAULT_MAX_EXACT values, quantiles are within this relative error of a value of the data
+DEFAULT_RELATIVE_ACCURACY = 1e-5
+
+
+class QuantileSketch:
+    """
+    A quantile summary that can be built per chunk (or worker) and merged.
+
+    The sketch keeps the values while there are at most max_exact of them. With more,
+    every value is counted in a bucket of relative width relative_accuracy, on a log
+    scale for positive and negative values (like DDSketch), so the memory only grows
+    with the log of the range of the values. Both forms only depend on the values that
+    were added, not on how they were split in chunks or the order of merging, so
+    merged chunks give the same quantiles as one run on all values.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_exact=DEFAULT_MAX_EXACT):
+        self.relative_accuracy = relative_accuracy
+        self.max_exact = max_exact
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._values = []     # arrays of values, while count <= max_exact
+        self._buckets = None  # {-1: negative, 0: zero, 1: positive}: (bucket keys, counts), after that
+
+    @property
+    def exact(self):
+        return self._buckets is None
+
+    def add(self, values):
+        """Add an array of values (NaN values are left out)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if self.exact:
+            self._values.append(values)
+            if self.count > self.max_exact:
+                self._to_buckets()
+        else:
+            self._add_to_buckets(values)
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the values of another sketch with the same relative_accuracy and max_exact."""
+        if (other.relative_accuracy, other.max_exact) != (self.relative_accuracy, self.max_exact):
+            raise ValueError('Only sketches with the same relative_accuracy and max_exact can be merged')
+        if other.count == 0:
+            return self
+        if other.exact:
+            return self.add(np.concatenate(other._values))
+
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self.exact:
+            self._to_buckets()
+        for sign, (keys, counts) in other._buckets.items():
+            self._merge_buckets(sign, keys, counts)
+        return self
+
+    def percentiles(self, percentiles):
+        """The percentiles (0-100) of the values, with the linear interpolation of np.percentile."""
+        if self.count == 0:
+            raise ValueError('The sketch has no values')
+        if self.exact:
+            return np.percentile(np.concatenate(self._values), percentiles)
+
+        # Bucket values from the lowest to the highest: negative (largest key first), zero, positive
+        negative_keys, negative_counts = self._buckets[-1]
+        zero_keys, zero_counts = self._buckets[0]
+        positive_keys, positive_counts = self._buckets[1]
+        values = np.concatenate((-self._representative(negative_keys[::-1]), np.zeros(len(zero_keys)),
+                                 self._representative(positive_keys)))
+        counts = np.concatenate((negative_counts[::-1], zero_counts, positive_counts))
+        values = np.clip(values, self.min, self.max)
+        ends = np.cumsum(counts)
+
+        position = (self.count - 1) * (np.asarray(percentiles, dtype=np.float64) / 100)
+        below = np.floor(position)
+        above = np.minimum(below + 1, self.count - 1)
+        low = values[np.searchsorted(ends, below, side='right')]
+        high = values[np.searchsorted(ends, above, side='right')]
+        return low + (high - low) * (position - below)
+
+    def _to_buckets(self):
+        values = np.concatenate(self._values) if self._values else np.zeros(0)
+        self._values = []
+        self._buckets = {sign: (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)) for sign in (-1, 0, 1)}
+        self._add_to_buckets(values)
+
+    def _add_to_buckets(self, values):
+        signs = np.sign(values).astype(np.int64)
+        for sign in (-1, 0, 1):
+            part = np.abs(values[signs == sign])
+            if sign == 0:
+                keys = np.zeros(len(part), dtype=np.int64)
+            else:
+                keys = np.ceil(np.log(part) / np.log(self.gamma)).astype(np.int64)
+            keys, counts = np.unique(keys, return_counts=True)
+            self._merge_buckets(sign, keys, counts)
+
+    def _merge_buckets(self, sign, keys, counts):
+        old_keys, old_counts = self._buckets[sign]
+        all_keys, position = np.unique(np.concatenate((old_keys, keys)), return_inverse=True)
+        all_counts = np.bincount(position, weights=np.concatenate((old_counts, counts)), minlength=len(all_keys))
+        self._buckets[sign] = (all_keys, all_counts.astype(np.int64))
+
+    def _representative(self, keys):
+        # The middle of bucket k, (gamma^(k-1), gamma^k], within relative_accuracy of every value in it
+        return 2 * np.power(self.gamma, keys.astype(np.float64)) / (self.gamma + 1)
+
+
+def merge_sketches(sketches) -> QuantileSketch:
+    """One sketch with the values of all the sketches (for example one per chunk)."""
+    sketches = list(sketches)
+    merged = QuantileSketch(sketches[0].relative_accuracy, sketches[0].max_exact)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
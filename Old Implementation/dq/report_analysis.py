@@ -1,14 +1,141 @@
 import re
-from collections import defaultdict
 from typing import Dict
 
+import numpy as np
+import pandas as pd
 from rdflib import Graph, URIRef, Literal
 
 
+# Terms are hashed for the HyperLogLog counters in batches of this size
+HASH_BATCH_SIZE = 100_000
+
+
+class HyperLogLog:
+    """
+    Estimate of the number of distinct values in 2**precision one-byte registers.
+    With the default precision (16 KB) the standard error is about 0.8%.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        self._pending = []
+
+    def add(self, value):
+        self._pending.append(str(value))
+        if len(self._pending) >= HASH_BATCH_SIZE:
+            self._flush()
+
+    def __len__(self):
+        self._flush()
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Few values: linear counting is more accurate
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def _flush(self):
+        if not self._pending:
+            return
+        hashes = pd.util.hash_array(np.array(self._pending, dtype=object), categorize=False)
+        self._pending = []
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # Position of the first 1 bit in the rest of the hash
+        rank = (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+
+def _bit_length(values):
+    lengths = np.zeros(len(values), dtype=np.int64)
+    values = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= np.uint64(1 << shift)
+        lengths[big] += shift
+        values[big] >>= np.uint64(shift)
+    return lengths + (values > 0)
+
+
+class GraphStatistics:
+    """
+    The numbers of the report, collected in one pass over the graph: the number of
+    triples, distinct subjects, predicates and objects, the triples and empty
+    literals per predicate, and the namespace frequencies of the URIs.
+
+    With approximate_distinct the distinct subjects and objects are counted with
+    HyperLogLog, so the memory does not grow with the graph.
+    """
+
+    def __init__(self, g: Graph, approximate_distinct=False):
+        self.approximate_distinct = approximate_distinct
+        self.triples = 0
+        self.predicate_counts = {}
+        self.empty_counts = {}
+        self.namespace_counts = {}
+        subjects = HyperLogLog() if approximate_distinct else set()
+        objects = HyperLogLog() if approximate_distinct else set()
+
+        namespace_counts = self.namespace_counts
+        predicate_counts = self.predicate_counts
+        predicate_namespaces = {}
+        for s, p, o in g:
+            self.triples += 1
+            subjects.add(s)
+            objects.add(o)
+
+            if p in predicate_counts:
+                predicate_counts[p] += 1
+            else:
+                predicate_counts[p] = 1
+                self.empty_counts[p] = 0
+                predicate_namespaces[p] = _namespace(p) if isinstance(p, URIRef) else None
+            if isinstance(o, Literal) and not o.strip():
+                self.empty_counts[p] += 1
+
+            # The same order as before (subject, predicate, object), so equal frequencies keep their order
+            if isinstance(s, URIRef):
+                namespace = _namespace(s)
+                namespace_counts[namespace] = namespace_counts.get(namespace, 0) + 1
+            if predicate_namespaces[p] is not None:
+                namespace = predicate_namespaces[p]
+                namespace_counts[namespace] = namespace_counts.get(namespace, 0) + 1
+            if isinstance(o, URIRef):
+                namespace = _namespace(o)
+                namespace_counts[namespace] = namespace_counts.get(namespace, 0) + 1
+
+        self.subjects = len(subjects)
+        self.predicates = len(predicate_counts)
+        self.objects = len(objects)
+
+
+def _namespace(uri):
+    # The same as ReportAnalysis.extract_namespace: everything up to the last '#' or '/'
+    end = max(uri.rfind('#'), uri.rfind('/'))
+    return str(uri[:end + 1]) if end >= 0 else str(uri)
+
+
 class ReportAnalysis:
     def __init__(self, g: Graph, report_file=None):
         self.g = g
         self.report_file = report_file
+        self._statistics = None
+
+    def statistics(self, approximate_distinct=None) -> GraphStatistics:
+        # Collected one time. The counts per predicate, empty literals and namespaces are exact
+        # either way, so the collected statistics are used unless the other counting is asked for.
+        statistics = self._statistics
+        if statistics is None or (approximate_distinct is not None
+                                  and statistics.approximate_distinct != approximate_distinct):
+            statistics = self._statistics = GraphStatistics(self.g, bool(approximate_distinct))
+        return statistics
+
+    def clear_statistics(self):
+        """Forget the collected statistics, for example after triples were added to the graph."""
+        self._statistics = None
 
     @staticmethod
     def extract_namespace(uri):
@@ -19,57 +146,36 @@ class ReportAnalysis:
         return uri_str
 
     def namespace_frequencies(self):
-        ns_freq = defaultdict(int)
-
-        for s, p, o in self.g:
-            if isinstance(s, URIRef):
-                ns_freq[self.extract_namespace(s)] += 1
-            if isinstance(p, URIRef):
-                ns_freq[self.extract_namespace(p)] += 1
-            if isinstance(o, URIRef):
-                ns_freq[self.extract_namespace(o)] += 1
-
+        ns_freq = self.statistics().namespace_counts
         sorted_ns_freq = sorted(ns_freq.items(), key=lambda item: item[1], reverse=True)
         return sorted_ns_freq
 
     def get_sorted_namespaces(self):
         frequencies = self.namespace_frequencies()
 
-        sorted_namespaces = []
-        for ns_uri, freq in frequencies:
-            prefix = [prefix for prefix, uri in self.g.namespaces() if str(uri) == ns_uri]
-            if prefix:
-                sorted_namespaces.append((prefix[0], ns_uri, freq))
-            else:
-                sorted_namespaces.append((None, ns_uri, freq))
+        # The first prefix bound to each namespace URI
+        prefixes = {}
+        for prefix, uri in self.g.namespaces():
+            prefixes.setdefault(str(uri), prefix)
 
-        return sorted_namespaces
+        return [(prefixes.get(ns_uri), ns_uri, freq) for ns_uri, freq in frequencies]
 
     def analyze_unique_predicates(self) -> Dict[str, int]:
-        predicates = set(self.g.predicates())
-        return {str(p): sum(1 for _ in self.g.triples((None, p, None))) for p in predicates}
+        return {str(p): count for p, count in self.statistics().predicate_counts.items()}
 
     def predicate_value_assessment(self) -> Dict[str, Dict[str, int]]:
-        predicate_assessment = {}
-        for predicate in set(self.g.predicates()):
-            predicate_assessment[str(predicate)] = {"non_empty": 0, "empty": 0}
-            for _, _, obj in self.g.triples((None, predicate, None)):
-                if obj is None or (isinstance(obj, Literal) and not obj.strip()):
-                    predicate_assessment[str(predicate)]["empty"] += 1
-                else:
-                    predicate_assessment[str(predicate)]["non_empty"] += 1
-        return predicate_assessment
-
-    def generate_report(self):
-        total_triples = len(self.g)
-        unique_subjects = len(set(self.g.subjects()))
-        unique_predicates = len(set(self.g.predicates()))
-        unique_objects = len(set(self.g.objects()))
-        report = (f"The RDF file you've provided contains {total_triples} triples, "
+        statistics = self.statistics()
+        return {str(p): {"non_empty": count - statistics.empty_counts[p], "empty": statistics.empty_counts[p]}
+                for p, count in statistics.predicate_counts.items()}
+
+    def generate_report(self, approximate_distinct=False):
+        statistics = self.statistics(approximate_distinct)
+        about = "about " if approximate_distinct else ""
+        report = (f"The RDF file you've provided contains {statistics.triples} triples, "
                   f"which are the basic units of information in RDF, composed of "
-                  f"a subject, predicate, and object. It includes {unique_subjects} "
-                  f"unique subjects, {unique_predicates} unique predicates, and "
-                  f"{unique_objects} unique objects.")
+                  f"a subject, predicate, and object. It includes {about}{statistics.subjects} "
+                  f"unique subjects, {statistics.predicates} unique predicates, and "
+                  f"{about}{statistics.objects} unique objects.")
 
         if self.report_file:
             print("** RDF Data Quality Assessment Report **", file=self.report_file)
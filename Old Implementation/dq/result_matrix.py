@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+
+class ResultMatrix:
+    """
+    Collects the assessment results of each observation and makes the result
+    matrix DataFrame one time, when it is asked for.
+
+    Observation ids are mapped to row numbers and field names ("assessment:label")
+    to column numbers. A result is a 1 in a uint8 array, so adding a result does
+    not search or copy the DataFrame. Extra fields (like "location") keep their
+    values in a dict per column.
+
+    It gives the same DataFrame as adding the rows one by one with .loc:
+    - a result with observation id None always starts a new row
+    - a new row only gets fields that are already columns
+    """
+
+    def __init__(self, columns, id_column='observation_id'):
+        self.id_column = id_column
+        self._columns = []
+        self._column_index = {}
+        self._values = {}
+        self._ids = []
+        self._row_index = {}
+        self._hits = np.zeros((1024, max(len(columns), 1)), dtype=np.uint8)
+        for column in columns:
+            if column != id_column:
+                self._add_column(column)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, observation_id, field_name, extra_field=None, extra_value=None):
+        row = self._row_index.get(observation_id) if observation_id is not None else None
+        if row is None:
+            row = self._add_row(observation_id)
+            # A new row does not add columns (the same as df.loc[len(df)] = new_row)
+            if field_name in self._column_index:
+                self._set_hit(row, field_name)
+            if extra_field is not None and extra_value is not None and extra_field in self._column_index:
+                self._set_value(row, extra_field, extra_value)
+        else:
+            self._set_hit(row, field_name)
+            if extra_field is not None and extra_value is not None:
+                self._set_value(row, extra_field, extra_value)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        n = len(self._ids)
+        ids = pd.Series(self._ids, dtype=object)
+        if None not in self._row_index and len(self._row_index) == n:
+            # Only whole numbers: int64 like .loc makes. With None the ids stay objects.
+            ids = ids.infer_objects()
+        data = {self.id_column: ids}
+        for column in self._columns:
+            if column in self._values:
+                values = np.full(n, np.nan, dtype=object)
+                for row, value in self._values[column].items():
+                    values[row] = value
+                data[column] = pd.Series(values, dtype=object)
+            else:
+                hits = self._hits[:n, self._column_index[column]]
+                data[column] = np.where(hits == 1, 1.0, np.nan)
+        return pd.DataFrame(data, columns=[self.id_column] + self._columns)
+
+    @classmethod
+    def from_dataframe(cls, df, id_column='observation_id'):
+        """Start again from a result matrix DataFrame (for example after it was sorted)."""
+        matrix = cls(list(df.columns), id_column)
+        for observation_id in df[id_column].tolist():
+            matrix._add_row(None if pd.isna(observation_id) else observation_id)
+        for column in matrix._columns:
+            values = df[column].to_numpy(dtype=object)
+            present = np.flatnonzero(~pd.isna(values))
+            if all(values[row] == 1 for row in present):
+                matrix._hits[present, matrix._column_index[column]] = 1
+            else:
+                matrix._values[column] = {int(row): values[row] for row in present}
+        return matrix
+
+    def _add_row(self, observation_id):
+        row = len(self._ids)
+        if row == self._hits.shape[0]:
+            self._hits = np.concatenate([self._hits, np.zeros_like(self._hits)], axis=0)
+        self._ids.append(observation_id)
+        if observation_id is not None:
+            self._row_index[observation_id] = row
+        return row
+
+    def _add_column(self, column):
+        if column in self._column_index:
+            return
+        position = len(self._columns)
+        if position == self._hits.shape[1]:
+            self._hits = np.concatenate([self._hits, np.zeros_like(self._hits)], axis=1)
+        self._columns.append(column)
+        self._column_index[column] = position
+
+    def _set_hit(self, row, column):
+        self._add_column(column)
+        self._hits[row, self._column_index[column]] = 1
+
+    def _set_value(self, row, column, value):
+        self._add_column(column)
+        self._values.setdefault(column, {})[row] = value
@@ -18,8 +18,12 @@ class ScoringManager:
         self.report_file = report_file
         self.scoring_df = None
         self.results_ttl = results_ttl
-        self.results_graph = rdflib.Graph()
-        self.results_graph.parse(self.results_ttl, format="turtle")
+        if isinstance(results_ttl, rdflib.Graph):
+            # The results of the last stage, passed in memory
+            self.results_graph = results_ttl
+        else:
+            self.results_graph = rdflib.Graph()
+            self.results_graph.parse(self.results_ttl, format="turtle")
         self.label_manager = VocabManager()
         self.scoring_matrix = {}
         self.create_scoring_matrix()
@@ -47,72 +51,79 @@ class ScoringManager:
         except ValueError:
             return None
 
+    def scoring_weight_matrix(self):
+        """
+        All scoring methods as one weight matrix W: one row per assertion ("assessment:label")
+        and one column per scoring method.
+        """
+        scoring_methods = list(self.scoring_matrix)
+        key_index = {}
+        method_weights = []
+        for scoring_method in scoring_methods:
+            scoring_vector, scoring_keys = dictionary_to_vector_and_keys(self.scoring_matrix[scoring_method])
+            for key in scoring_keys:
+                key_index.setdefault(key, len(key_index))
+            method_weights.append(zip(scoring_keys, scoring_vector))
+
+        weights = np.zeros((len(key_index), len(scoring_methods)))
+        for column, scoring_weights in enumerate(method_weights):
+            for key, weight in scoring_weights:
+                weights[key_index[key], column] = weight
+        return scoring_methods, list(key_index), weights
+
     def apply_scoring_methods(self):
+        scoring_methods, scoring_keys, weights = self.scoring_weight_matrix()
+
+        # X: 1 where the observation has the assertion, so X @ W scores every method for every observation
+        indicators = (self.result_matrix_df[scoring_keys] == 1.0).to_numpy(dtype=np.float64)
+        scores = indicators @ weights
+        observation_ids = self.result_matrix_df['observation_id'].tolist()
 
-        for scoring_method, conditions in self.scoring_matrix.items():
+        for column, scoring_method in enumerate(scoring_methods):
             assessment_name = "Scoring Method Applying: " + scoring_method
-            total_assessments = 0
             result_counts = {'Max': 0, 'Min': 0, 'Avg': 0}
+            method_scores = scores[:, column]
 
-            scoring_results = []
-            scoring_vector, scoring_keys = dictionary_to_vector_and_keys(conditions)
-
-
-            for _, row in self.result_matrix_df.iterrows():
-
-                row_vector = [1 if row[key] == 1.0 else 0 for key in scoring_keys]
-                dot_product = np.dot(scoring_vector, row_vector)
-                formatted_mapped_value = f"{dot_product:.4f}"
-
-                scoring_results.append(float(formatted_mapped_value))
-
-
-            min_score = min(scoring_results)
-            max_score = max(scoring_results)
+            # Rounding keeps the order, so these are the min and max of the rounded scores
+            min_score = float(f"{method_scores.min():.4f}")
+            max_score = float(f"{method_scores.max():.4f}")
 
             print('Scoring Min, Max', min_score,max_score)
             if max_score == min_score:
                 raise ValueError("max_score must be greater than min_score")
 
-
-            scoring_results = []
-            for _, row in self.result_matrix_df.iterrows():
-                total_assessments += 1
-                row_vector = [1 if row[key] == 1.0 else 0 for key in scoring_keys]
-                dot_product = np.dot(scoring_vector, row_vector)
-
-                mapped_value = (dot_product - min_score) / (max_score - min_score)
-                formatted_mapped_value = f"{mapped_value:.4f}"
-
-                scoring_results.append(float(formatted_mapped_value))
-
-                self._add_scoring_result(scoring_method, row['observation_id'], formatted_mapped_value)
+            formatted_mapped_values = np.char.mod('%.4f', (method_scores - min_score) / (max_score - min_score)).tolist()
+            scoring_results = [float(value) for value in formatted_mapped_values]
+            self._add_scoring_results(scoring_method, observation_ids, formatted_mapped_values)
 
             self.result_matrix_df[scoring_method] = scoring_results
             result_counts['Min'] = min(scoring_results)
             result_counts['Avg'] = sum(scoring_results) / len(scoring_results) if scoring_results != 0 else 'NA'
             result_counts['Max'] = max(scoring_results)
 
+            self.add_to_report(assessment_name, len(scoring_results), result_counts)
 
+        if self.output_result_file:
+            self.results_graph.serialize(destination=self.output_result_file, format="turtle")
 
-            self.add_to_report(assessment_name, total_assessments, result_counts)
-
-        self.results_graph.serialize(destination=self.output_result_file, format="turtle")
-
-    def _add_scoring_result(self, scoring_method, observation_id, value, scoring_date=None):
-        subject = URIRef(f"http://example.com/scoring_assessment/{scoring_method}/{observation_id}")
+    def _add_scoring_results(self, scoring_method, observation_ids, values, scoring_date=None):
         assessment_type = URIRef(f"http://example.com/scoring_assessment/{scoring_method}/")
-        result_bn = BNode()
-        self.results_graph.add((subject, DQAF.hasDQAFResult, result_bn))
-        self.results_graph.add((result_bn, SOSA.observedProperty, assessment_type))
-
-        self.results_graph.add((result_bn, SDO.value, Literal(value)))
         if scoring_date is None:
             scoring_date = datetime.now()
         elif isinstance(scoring_date, datetime.date) and not isinstance(scoring_date, datetime.datetime):
             scoring_date = datetime.datetime.combine(scoring_date, datetime.time.min)
-
-        self.results_graph.add((result_bn, SOSA.resultTime, Literal(scoring_date, datatype=XSD.dateTime)))
+        # All the scores of a method are made together, so they share one result time
+        result_time = Literal(scoring_date, datatype=XSD.dateTime)
+
+        quads = []
+        for observation_id, value in zip(observation_ids, values):
+            subject = URIRef(f"http://example.com/scoring_assessment/{scoring_method}/{observation_id}")
+            result_bn = BNode()
+            quads.append((subject, DQAF.hasDQAFResult, result_bn, self.results_graph))
+            quads.append((result_bn, SOSA.observedProperty, assessment_type, self.results_graph))
+            quads.append((result_bn, SDO.value, Literal(value), self.results_graph))
+            quads.append((result_bn, SOSA.resultTime, result_time, self.results_graph))
+        self.results_graph.addN(quads)
 
     def add_to_report(self, scoring_name, total_scoring_applied, result_counts):
         if self.report_file:
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# A decimal part is unusual when a group of 1 to MAX_GROUP digits repeats
+# MIN_REPEATS or more times in a row (like 111, 121212 or 123123123), which is
+# the regex ([0-9]{1,3})\1{2,} of the Convert engine.
+MAX_GROUP = 3
+MIN_REPEATS = 3
+
+# Decimal parts are checked in batches of this many rows
+DEFAULT_BATCH_SIZE = 1_000_000
+
+POINT_PATTERN = r"POINT \(([^ ]+) ([^ ]+)\)"
+
+
+def unusual_decimals(decimals, batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+    """
+    True for the decimal parts with a repeating group of digits (see MAX_GROUP, MIN_REPEATS).
+
+    The strings are compared as a matrix of characters: a group of size k repeats
+    MIN_REPEATS times where (MIN_REPEATS - 1) * k characters in a row are digits
+    equal to the character k places further on.
+    """
+    decimals = np.asarray(decimals, dtype=str)
+    unusual = np.zeros(len(decimals), dtype=bool)
+    for start in range(0, len(decimals), batch_size):
+        batch = decimals[start:start + batch_size]
+        width = batch.dtype.itemsize // 4
+        if width == 0:
+            continue
+        # One row of unicode code points per string, padded with 0
+        chars = np.ascontiguousarray(batch).view(np.uint32).reshape(len(batch), width)
+        digits = (chars >= ord('0')) & (chars <= ord('9'))
+        for size in range(1, MAX_GROUP + 1):
+            span = (MIN_REPEATS - 1) * size
+            if width < span + size:
+                break
+            same = (chars[:, :-size] == chars[:, size:]) & digits[:, :-size]
+            # Rows with `span` equal characters in a row
+            counts = np.zeros((len(batch), same.shape[1] + 1), dtype=np.int32)
+            np.cumsum(same, axis=1, out=counts[:, 1:])
+            unusual[start:start + len(batch)] |= (counts[:, span:] - counts[:, :-span] == span).any(axis=1)
+    return unusual
+
+
+def decimal_parts(numbers: pd.Series) -> np.ndarray:
+    """The text after the last '.' of each number, or '' for a number without one."""
+    parts = numbers.fillna('').astype(str).str.rpartition('.')
+    return parts[2].where(parts[1] != '', '').to_numpy(dtype=str)
+
+
+def unusual_coordinates(geometries) -> np.ndarray:
+    """
+    True for the WKT points whose longitude or latitude has unusual decimals.
+    Geometries that are not a "POINT (lon lat)" are usual.
+    """
+    coords = pd.Series([str(geometry) for geometry in geometries], dtype=object).str.extract(POINT_PATTERN)
+    if coords.empty:
+        return np.zeros(0, dtype=bool)
+    return unusual_decimals(decimal_parts(coords[0])) | unusual_decimals(decimal_parts(coords[1]))
@@ -18,8 +18,12 @@ class UseCaseManager:
         self.report_file = report_file
         self.use_cases_df = None
         self.results_ttl = results_ttl
-        self.results_graph = rdflib.Graph()
-        self.results_graph.parse(self.results_ttl, format="turtle")
+        if isinstance(results_ttl, rdflib.Graph):
+            # The results of the last stage, passed in memory
+            self.results_graph = results_ttl
+        else:
+            self.results_graph = rdflib.Graph()
+            self.results_graph.parse(self.results_ttl, format="turtle")
         self.label_manager = VocabManager()
         self.use_case_matrix = {}
         self.create_use_case_matrix()
@@ -71,48 +75,70 @@ class UseCaseManager:
                     return None
         return None
 
-    def assess_use_cases(self):
+    def use_case_masks(self):
+        """
+        All use cases as one boolean mask matrix: one row per assertion ("assessment:label")
+        and one column per use case, True where the use case needs the assertion.
+        Also the number of needed assertions (calculate_subgroup_sums) of each use case.
+        """
+        use_cases = list(self.use_case_matrix)
+        key_index = {}
+        use_case_vectors = []
+        for use_case in use_cases:
+            use_case_vector, use_case_keys = dictionary_to_vector_and_keys(self.use_case_matrix[use_case])
+            for key in use_case_keys:
+                key_index.setdefault(key, len(key_index))
+            use_case_vectors.append(zip(use_case_keys, use_case_vector))
+
+        masks = np.zeros((len(key_index), len(use_cases)), dtype=bool)
+        for column, use_case_vector in enumerate(use_case_vectors):
+            for key, needed in use_case_vector:
+                masks[key_index[key], column] = bool(needed)
+        use_case_sums = np.array([calculate_subgroup_sums(self.use_case_matrix[use_case]) for use_case in use_cases])
+        return use_cases, list(key_index), masks, use_case_sums
 
-        for use_case, conditions in self.use_case_matrix.items():
-            assessment_name = "Use Case Assessment: " + use_case
-            total_assessments = 0
-            result_counts = {'True': 0, 'False': 0}
+    def assess_use_cases(self):
+        use_cases, use_case_keys, masks, use_case_sums = self.use_case_masks()
 
-            use_case_results = []
-            use_case_vector, use_case_keys = dictionary_to_vector_and_keys(conditions)
-            use_case_sum = calculate_subgroup_sums(conditions)
+        # The number of needed assertions each observation has, for every use case at once
+        assertions = (self.result_matrix_df[use_case_keys] == 1.0).to_numpy()
+        matches = assertions.astype(np.int64) @ masks.astype(np.int64)
+        satisfied = matches == use_case_sums
+        observation_ids = self.result_matrix_df['observation_id'].tolist()
 
-            for _, row in self.result_matrix_df.iterrows():
-                total_assessments += 1
-                row_vector = [1 if row[key] == 1.0 else 0 for key in use_case_keys]
-                dot_product = np.dot(use_case_vector, row_vector)
-                use_case_satisfied = use_case_sum == dot_product
-                use_case_results.append(use_case_satisfied)
-                label = "True" if use_case_satisfied else "False"
-                result_counts[label] += 1
+        for column, use_case in enumerate(use_cases):
+            assessment_name = "Use Case Assessment: " + use_case
+            use_case_results = satisfied[:, column]
+            true_count = int(use_case_results.sum())
+            result_counts = {'True': true_count, 'False': len(use_case_results) - true_count}
 
-                self._add_use_case_assessment_result(use_case, row['observation_id'], use_case_satisfied)
+            self._add_use_case_assessment_results(use_case, observation_ids, list(use_case_results))
 
             self.result_matrix_df[use_case] = use_case_results
-            self.add_to_report(assessment_name, total_assessments, result_counts)
+            self.add_to_report(assessment_name, len(use_case_results), result_counts)
 
-        self.results_graph.serialize(destination=self.output_result_file, format="turtle")
-        print(self.output_result_file)
+        if self.output_result_file:
+            self.results_graph.serialize(destination=self.output_result_file, format="turtle")
+            print(self.output_result_file)
 
-    def _add_use_case_assessment_result(self, use_case, observation_id, value, assessment_date=None):
-        subject = URIRef(f"http://example.com/use_case_assessment/{use_case}/{observation_id}")
+    def _add_use_case_assessment_results(self, use_case, observation_ids, values, assessment_date=None):
         assessment_type = URIRef(f"http://example.com/use_case_assessment/{use_case}/")
-        result_bn = BNode()
-        self.results_graph.add((subject, DQAF.hasDQAFResult, result_bn))
-        self.results_graph.add((result_bn, SOSA.observedProperty, assessment_type))
-
-        self.results_graph.add((result_bn, SDO.value, Literal(value)))
         if assessment_date is None:
             assessment_date = datetime.now()
         elif isinstance(assessment_date, datetime.date) and not isinstance(assessment_date, datetime.datetime):
             assessment_date = datetime.datetime.combine(assessment_date, datetime.time.min)
-
-        self.results_graph.add((result_bn, SOSA.resultTime, Literal(assessment_date, datatype=XSD.dateTime)))
+        # All the results of a use case are made together, so they share one result time
+        result_time = Literal(assessment_date, datatype=XSD.dateTime)
+
+        quads = []
+        for observation_id, value in zip(observation_ids, values):
+            subject = URIRef(f"http://example.com/use_case_assessment/{use_case}/{observation_id}")
+            result_bn = BNode()
+            quads.append((subject, DQAF.hasDQAFResult, result_bn, self.results_graph))
+            quads.append((result_bn, SOSA.observedProperty, assessment_type, self.results_graph))
+            quads.append((result_bn, SDO.value, Literal(value), self.results_graph))
+            quads.append((result_bn, SOSA.resultTime, result_time, self.results_graph))
+        self.results_graph.addN(quads)
 
     def add_to_report(self, assessment_name, total_assessments, result_counts):
         if self.report_file:
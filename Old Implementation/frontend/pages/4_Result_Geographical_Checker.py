@@ -1,9 +1,21 @@
+import sys
+import os
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import pandas as pd
 import re
 
+# Adjust the path to include the 'dq' directory
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root_dir = os.path.dirname(
+    os.path.dirname(current_dir))  # This should be the project root directory, where 'dq' resides
+
+if project_root_dir not in sys.path:
+    sys.path.append(project_root_dir)
+
+from dq.matrix_writer import read_result_matrix
+
 # State colors from Wikipedia (https://en.wikipedia.org/wiki/Australian_state_and_territory_colours)
 state_colors = {
     "Australian_Capital_Territory": "#003DA5",  # Blue
@@ -84,9 +96,10 @@ def filter_geo_points(geo_points, selected_filters):
 # Streamlit app layout
 st.set_page_config(page_title='Geo Points Map with File Upload', layout="wide")
 
-uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
+uploaded_file = st.file_uploader("Choose a result matrix file (output3.parquet, .csv or .xlsx)",
+                                 type=["parquet", "csv", "xlsx"])
 if uploaded_file:
-    df = pd.read_excel(uploaded_file)
+    df = read_result_matrix(uploaded_file, uploaded_file.name)
     st.write("File uploaded successfully.")
     st.write("Data Sample:")
     st.write(df.head())  # Display the first few rows of the data frame
@@ -146,4 +159,4 @@ if 'geo_points' in st.session_state:
             ).add_to(m)
         st_folium(m, width=900, height=700, returned_objects=[])
 else:
-    st.write("Please upload an Excel file.")
+    st.write("Please upload a result matrix file.")
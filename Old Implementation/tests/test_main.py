@@ -1,11 +1,31 @@
+import io
 import os
+import re
 import shutil
 
-from rdflib import Graph
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from rdflib import Graph, URIRef
+from rdflib.compare import isomorphic
+from rdflib.namespace import SOSA, SDO
+from shapely.geometry import box
+from sklearn.cluster import KMeans
 
+from dq import matrix_writer
 from dq.__main__ import main
-from dq.assess import RDFDataQualityAssessment
+from dq.assess import RDFDataQualityAssessment, AustraliaGeographyChecker, DQAF
+from dq.checkpoint import CheckpointWriter
+from dq.clustering_1d import kmeans_1d, best_n_clusters
+from dq.data_loader import expand_inputs, load_graph
 from dq.defined_namespaces import DirectoryStructure
+from dq.observation_index import ObservationIndex
+from dq.quantile_sketch import QuantileSketch, merge_sketches
+from dq.report_analysis import GraphStatistics, HyperLogLog, ReportAnalysis
+from dq.result_matrix import ResultMatrix
+from dq.scoring_manager import ScoringManager
+from dq.unusual_numbers import unusual_decimals, unusual_coordinates
+from dq.usecase_manager import UseCaseManager
 import pytest
 
 
@@ -164,6 +184,20 @@ def test_assess_date_outlier_kmeans(dq_assessment):
     do_the_test(assessment_name, total_assessments, expected_total_assessments, result_counts, expected_label_values)
 
 
+def test_date_clusters_are_optimal_and_sampled():
+    # Same clusters as KMeans on well separated years, numbered from the lowest years
+    rng = np.random.default_rng(1)
+    years = np.concatenate([rng.integers(2000, 2021, 3000), rng.integers(1900, 1905, 60)])
+    labels = kmeans_1d(years, 2)
+    kmeans_labels = KMeans(n_clusters=2, random_state=42, n_init=10).fit_predict(years.reshape(-1, 1))
+    assert (labels == (kmeans_labels == kmeans_labels[years.argmax()])).all()
+    assert np.bincount(labels).tolist() == [60, 3000]
+
+    # The number of clusters is chosen on a sample, the labels are for all years
+    best_k, labels = best_n_clusters(years, range(2, 10), sample_size=500)
+    assert best_k == 2 and len(labels) == len(years)
+
+
 def test_assess_coordinate_in_australia_state(dq_assessment):
     assessment_name, total_assessments, result_counts = dq_assessment.assess_coordinate_in_australia_state()
 
@@ -180,6 +214,26 @@ def test_assess_coordinate_in_australia_state(dq_assessment):
     do_the_test(assessment_name, total_assessments, expected_total_assessments, result_counts, expected_label_values)
 
 
+def test_find_states_in_bulk():
+    # Two overlapping test states, so the first state must win in the overlap
+    checker = AustraliaGeographyChecker.__new__(AustraliaGeographyChecker)
+    checker.states_data = {
+        "State_A": gpd.GeoDataFrame(geometry=[box(0, 0, 10, 10), None], crs="EPSG:4326"),
+        "State_B": gpd.GeoDataFrame(geometry=[box(5, 5, 20, 20)], crs="EPSG:4326"),
+    }
+    checker._build_state_index()
+
+    longs = [1, 7, 15, 30, 10]
+    lats = [1, 7, 15, 30, 7]
+    states = checker.find_states(longs, lats)
+
+    # A point on the edge of a polygon is not contained, the same as GeoDataFrame.contains
+    assert list(states) == ["State_A", "State_A", "State_B", "Outside Australia", "State_B"]
+    assert checker.is_point_in_australia_state(15, 15) == (True, "State_B")
+    assert checker.is_point_in_australia_state(-5, -5) == (False, "Outside Australia")
+    assert len(checker.find_states([], [])) == 0
+
+
 def test_assess_date_format_validation(dq_assessment):
     assessment_name, total_assessments, result_counts = dq_assessment.assess_date_format_validation()
 
@@ -194,14 +248,30 @@ def test_assess_date_format_validation(dq_assessment):
 def test_assess_coordinate_unusual(dq_assessment):
     assessment_name, total_assessments, result_counts = dq_assessment.assess_coordinate_unusual()
 
-    expected_total_assessments = 100
+    expected_total_assessments = 200
     expected_label_values = {
-        "usual": 68,
-        "unusual": 32}
+        "usual": 196,
+        "unusual": 4}
 
     do_the_test(assessment_name, total_assessments, expected_total_assessments, result_counts, expected_label_values)
 
 
+def test_unusual_decimals_match_the_convert_pattern():
+    # Same pattern as assess_coordinate_unusual.sparql of the Convert engine
+    pattern = re.compile(r"([0-9]{1,3})\1{2,}")
+    decimals = ["111", "11", "121212", "12121", "123123123", "12312312", "9876543", "", "1a1a1a", "50000"]
+    assert unusual_decimals(decimals).tolist() == [True, False, True, False, True, False, False, False, False, True]
+
+    rng = np.random.default_rng(7)
+    decimals = ["".join(rng.choice(list("0123"), size=rng.integers(0, 12))) for _ in range(5000)]
+    expected = [pattern.search(d) is not None for d in decimals]
+    assert unusual_decimals(decimals, batch_size=700).tolist() == expected
+
+    geometries = ["POINT (145.123123123 -37.1)", "POINT (145.12 -37.555)", "POINT (145.12 -37.5)", "POINT(1.555 2.5)"]
+    assert unusual_coordinates(geometries).tolist() == [True, True, False, False]
+    assert RDFDataQualityAssessment.detect_unusual_numbers("145.1212") == 'usual'
+
+
 def test_assess_coordinate_outlier_zscore(dq_assessment):
     assessment_name, total_assessments, result_counts = dq_assessment.assess_coordinate_outlier_zscore()
 
@@ -224,6 +294,18 @@ def test_assess_coordinate_outlier_irq(dq_assessment):
     do_the_test(assessment_name, total_assessments, expected_total_assessments, result_counts, expected_label_values)
 
 
+def test_quantile_sketch_is_the_same_for_any_chunks():
+    rng = np.random.default_rng(0)
+    latitudes = rng.normal(-37, 2, 3000)
+    assert np.array_equal(QuantileSketch().add(latitudes).percentiles([25, 75]), np.percentile(latitudes, [25, 75]))
+
+    # Past max_exact the values are counted in buckets, merged chunks still give the same quartiles
+    whole = QuantileSketch(max_exact=1000).add(latitudes).percentiles([25, 75])
+    chunks = [QuantileSketch(max_exact=1000).add(part) for part in np.split(latitudes, [500, 2900])]
+    assert np.array_equal(merge_sketches(chunks).percentiles([25, 75]), whole)
+    assert np.allclose(whole, np.percentile(latitudes, [25, 75]), rtol=2e-5)
+
+
 def test_assess_scientific_name_completeness(dq_assessment):
     assessment_name, total_assessments, result_counts = dq_assessment.assess_scientific_name_completeness()
 
@@ -245,3 +327,323 @@ def test_assess_scientific_name_validation(dq_assessment):
 
     do_the_test(assessment_name, total_assessments, expected_total_assessments, result_counts, expected_label_values)
 
+
+def test_result_matrix_matches_row_by_row_dataframe():
+    results = [(1, "a:x", None, None), (2, "a:y", "location", "1, 2"), (1, "a:y", None, None),
+               (None, "a:x", None, None), (None, "a:x", None, None), (3, "b:new", None, None),
+               (1, "b:new", "location", "3, 4"), (2, "c:other", None, None)]
+
+    # Step 1: The DataFrame the old code made by adding the results one by one
+    expected = pd.DataFrame(columns=["observation_id", "a:x", "a:y"])
+    for observation_id, field_name, extra_field, extra_value in results:
+        matches = expected["observation_id"] == observation_id
+        if matches.any():
+            for column in [field_name] + ([extra_field] if extra_field else []):
+                if column not in expected.columns:
+                    expected[column] = pd.NA
+            expected.loc[matches, field_name] = 1
+            if extra_field:
+                expected.loc[matches, extra_field] = extra_value
+        else:
+            new_row = {"observation_id": observation_id, field_name: 1}
+            if extra_field:
+                new_row[extra_field] = extra_value
+            expected.loc[len(expected)] = new_row
+
+    # Step 2: The same results in the accumulator
+    matrix = ResultMatrix(["observation_id", "a:x", "a:y"])
+    for result in results:
+        matrix.add(*result)
+    actual = matrix.to_dataframe()
+
+    # None ids start new rows, and a new row does not add columns
+    assert list(actual.columns) == list(expected.columns) == ["observation_id", "a:x", "a:y", "b:new", "location",
+                                                              "c:other"]
+    assert actual["observation_id"].tolist() == [1, 2, None, None, 3]
+    pd.testing.assert_frame_equal(actual.astype(object).where(actual.notna(), None),
+                                  expected.astype(object).where(expected.notna(), None))
+
+    # A sorted matrix can be put back and added to
+    matrix = ResultMatrix.from_dataframe(actual.iloc[[4, 0, 1]].reset_index(drop=True))
+    matrix.add(3, "a:x")
+    assert matrix.to_dataframe()["a:x"].tolist()[:2] == [1.0, 1.0]
+    assert matrix.to_dataframe()["location"].tolist()[1] == "3, 4"
+
+
+def test_observation_index_follows_graph_chains():
+    g = Graph().parse(format="turtle", data="""
+    @prefix tern: <https://w3id.org/tern/ontologies/tern/> .
+    @prefix sosa: <http://www.w3.org/ns/sosa/> .
+    @prefix geo:  <http://www.opengis.net/ont/geosparql#> .
+    @prefix time: <http://www.w3.org/2006/time#> .
+    @prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+    @prefix xsd:  <http://www.w3.org/2001/XMLSchema#> .
+    @prefix ex:   <http://example.com/> .
+
+    ex:obs1 a tern:Observation ; sosa:hasFeatureOfInterest ex:sample1, ex:other ;
+        time:hasTime [ time:inXSDgYear "1999"^^xsd:gYear ] .
+    ex:sample1 a tern:Sample ; sosa:isResultOf ex:proc1 .
+    ex:proc1 geo:hasGeometry ex:geom1, ex:empty ; geo:hasMetricSpatialAccuracy 50 ;
+        rdfs:comment "field-sampling" .
+    ex:geom1 geo:asWKT "POINT (151.2 -33.9)" .
+    ex:obs2 a tern:Observation ; sosa:hasFeatureOfInterest ex:sample1 .
+    """)
+    index = ObservationIndex(g)
+
+    # Both observations share the sample, and the geometry without a WKT is left out
+    rows = [(str(row.observation), str(row.wkt)) for row in index.geometry_rows()]
+    assert sorted(rows) == [("http://example.com/obs1", "POINT (151.2 -33.9)"),
+                            ("http://example.com/obs2", "POINT (151.2 -33.9)")]
+    assert sorted((str(obs), long, lat) for obs, long, lat in index.points()) == [
+        ("http://example.com/obs1", 151.2, -33.9), ("http://example.com/obs2", 151.2, -33.9)]
+
+    # The untyped feature is kept for the rules that count it, but has no procedures
+    obs1 = next(obs for obs in index.observations if str(obs).endswith("obs1"))
+    assert len(index.samples[obs1]) == 2
+    assert [str(procedure) for _, procedure in index.procedures_of(obs1)] == ["http://example.com/proc1"]
+    assert [int(year) for node in index.times[obs1] for year in index.years[node]] == [1999]
+    assert int(index.spatial_accuracy[next(iter(index.geometries))]) == 50
+    assert index.has_comment(next(s for s, _ in index.geometry_links), "field-sampling")
+
+
+def test_parallel_assessments_match_sequential_run():
+    file_to_assess = os.path.join(os.path.dirname(__file__), 'data', 'chunk_1.ttl')
+    assessments = ["assess_coordinate_precision", "assess_coordinate_completeness",
+                   "assess_date_completeness", "assess_scientific_name_completeness", "assess_datum_type"]
+
+    def results(assessment):
+        # The result nodes are blank nodes and the result times differ, so compare the rest
+        return sorted((str(subject), str(p), str(o))
+                      for subject, _, result in assessment.g.triples((None, DQAF.hasDQAFResult, None))
+                      for _, p, o in assessment.g.triples((result, None, None))
+                      if p != SOSA.resultTime)
+
+    sequential = RDFDataQualityAssessment(Graph().parse(file_to_assess), io.StringIO())
+    expected = [getattr(sequential, name)() for name in assessments]
+
+    parallel = RDFDataQualityAssessment(Graph().parse(file_to_assess), io.StringIO())
+    returned = parallel.run_assessments_in_parallel(assessments, 2)
+
+    assert returned == expected
+    assert results(parallel) == results(sequential)
+    assert parallel.result_matrix_df.equals(sequential.result_matrix_df)
+    assert parallel.report_file.getvalue() == sequential.report_file.getvalue()
+
+
+def test_compact_results_share_result_nodes():
+    file_to_assess = os.path.join(os.path.dirname(__file__), 'data', 'chunk_1.ttl')
+
+    def results(assessment):
+        return sorted((str(subject), str(assessment.g.value(result, SOSA.observedProperty)),
+                       str(assessment.g.value(result, SDO.value)))
+                      for subject, _, result in assessment.g.triples((None, DQAF.hasDQAFResult, None)))
+
+    default = RDFDataQualityAssessment(Graph().parse(file_to_assess), None)
+    default.assess_coordinate_completeness()
+    default.assess_datum_type()
+
+    compact = RDFDataQualityAssessment(Graph().parse(file_to_assess), None, compact_results=True)
+    compact.assess_coordinate_completeness()
+    compact.assess_datum_type()
+
+    assert results(compact) == results(default)
+    # One result node per assessment and label, all with the result time of the run
+    result_nodes = set(compact.g.objects(None, DQAF.hasDQAFResult))
+    assert len(result_nodes) == len({(p, v) for _, p, v in results(compact)})
+    assert set(compact.g.objects(None, SOSA.resultTime)) == {compact.result_time}
+
+
+def test_load_graph_merges_globbed_files(tmp_path):
+    for number in range(3):
+        (tmp_path / f"chunk_{number}.ttl").write_text(f"""
+        @prefix ex: <http://example.com/> .
+        ex:obs{number} ex:hasTime _:b1 .
+        _:b1 ex:year {2000 + number} .
+        """)
+
+    paths = expand_inputs([tmp_path / "chunk_*.ttl", tmp_path / "chunk_0.ttl"])
+    assert [path.name for path in paths] == ["chunk_0.ttl", "chunk_1.ttl", "chunk_2.ttl"]
+
+    expected = Graph()
+    for path in paths:
+        expected.parse(str(path), format="ttl")
+
+    # The _:b1 of each file is a different node
+    g = load_graph(paths, jobs=2)
+    assert len(g) == 6
+    assert isomorphic(g, expected)
+    assert isomorphic(load_graph(paths), expected)
+    assert dict(g.namespaces())["ex"] == URIRef("http://example.com/")
+
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([tmp_path / "missing_*.ttl"])
+
+
+def test_checkpoint_writer_writes_a_snapshot(tmp_path):
+    g = Graph().parse(format="turtle", data="""
+    @prefix ex: <http://example.com/> .
+    ex:obs1 ex:hasResult [ ex:value "line one\\nline two"@en ; ex:score 0.5 ] .
+    """)
+    expected = Graph()
+    expected += g
+
+    checkpoints = CheckpointWriter('nt')
+    nt_file = checkpoints.write(g, tmp_path / "Results")
+    # The next stage adds its results while the checkpoint is written
+    g.add((URIRef("http://example.com/obs2"), URIRef("http://example.com/value"), URIRef("http://example.com/x")))
+    checkpoints.close()
+
+    assert nt_file == str(tmp_path / "Results.nt")
+    assert isomorphic(Graph().parse(nt_file, format="nt"), expected)
+
+    checkpoints = CheckpointWriter('ttl')
+    ttl_file = checkpoints.write(g, tmp_path / "Results")
+    checkpoints.close()
+    assert isomorphic(Graph().parse(ttl_file, format="turtle"), g)
+
+    assert CheckpointWriter(None).write(g, tmp_path / "None") is None
+    assert not (tmp_path / "None.nt").exists()
+
+
+def test_scoring_methods_as_one_matrix_product(tmp_path):
+    scoring_definition_file = tmp_path / "weights.xlsx"
+    pd.DataFrame({
+        "Data quality assertion": ["precision:Low", "precision:High", "name:valid"],
+        "General": [0.2, 0.8, 1.0],
+        "Names_Only": [0.0, 0.0, 1.0],
+    }).to_excel(scoring_definition_file, sheet_name="Weighing", index=False)
+    result_matrix_df = pd.DataFrame({
+        "observation_id": [1, 2, 3],
+        "precision:Low": [1.0, np.nan, np.nan],
+        "precision:High": [np.nan, 1.0, 1.0],
+        "name:valid": [1.0, np.nan, 1.0],
+        "location": ["a", "b", np.nan],
+    })
+
+    scoring_manager = ScoringManager(scoring_definition_file, result_matrix_df, Graph(), None)
+    methods, keys, weights = scoring_manager.scoring_weight_matrix()
+    assert methods == ["General", "Names_Only"]
+    assert keys == ["precision:Low", "precision:High", "name:valid"]
+    assert weights.tolist() == [[0.2, 0.0], [0.8, 0.0], [1.0, 1.0]]
+
+    scoring_manager.apply_scoring_methods()
+
+    # Raw scores 1.2, 0.8, 1.8 and 1, 0, 1, normalised with min and max per method
+    assert scoring_manager.result_matrix_df["General"].tolist() == [0.4, 0.0, 1.0]
+    assert scoring_manager.result_matrix_df["Names_Only"].tolist() == [1.0, 0.0, 1.0]
+    subject = URIRef("http://example.com/scoring_assessment/General/1")
+    assert [str(scoring_manager.results_graph.value(result, SDO.value))
+            for result in scoring_manager.results_graph.objects(subject, None)] == ["0.4000"]
+
+
+def test_use_cases_as_one_mask_product(tmp_path):
+    use_case_definition_file = tmp_path / "use_cases.xlsx"
+    pd.DataFrame({
+        "Data quality assertion": ["precision:Low", "precision:High", "name:valid"],
+        # Any precision and a valid name
+        "Any_Precision": [1, 1, 1],
+        "High_Precision": [np.nan, 1, np.nan],
+    }).to_excel(use_case_definition_file, sheet_name="Use case template", index=False)
+    result_matrix_df = pd.DataFrame({
+        "observation_id": [1, 2, 3],
+        "precision:Low": [1.0, np.nan, np.nan],
+        "precision:High": [np.nan, 1.0, 1.0],
+        "name:valid": [1.0, np.nan, 1.0],
+    })
+
+    use_case_manager = UseCaseManager(use_case_definition_file, result_matrix_df, Graph(), None)
+    use_cases, keys, masks, sums = use_case_manager.use_case_masks()
+    assert use_cases == ["Any_Precision", "High_Precision"]
+    assert masks.tolist() == [[True, False], [True, True], [True, False]]
+    assert sums.tolist() == [2, 1]
+
+    use_case_manager.assess_use_cases()
+
+    assert use_case_manager.result_matrix_df["Any_Precision"].tolist() == [True, False, True]
+    assert use_case_manager.result_matrix_df["High_Precision"].tolist() == [False, True, True]
+    subject = URIRef("http://example.com/use_case_assessment/Any_Precision/2")
+    assert [str(use_case_manager.results_graph.value(result, SDO.value))
+            for result in use_case_manager.results_graph.objects(subject, None)] == ["False"]
+
+
+def test_result_matrix_writers(tmp_path):
+    df = pd.DataFrame({
+        "observation_id": [3, 1, 2],
+        "coordinate_precision:High": [1.0, np.nan, 1.0],
+        "location": ["POINT (151.2 -33.9)", np.nan, "POINT (1 2)"],
+    })
+
+    # Batches of 2 rows, so the CSV is written in two pieces
+    path = matrix_writer.write_result_matrix(df, tmp_path / "output1", "csv", batch_size=2)
+    assert path == str(tmp_path / "output1.csv")
+    pd.testing.assert_frame_equal(matrix_writer.read_result_matrix(path), df)
+
+    path = matrix_writer.write_result_matrix(df, tmp_path / "output1", "xlsx")
+    pd.testing.assert_frame_equal(matrix_writer.read_result_matrix(path), df)
+
+    # An upload is an open file, read with the format of its file name
+    with open(path, 'rb') as f:
+        pd.testing.assert_frame_equal(matrix_writer.read_result_matrix(f, 'output1.xlsx'), df)
+
+    with pytest.raises(ValueError):
+        matrix_writer.write_xlsx(pd.DataFrame({"a": range(matrix_writer.EXCEL_MAX_ROWS + 1)}), tmp_path / "big.xlsx")
+    with pytest.raises(ValueError):
+        matrix_writer.write_result_matrix(df, tmp_path / "output1", "json")
+
+    if matrix_writer.pq is not None:
+        path = matrix_writer.write_result_matrix(df, tmp_path / "output1", "parquet", batch_size=2)
+        pd.testing.assert_frame_equal(matrix_writer.read_result_matrix(path), df)
+    else:
+        assert matrix_writer.default_matrix_format() == "csv"
+
+
+def test_graph_statistics_in_one_pass():
+    g = Graph().parse(format="turtle", data="""
+    @prefix ex: <http://example.com/def#> .
+    @prefix data: <http://example.com/data/> .
+    data:a ex:name "A" ; ex:note "" ; ex:link data:b .
+    data:b ex:name "  " ; ex:link data:a .
+    """)
+    statistics = GraphStatistics(g)
+    assert (statistics.triples, statistics.subjects, statistics.predicates, statistics.objects) == (5, 2, 3, 5)
+
+    report_analysis = ReportAnalysis(g)
+    assert report_analysis.analyze_unique_predicates() == {
+        "http://example.com/def#name": 2, "http://example.com/def#note": 1, "http://example.com/def#link": 2}
+    assert report_analysis.predicate_value_assessment()["http://example.com/def#name"] == {"non_empty": 1, "empty": 1}
+    assert dict(report_analysis.namespace_frequencies()) == {
+        "http://example.com/data/": 7, "http://example.com/def#": 5}
+    assert ("ex", "http://example.com/def#", 5) in report_analysis.get_sorted_namespaces()
+
+    # The statistics are collected again after they are cleared
+    g.parse(format="turtle", data="<http://example.com/data/c> <http://example.com/def#name> 'C' .")
+    assert report_analysis.statistics().triples == 5
+    report_analysis.clear_statistics()
+    assert report_analysis.statistics().triples == 6
+
+    counter = HyperLogLog()
+    for value in range(200_000):
+        counter.add(f"http://example.com/data/{value % 50_000}")
+    assert abs(len(counter) - 50_000) < 50_000 * 0.03
+
+
+def test_approximate_report_makes_one_pass(monkeypatch):
+    passes = []
+
+    class CountingStatistics(GraphStatistics):
+        def __init__(self, g, approximate_distinct=False):
+            passes.append(approximate_distinct)
+            super().__init__(g, approximate_distinct)
+
+    monkeypatch.setattr("dq.report_analysis.GraphStatistics", CountingStatistics)
+    g = Graph().parse(format="turtle", data="""
+    @prefix ex: <http://example.com/def#> .
+    ex:a ex:name "A" ; ex:note "" .
+    """)
+    report_file = io.StringIO()
+    ReportAnalysis(g, report_file).generate_report(approximate_distinct=True)
+
+    # The predicates and namespaces of the report use the statistics of the approximate pass
+    assert passes == [True]
+    assert "about 1 unique subjects" in report_file.getvalue()
+    assert "http://example.com/def#name: 1" in report_file.getvalue()